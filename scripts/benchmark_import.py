@@ -0,0 +1,63 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+import re
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+
+import numpy as np
+
+
+def measure(statement):
+    """ Runs `statement` in a fresh interpreter and returns import times (in seconds) per module. """
+    cmd = [sys.executable, "-X", "importtime", "-c", statement]
+    stderr = subprocess.run(cmd, stderr=subprocess.PIPE, check=True, universal_newlines=True).stderr
+
+    times = {}
+    total = 0
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            times[module] = int(cumulative_us) / 1e6
+            if len(indent) == 1:  # Top-level import.
+                total += int(cumulative_us) / 1e6
+
+    return total, times
+
+
+def build_parser():
+    description = "Benchmark the time it takes to import TextWorld."
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--statement", default="import textworld",
+                        help="Python statement to benchmark. Default: '%(default)s'.")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="Number of fresh interpreters to use. Default: %(default)s.")
+    parser.add_argument("--top", type=int, default=15,
+                        help="Number of slowest modules to report. Default: %(default)s.")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    totals = []
+    modules = defaultdict(list)
+    for _ in range(args.repeat):
+        total, times = measure(args.statement)
+        totals.append(total)
+        for module, time in times.items():
+            modules[module].append(time)
+
+    msg = "{}: {:.3f}s (median over {} runs, min: {:.3f}s)"
+    print(msg.format(args.statement, np.median(totals), args.repeat, np.min(totals)))
+    print("\nSlowest modules (cumulative, median):")
+    medians = sorted(((np.median(times), module) for module, times in modules.items()), reverse=True)
+    for time, module in medians[:args.top]:
+        print("  {:.3f}s  {}".format(time, module))
+
+
+if __name__ == "__main__":
+    main()
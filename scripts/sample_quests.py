@@ -15,7 +15,7 @@ from textworld.render import visualize
 from textworld.generator import Game
 from textworld.generator.inform7 import Inform7Game
 from textworld.generator.chaining import ChainingOptions
-from textworld.generator.chaining import sample_quest
+from textworld.generator.chaining import sample_quest, get_chains_parallel
 from textworld.utils import save_graph_to_svg
 
 
@@ -31,6 +31,10 @@ def parse_args():
                         help="Control how non-linear a quest can be.")
     parser.add_argument("--nb-quests", type=int, default=10,
                         help="Number of quests to sample. Default: %(default)s")
+    parser.add_argument("--all", action="store_true",
+                        help="Enumerate all quests instead of sampling --nb-quests of them.")
+    parser.add_argument("--nb-processes", type=int,
+                        help="Number of processes used to enumerate quests with --all. Default: nb. of CPUs.")
     parser.add_argument("--seed", type=int,
                         help="Seed for random generator. Default: always different.")
     parser.add_argument("-v", "--verbose", action="store_true",
@@ -74,9 +78,12 @@ def main():
 
     # Sample quests.
     chains = []
-    for i in range(args.nb_quests):
-        chain = sample_quest(game.world.state, options)
-        chains.append(chain)
+    if args.all:
+        chains = list(get_chains_parallel(game.world.state, options, args.nb_processes))
+    else:
+        for i in range(args.nb_quests):
+            chain = sample_quest(game.world.state, options)
+            chains.append(chain)
 
     inform7 = Inform7Game(game)
     print_chains(chains, inform7)
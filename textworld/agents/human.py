@@ -6,16 +6,6 @@ import sys
 
 from textworld import Agent
 
-prompt_toolkit_available = False
-try:
-    # For command line history and autocompletion.
-    from prompt_toolkit import prompt
-    from prompt_toolkit.completion import WordCompleter
-    from prompt_toolkit.history import InMemoryHistory
-    prompt_toolkit_available = sys.stdout.isatty()
-except ImportError:
-    pass
-
 try:
     # For command line history when prompt_toolkit is not available.
     import readline  # noqa: F401
@@ -23,13 +13,25 @@ except ImportError:
     pass
 
 
+def _prompt_toolkit_available() -> bool:
+    # Imported on demand since prompt_toolkit is slow to import.
+    try:
+        # For command line history and autocompletion.
+        import prompt_toolkit  # noqa: F401
+        return sys.stdout.isatty()
+    except ImportError:
+        return False
+
+
 class HumanAgent(Agent):
     def __init__(self, autocompletion=True, oracle=False):
         self.autocompletion = autocompletion
         self.oracle = oracle
 
         self._history = None
-        if prompt_toolkit_available:
+        self._prompt_toolkit_available = _prompt_toolkit_available()
+        if self._prompt_toolkit_available:
+            from prompt_toolkit.history import InMemoryHistory
             self._history = InMemoryHistory()
 
     def reset(self, env):
@@ -53,7 +55,10 @@ class HumanAgent(Agent):
             )
             print("Oracle: {}\n".format(text))
 
-        if prompt_toolkit_available:
+        if self._prompt_toolkit_available:
+            from prompt_toolkit import prompt
+            from prompt_toolkit.completion import WordCompleter
+
             actions_completer = None
             if self.autocompletion and game_state["admissible_commands"]:
                 actions_completer = WordCompleter(game_state["admissible_commands"],
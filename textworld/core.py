@@ -5,6 +5,8 @@ from copy import deepcopy
 from typing import Optional, Any, List, Tuple, Iterable
 
 import sys
+import zlib
+import pickle
 import textwrap
 from io import StringIO
 
@@ -20,7 +22,7 @@ class EnvInfos:
     """
 
     __slots__ = ['feedback', 'description', 'inventory', 'location',
-                 'facts', 'win_facts', 'fail_facts',
+                 'facts', 'state_hash', 'win_facts', 'fail_facts',
                  'last_action', 'last_command',
                  'game',
                  'won', 'lost',
@@ -49,6 +51,10 @@ class EnvInfos:
         #: bool: All the facts that are currently true about the world.
         #:       This information changes from one step to another.
         self.facts = kwargs.get("facts", False)
+        #: bool: 64-bit integer identifying the current state of the world (see
+        #:       :py:attr:`textworld.logic.State.hash`), e.g., to detect revisited states.
+        #:       This information changes from one step to another.
+        self.state_hash = kwargs.get("state_hash", False)
         #: bool: Mutually exclusive sets of winning facts for each quest.
         #:       This information *doesn't* change from one step to another.
         self.win_facts = kwargs.get("win_facts", False)
@@ -73,12 +79,16 @@ class EnvInfos:
         #:       This information changes from one step to another.
         self.admissible_commands = kwargs.get("admissible_commands", False)
         #: bool: All possible commands regardless of the current state.
+        #:       They are generated on demand (see `textworld.generator.CommandSpace`).
         #:       This information *doesn't* change from one step to another.
         self.possible_admissible_commands = kwargs.get("possible_admissible_commands", False)
         #: bool: All possible commands regardless of the current state and the arguments type.
+        #:       They are generated on demand (see `textworld.generator.CommandSpace`).
         #:       This information *doesn't* change from one step to another.
         self.possible_commands = kwargs.get("possible_commands", False)
-        #: bool: Sequence of commands leading to a winning state.
+        #: bool: Sequence of commands leading to a winning state. Give the environment
+        #:       a :py:class:`Planner <textworld.generator.planner.Planner>`
+        #:       to get the shortest one.
         #:       This information changes from one step to another.
         self.policy_commands = kwargs.get("policy_commands", False)
         #: bool: Reward (proxy) indicating if the player is making progress.
@@ -273,6 +283,75 @@ class Environment:
         """
         raise NotImplementedError()
 
+    def peek(self, commands: Iterable[str]) -> List[Tuple[GameState, float, bool]]:
+        """ Evaluates commands from the current state without changing it.
+
+        Each command is performed from the current state of the game, independently
+        of the others, which makes it handy for lookahead search (e.g., MCTS or beam
+        search over commands). Backends that can save and restore their state
+        (see `_checkpoint`) do so in place, others step a copy of the environment
+        for each command.
+
+        Arguments:
+            commands: Text commands to evaluate.
+
+        Returns:
+            For each command, the tuple `step(command)` would have returned.
+        """
+        try:
+            checkpoint = self._checkpoint()
+        except NotImplementedError:
+            return [self.copy().step(command) for command in commands]
+
+        outcomes = []
+        for command in commands:
+            try:
+                outcomes.append(self.step(command))
+            finally:
+                self._restore(checkpoint)
+
+        return outcomes
+
+    def _checkpoint(self) -> Any:
+        """ Saves what is needed to bring the environment back to its current state.
+
+        The same checkpoint can be restored any number of times.
+        """
+        raise NotImplementedError()
+
+    def _restore(self, checkpoint: Any) -> None:
+        """ Brings the environment back to the state saved by `_checkpoint`. """
+        raise NotImplementedError()
+
+    def snapshot(self) -> bytes:
+        """ Saves the current state of the game.
+
+        Unlike `copy`, a snapshot is a compact `bytes` object that can be kept
+        (e.g., in an archive of visited states) or sent to another process, then
+        restored by any environment that has loaded the same game.
+
+        Returns:
+            Compressed representation of the current state of the game.
+        """
+        return zlib.compress(pickle.dumps(self._get_snapshot(), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def restore(self, snapshot: bytes) -> None:
+        """ Brings the game back to the state saved by `snapshot`.
+
+        .. warning:: Snapshots get unpickled, only restore the ones you trust.
+
+        Arguments:
+            snapshot: Output of `snapshot()`, for the game currently loaded.
+        """
+        self._set_snapshot(pickle.loads(zlib.decompress(snapshot)))
+
+    def _get_snapshot(self) -> Any:
+        """ Picklable data, as compact as possible, from which `_set_snapshot` can restore the current state. """
+        raise NotImplementedError()
+
+    def _set_snapshot(self, data: Any) -> None:
+        raise NotImplementedError()
+
     @property
     def display_command_during_render(self) -> bool:
         """ Enables/disables displaying the command when rendering. """
@@ -364,6 +443,28 @@ class Wrapper:
     def copy(self) -> "Wrapper":
         raise NotImplementedError()
 
+    def peek(self, commands: Iterable[str]) -> List[Tuple[GameState, float, bool]]:
+        return Environment.peek(self, commands)
+
+    def _checkpoint(self) -> Any:
+        # Wrappers keeping track of their own state need to save it too.
+        return self._wrapped_env._checkpoint()
+
+    def _restore(self, checkpoint: Any) -> None:
+        self._wrapped_env._restore(checkpoint)
+
+    def snapshot(self) -> bytes:
+        return Environment.snapshot(self)
+
+    def restore(self, snapshot: bytes) -> None:
+        Environment.restore(self, snapshot)
+
+    def _get_snapshot(self) -> Any:
+        return self._wrapped_env._get_snapshot()
+
+    def _set_snapshot(self, data: Any) -> None:
+        self._wrapped_env._set_snapshot(data)
+
     @property
     def display_command_during_render(self) -> bool:
         return self._wrapped_env.display_command_during_render()
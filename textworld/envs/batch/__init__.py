@@ -7,12 +7,30 @@ except ImportError:
 
 from textworld.envs.batch.batch_env import AsyncBatchEnv
 from textworld.envs.batch.batch_env import SyncBatchEnv
+from textworld.utils import get_context
+from textworld.envs.batch.asyncio_env import AsyncioEnv, AsyncioBatchEnv
 
 
 __all__ = ['make']
 
 
-def make(game_files, asynchronous=True, wrappers=None, **kwargs):
+def _make_env(game_file, wrappers, **kwargs):
+    # Defined at the module level to be picklable (needed by the "spawn" and "forkserver" start methods).
+    from textworld import start as start_
+
+    env = start_(game_file, **kwargs)
+    if wrappers is not None:
+        if callable(wrappers):
+            env = wrappers(env)
+        elif isinstance(wrappers, Iterable) and all([callable(w) for w in wrappers]):
+            for wrapper in wrappers:
+                env = wrapper(env)
+        else:
+            raise NotImplementedError
+    return env
+
+
+def make(game_files, asynchronous=True, wrappers=None, start_method=None, **kwargs):
     """Create a batch environment from a list of game files.
 
     Parameters
@@ -26,25 +44,17 @@ def make(game_files, asynchronous=True, wrappers=None, **kwargs):
     wrappers : Callable or Iterable of Callables (default: `None`)
         If not `None`, then apply the wrappers to each internal
         environment during creation.
+    start_method : {None, "fork", "spawn", "forkserver"} (default: `None`)
+        Method used to start the worker processes when `asynchronous=True`
+        (see `textworld.utils.get_context`).
 
     Returns
     -------
     env : `textworld.envs.batch.BatchEnv` instance
         The batch environment.
     """
-    from textworld import start as start_
+    env_fns = [partial(_make_env, game_file, wrappers, **kwargs) for game_file in game_files]
+    if asynchronous:
+        return AsyncBatchEnv(env_fns, start_method=start_method)
 
-    def _make_env(game_file):
-        env = start_(game_file, **kwargs)
-        if wrappers is not None:
-            if callable(wrappers):
-                env = wrappers(env)
-            elif isinstance(wrappers, Iterable) and all([callable(w) for w in wrappers]):
-                for wrapper in wrappers:
-                    env = wrapper(env)
-            else:
-                raise NotImplementedError
-        return env
-
-    env_fns = [partial(_make_env, game_file=game_file) for game_file in game_files]
-    return AsyncBatchEnv(env_fns) if asynchronous else SyncBatchEnv(env_fns)
+    return SyncBatchEnv(env_fns)
@@ -0,0 +1,16 @@
+"""
+Imported by the forkserver (see `textworld.utils.FORKSERVER_PRELOAD`)
+so that TextWorld, Jericho and the default knowledge base are loaded only
+once, instead of in every worker.
+"""
+
+# Modules that `import textworld` only imports on demand.
+import jericho  # noqa: F401
+import networkx  # noqa: F401
+import textworld.envs.pddl.logic  # noqa: F401
+
+import textworld
+import textworld.gym  # noqa: F401
+from textworld.generator.data import KnowledgeBase
+
+KnowledgeBase.default()
@@ -0,0 +1,295 @@
+import time
+import asyncio
+import pickle
+import socket
+import struct
+from typing import Any, Tuple, List, Dict, Optional
+
+import numpy as np
+
+from textworld.core import GameState
+from textworld.utils import get_context
+from textworld.envs.batch.batch_env import _batch_outcomes, _child, _list_of_dicts_to_dict_of_lists
+
+
+_HEADER = struct.Struct("!I")  # Size (in bytes) of the pickled message that follows.
+
+
+class _SocketConnection:
+    """
+    Blocking, `multiprocessing.Connection`-like, wrapper around a socket.
+
+    Messages are pickled and prefixed with their size.
+    """
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+
+    def _recv_exactly(self, size: int) -> bytes:
+        buffer = bytearray()
+        while len(buffer) < size:
+            chunk = self._sock.recv(size - len(buffer))
+            if not chunk:
+                raise EOFError
+
+            buffer += chunk
+
+        return bytes(buffer)
+
+    def send(self, obj: Any) -> None:
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        self._sock.sendall(_HEADER.pack(len(data)) + data)
+
+    def recv(self) -> Any:
+        size, = _HEADER.unpack(self._recv_exactly(_HEADER.size))
+        return pickle.loads(self._recv_exactly(size))
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class AsyncioEnv:
+    """ Environment running in a child process that is driven by `asyncio`.
+
+    Every method is a coroutine so that a single event loop can drive
+    many environments (and anything else, e.g. remote model inference)
+    concurrently.
+
+    Example:
+
+        >>> env = AsyncioEnv(partial(textworld.start, gamefile, request_infos))
+        >>> game_state = await env.reset()
+        >>> game_state, score, done = await env.step("go east")
+        >>> await env.close()
+
+    .. note:: Everything returned by the environment gets pickled. Consider
+              wrapping it with :py:class:`textworld.envs.wrappers.Filter`.
+    """
+
+    def __init__(self, env_fn: callable, start_method: Optional[str] = None):
+        """
+        Arguments:
+            env_fn: Function that creates the environment. It has to be picklable
+                    (e.g., use `functools.partial` instead of lambda functions).
+            start_method: Method used to start the worker process
+                          (see :py:func:`textworld.utils.get_context`).
+        """
+        ctx = get_context(start_method)
+        self._sock, child_sock = socket.socketpair()
+        self._process = ctx.Process(target=_child,
+                                    args=(env_fn, _SocketConnection(self._sock), _SocketConnection(child_sock)))
+        self._process.daemon = True
+        self._start_time = time.time()
+        self._process.start()
+        child_sock.close()
+
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self.startup_time = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            # Created lazily to bind it to the running event loop.
+            self._lock = asyncio.Lock()
+
+        return self._lock
+
+    async def _recv(self) -> Any:
+        size, = _HEADER.unpack(await self._reader.readexactly(_HEADER.size))
+        return pickle.loads(await self._reader.readexactly(size))
+
+    async def _connect(self) -> None:
+        # Must be called while holding the lock.
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(sock=self._sock)
+            self.startup_time = await self._recv() - self._start_time
+
+    async def _send(self, command: Tuple) -> None:
+        # Must be called while holding the lock.
+        await self._connect()
+        data = pickle.dumps(command, protocol=pickle.HIGHEST_PROTOCOL)
+        self._writer.write(_HEADER.pack(len(data)) + data)
+        await self._writer.drain()
+
+    async def _request(self, *command) -> Any:
+        # Requests are processed one at a time by the child process.
+        async with self._get_lock():
+            await self._send(command)
+            return await self._recv()
+
+    async def wait_ready(self) -> float:
+        """ Waits for the env to be created and returns the worker's startup time (in seconds). """
+        async with self._get_lock():
+            await self._connect()
+
+        return self.startup_time
+
+    async def call(self, method: str, *args) -> Any:
+        """ Calls a method (e.g., "unwrapped.load") of the remote environment. """
+        return await self._request("call", method, args)
+
+    async def get(self, attr: str) -> Any:
+        """ Gets an attribute (e.g., "request_infos.admissible_commands") of the remote environment. """
+        return await self._request("get", attr)
+
+    async def hasattr(self, attr: str) -> bool:
+        """ Checks whether the remote environment has a given attribute. """
+        return await self._request("hasattr", attr)
+
+    async def load(self, path: str) -> None:
+        """ Loads a new text-based game. """
+        return await self.call("load", path)
+
+    async def prefetch(self, path: str) -> None:
+        """ Starts loading a game in the background (see `AsyncBatchEnv.prefetch`). """
+        async with self._get_lock():
+            await self._send(("prefetch", path))
+
+    async def reset(self) -> GameState:
+        """ Starts game from the beginning. """
+        return await self.call("reset")
+
+    async def step(self, command: str) -> Tuple[GameState, float, bool]:
+        """ Performs a given command. """
+        return await self.call("step", command)
+
+    async def peek(self, commands: List[str]) -> List[Tuple[GameState, float, bool]]:
+        """ Evaluates commands from the current state without changing it. """
+        return await self.call("peek", commands)
+
+    async def seed(self, seed: Optional[int] = None) -> Any:
+        """ Sets the seed for the random number generator. """
+        return await self.call("seed", seed)
+
+    async def render(self, mode: str = "human") -> Any:
+        """ Renders the current state of the game (from the child process). """
+        return await self.call("render", mode)
+
+    async def close(self) -> None:
+        """ Closes the game and stops the child process. """
+        if not self._process.is_alive():
+            return
+
+        await self.call("close")
+        async with self._get_lock():
+            await self._send(("close",))
+            self._writer.close()
+
+        await asyncio.get_running_loop().run_in_executor(None, self._process.join)
+
+    def __del__(self):
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+
+
+class AsyncioBatchEnv:
+    """ Environment to run multiple games in parallel using `asyncio`.
+
+    Same interface as :py:class:`AsyncBatchEnv <textworld.envs.batch.batch_env.AsyncBatchEnv>`
+    except that every method is a coroutine.
+    """
+
+    def __init__(self, env_fns: List[callable], auto_reset: bool = False,
+                 start_method: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        env_fns : iterable of callable
+            Functions that create the environments.
+        auto_reset : bool
+            If `True`, each game *independently* resets once it is done.
+        start_method : {None, "fork", "spawn", "forkserver"}
+            Method used to start the worker processes
+            (see :py:func:`textworld.utils.get_context`).
+        """
+        self.env_fns = env_fns
+        self.auto_reset = auto_reset
+        self.batch_size = len(self.env_fns)
+        self.envs = [AsyncioEnv(env_fn, start_method) for env_fn in self.env_fns]
+        self.last = [None] * self.batch_size
+
+    async def startup_times(self) -> List[float]:
+        """ Time (in seconds) each worker took to start and create its environment. """
+        return await asyncio.gather(*(env.wait_ready() for env in self.envs))
+
+    async def load(self, game_files: List[str]) -> None:
+        assert len(game_files) == len(self.envs)
+        await asyncio.gather(*(env.load(game_file) for env, game_file in zip(self.envs, game_files)))
+
+    async def prefetch(self, game_files: List[str]) -> None:
+        assert len(game_files) == len(self.envs)
+        await asyncio.gather(*(env.prefetch(game_file) for env, game_file in zip(self.envs, game_files)))
+
+    async def seed(self, seed=None):
+        seeds = seed
+        if seeds is None or isinstance(seeds, int):
+            # Use a different seed for each env to decorrelate batch examples.
+            rng = np.random.RandomState(seeds)
+            seeds = list(rng.randint(65635, size=self.batch_size))
+
+        await asyncio.gather(*(env.seed(seed) for env, seed in zip(self.envs, seeds)))
+        return seeds
+
+    async def reset(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        """
+        Reset all environments of the batch.
+
+        Returns:
+            obs: Text observations, i.e. command's feedback.
+            infos: Information requested when creating the environments.
+        """
+        self.last = [None] * self.batch_size
+        results = await asyncio.gather(*(env.reset() for env in self.envs))
+        obs, infos = zip(*results)
+        infos = _list_of_dicts_to_dict_of_lists(infos)
+        return obs, infos
+
+    async def _step(self, i: int, action: str) -> Tuple[str, float, bool, Dict[str, Any]]:
+        if self.last[i] is not None and self.last[i][2]:  # Game has ended on the last step.
+            if not self.auto_reset:
+                return self.last[i]  # Copy last state over.
+
+            obs, infos = await self.envs[i].reset()
+            return obs, 0., False, infos
+
+        return await self.envs[i].step(action)
+
+    async def step(self, actions: List[str]) -> Tuple[List[str], int, bool, Dict[str, List[str]]]:
+        """
+        Perform one action per environment of the batch.
+
+        Returns:
+            obs: Text observations, i.e. command's feedback.
+            reward: Current game score.
+            done: Whether the game is over or not.
+            infos: Information requested when creating the environments.
+        """
+        assert isinstance(actions, (list, tuple)), "Expected a list of actions."
+        assert len(actions) == len(self.envs), "Expected one action per environment."
+
+        results = await asyncio.gather(*(self._step(i, action) for i, action in enumerate(actions)))
+        obs, rewards, dones, infos = zip(*results)
+        self.last = results
+        infos = _list_of_dicts_to_dict_of_lists(infos)
+        return obs, rewards, dones, infos
+
+    async def peek(self, commands: List[List[str]]
+                   ) -> Tuple[List[List[str]], List[List[int]], List[List[bool]], Dict[str, List[List]]]:
+        """
+        Evaluate several commands per environment without changing their state.
+
+        Returns:
+            Same as `step` except there is a list, one item per command, for each environment.
+        """
+        assert isinstance(commands, (list, tuple)), "Expected a list of commands."
+        assert len(commands) == len(self.envs), "Expected a list of commands per environment."
+
+        results = await asyncio.gather(*(env.peek(commands_) for env, commands_ in zip(self.envs, commands)))
+        return _batch_outcomes(results)
+
+    async def render(self, mode='human'):
+        return await asyncio.gather(*(env.render(mode) for env in self.envs))
+
+    async def close(self):
+        await asyncio.gather(*(env.close() for env in self.envs))
@@ -1,10 +1,18 @@
 
+import time
+import warnings
+import threading
 import multiprocessing as mp
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 
 import numpy as np
 
 from textworld.core import Environment
+from textworld.utils import get_context, FORKSERVER_PRELOAD  # noqa: F401
+
+
+# Errors indicating a worker died or is hanging.
+_WORKER_ERRORS = (TimeoutError, EOFError, OSError)
 
 
 def _list_of_dicts_to_dict_of_lists(list_: List[Dict]) -> Dict[str, List]:
@@ -13,19 +21,110 @@ def _list_of_dicts_to_dict_of_lists(list_: List[Dict]) -> Dict[str, List]:
     return {key: [dict_.get(key) for dict_ in list_] for key in keys}
 
 
+def _batch_outcomes(outcomes_per_env: List[List[Tuple]]) -> Tuple[List[List], List[List], List[List], Dict[str, List[List]]]:
+    """
+    Converts the outcomes of `peek` into the same layout as `step`, with one list per environment.
+    """
+    results = []
+    for outcomes in outcomes_per_env:
+        obs, rewards, dones, infos = zip(*outcomes) if outcomes else ((), (), (), ())
+        results.append((list(obs), list(rewards), list(dones), _list_of_dicts_to_dict_of_lists(infos)))
+
+    obs, rewards, dones, infos = zip(*results)
+    infos = _list_of_dicts_to_dict_of_lists(infos)
+    return obs, rewards, dones, infos
+
+
+def _can_prefetch(game_file):
+    """
+    Whether a game can be loaded in a background thread while another one is being played.
+
+    Only backends written in pure Python are known to be thread-safe. Jericho's
+    interpreters, for instance, would be running concurrently in the same process.
+    """
+    from textworld.envs import _guess_backend, PddlEnv, TextWorldEnv
+    try:
+        return issubclass(_guess_backend(game_file), (TextWorldEnv, PddlEnv))
+    except (ValueError, NotImplementedError):
+        return False  # Unknown backend.
+
+
+def _prefetch(env, game_file, status):
+    """
+    Loads a game in a spare environment (run in a background thread).
+    """
+    try:
+        env.load(game_file)
+        status["loaded"] = True
+    except Exception:
+        # The error will be raised again when the game is actually loaded.
+        status["loaded"] = False
+
+
 def _child(env_fn, parent_pipe, pipe):
     """
     Event loop run by the child processes
     """
+    env = None
+    spare_env = None  # Environment used to load the next game in the background.
+    prefetched = None  # Tuple (game_file, thread, status) for the game being prefetched.
+    last_seed = None
     try:
         parent_pipe.close()
 
         env = env_fn()
+        pipe.send(time.time())  # Let the parent know the worker is ready.
 
         while True:
-            command = pipe.recv()
+            try:
+                command = pipe.recv()
+            except EOFError:
+                break  # The parent process is gone.
+
             # command is a tuple like ("call" | "get", "name.of.attr", extra args...)
 
+            if command[0] == "prefetch":
+                # Fire-and-forget: no result is sent back to the parent.
+                game_file = command[1]
+                if prefetched is not None:
+                    prefetched[1].join()
+                    prefetched = None
+
+                if not _can_prefetch(game_file):
+                    continue  # The game will be loaded by the next `load`.
+
+                if spare_env is None:
+                    spare_env = env_fn()
+                    if last_seed is not None:
+                        spare_env.seed(*last_seed)
+
+                status = {}
+                thread = threading.Thread(target=_prefetch, args=(spare_env, game_file, status), daemon=True)
+                thread.start()
+                prefetched = (game_file, thread, status)
+                continue
+
+            if command[:2] == ("call", "load") and prefetched is not None:
+                game_file, thread, status = prefetched
+                prefetched = None
+                thread.join()
+                if game_file == command[2][0] and status.get("loaded"):
+                    # The game is already loaded in the spare environment, swap them.
+                    env, spare_env = spare_env, env
+                    pipe.send(None)
+                    continue
+
+            if command[:2] == ("call", "seed"):
+                last_seed = command[2]
+                if prefetched is not None:
+                    prefetched[1].join()
+
+                if spare_env is not None:
+                    spare_env.seed(*last_seed)
+
+            if command[0] == "close":
+                break
+
             obj = env
             attrs = command[1].split(".")
             for attr in attrs[:-1]:
@@ -38,13 +137,19 @@ def _child(env_fn, parent_pipe, pipe):
                 result = getattr(obj, attrs[-1])
             elif command[0] == "hasattr":
                 result = hasattr(obj, attrs[-1])
-            elif command[0] == "close":
-                break
 
             pipe.send(result)
 
     finally:
-        env.close()
+        if prefetched is not None:
+            prefetched[1].join()
+
+        if spare_env is not None:
+            spare_env.close()
+
+        if env is not None:
+            env.close()
+
         pipe.close()
 
 
@@ -52,14 +157,75 @@ class _ChildEnv:
     """
     Wrapper for an env in a child process.
     """
-    def __init__(self, env_fn):
-        self._pipe, child_pipe = mp.Pipe()
-        self._process = mp.Process(target=_child, args=(env_fn, self._pipe, child_pipe))
+    def __init__(self, env_fn, ctx=mp):
+        self._env_fn = env_fn
+        self._ctx = ctx
+        self._game_file = None  # Last game loaded, used when restarting the worker.
+        self._seed = None  # Last seed used, used when restarting the worker.
+        self._start()
+
+    def _start(self):
+        self._pipe, child_pipe = self._ctx.Pipe()
+        self._process = self._ctx.Process(target=_child, args=(self._env_fn, self._pipe, child_pipe))
         self._process.daemon = True
+        self._start_time = time.time()
         self._process.start()
         child_pipe.close()
+        self.startup_time = None
+
+    def _stop(self, timeout=1):
+        if self._process.is_alive():
+            try:
+                self._pipe.send(("close",))  # Let the worker close its env.
+            except OSError:
+                pass  # Worker is gone.
+
+            self._process.join(timeout)
+
+        if self._process.is_alive():
+            self._process.kill()  # Hanging worker.
+            self._process.join()
+
+        self._pipe.close()
+
+    def restart(self, timeout=None):
+        """ Replaces the worker with a new one and reloads its last game.
+
+        Raises:
+            TimeoutError: if the new worker doesn't respond within `timeout` seconds.
+            EOFError: if the new worker died.
+        """
+        self._stop(timeout=0)
+        self._start()
+        if self._seed is not None:
+            self.call("seed", *self._seed)
+            self.result(timeout)
+
+        if self._game_file is not None:
+            self.call("load", self._game_file)
+            self.result(timeout)
+
+    def kill(self):
+        """ Stops the worker without waiting for it. """
+        self._stop(timeout=0)
+
+    @property
+    def alive(self):
+        return self._process.is_alive()
+
+    def wait_ready(self):
+        """ Waits for the env to be created and returns the worker's startup time (in seconds). """
+        if self.startup_time is None:
+            self.startup_time = self._pipe.recv() - self._start_time
+
+        return self.startup_time
 
     def call(self, method, *args):
+        if method == "load":
+            self._game_file = args[0]
+        elif method == "seed":
+            self._seed = args
+
         self._pipe.send(("call", method, args))
 
     def get(self, attr):
@@ -68,7 +234,26 @@ class _ChildEnv:
     def hasattr(self, attr):
         self._pipe.send(("hasattr", attr))
 
-    def result(self):
+    def prefetch(self, game_file):
+        self._pipe.send(("prefetch", game_file))
+
+    def _poll(self, timeout):
+        if not self._pipe.poll(timeout):
+            raise TimeoutError("Worker didn't respond within {} seconds.".format(timeout))
+
+    def result(self, timeout=None):
+        """ Waits for the result of the last command.
+
+        Raises:
+            TimeoutError: if the result is not available after `timeout` seconds.
+            EOFError: if the worker died.
+        """
+        if self.startup_time is None:
+            self._poll(timeout)  # The worker might hang while creating its env.
+            self.wait_ready()
+
+        self._poll(timeout)
+
         return self._pipe.recv()
 
     def call_sync(self, *args):
@@ -84,38 +269,84 @@ class _ChildEnv:
         return self.result()
 
     def __del__(self):
-        self.call_sync("close")
-        self._pipe.close()
-        self._process.terminate()
-        self._process.join()
+        self._stop()
 
 
 class AsyncBatchEnv(Environment):
     """ Environment to run multiple games in parallel asynchronously. """
 
-    def __init__(self, env_fns: List[callable], auto_reset: bool = False):
+    def __init__(self, env_fns: List[callable], auto_reset: bool = False,
+                 start_method: Optional[str] = None, timeout: Optional[float] = None):
         """
         Parameters
         ----------
         env_fns : iterable of callable
             Functions that create the environments.
+        auto_reset : bool
+            If `True`, each game *independently* resets once it is done.
+        start_method : {None, "fork", "spawn", "forkserver"}
+            Method used to start the worker processes (see `get_context`).
+            Use "forkserver" to start the workers from a warm image.
+        timeout : float, optional
+            Maximum time (in seconds) allowed for each `load`, `reset` or `step`
+            call of an environment. Workers that exceed it, or that die, are restarted
+            and reload their game while the rest of the batch keeps going. The
+            affected episode is then reported as done (see `truncated`).
+            By default, wait indefinitely.
         """
         self.env_fns = env_fns
         self.auto_reset = auto_reset
         self.batch_size = len(self.env_fns)
+        self.timeout = timeout
+        self.last = [None] * self.batch_size
+        #: List[bool]: Whether each episode got truncated during the last `step`
+        #:             because its worker died or timed out.
+        self.truncated = [False] * self.batch_size
 
+        ctx = get_context(start_method)
         self.envs = []
         for env_fn in self.env_fns:
-            self.envs.append(_ChildEnv(env_fn))
+            self.envs.append(_ChildEnv(env_fn, ctx))
+
+    @property
+    def startup_times(self) -> List[float]:
+        """ Time (in seconds) each worker took to start and create its environment. """
+        return [env.wait_ready() for env in self.envs]
 
     def load(self, game_files: List[str]) -> None:
         assert len(game_files) == len(self.envs)
-        for env, game_file in zip(self.envs, game_files):
-            env.call("load", game_file)
+        loading = []
+        for i, (env, game_file) in enumerate(zip(self.envs, game_files)):
+            try:
+                env.call("load", game_file)
+                loading.append(i)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)  # Also loads the game.
 
         # Join
-        for env in self.envs:
-            env.result()
+        for i in loading:
+            try:
+                self.envs[i].result(self.timeout)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+
+    def prefetch(self, game_files: List[str]) -> None:
+        """
+        Start loading the next games in the background.
+
+        Each child process loads its game in a spare environment while the
+        current game keeps being played. The next call to `load` with the
+        same game files will simply swap the environments. Games whose backend
+        isn't thread-safe (e.g. Z-Machine games) are only loaded by `load`.
+
+        Parameters
+        ----------
+        game_files : list of str
+            The game files that will be passed to the next `load` call.
+        """
+        assert len(game_files) == len(self.envs)
+        for env, game_file in zip(self.envs, game_files):
+            env.prefetch(game_file)
 
     def seed(self, seed=None):
         seeds = seed
@@ -129,6 +360,23 @@ class AsyncBatchEnv(Environment):
 
         return seeds
 
+    def _restart(self, i: int, error: Exception) -> None:
+        msg = "Restarting environment #{} of the batch ({}: {})."
+        warnings.warn(msg.format(i, type(error).__name__, error), RuntimeWarning)
+        try:
+            self.envs[i].restart(self.timeout)
+        except _WORKER_ERRORS as e:
+            # Leave it dead, it will be restarted again when next used.
+            msg = "Failed to restart environment #{} of the batch ({}: {})."
+            warnings.warn(msg.format(i, type(e).__name__, e), RuntimeWarning)
+            self.envs[i].kill()
+
+    def _truncate(self, i: int) -> Tuple[str, float, bool, Dict]:
+        # Episode is over, carry over the last known score and infos.
+        _, score, _, infos = self.last[i] or ("", 0, False, {})
+        self.truncated[i] = True
+        return "", score, True, infos
+
     def reset(self) -> Tuple[List[str], Dict[str, List[str]]]:
         """
         Reset all environments of the batch.
@@ -138,10 +386,36 @@ class AsyncBatchEnv(Environment):
             infos: Information requested when creating the environments.
         """
         self.last = [None] * self.batch_size
-        for env in self.envs:
-            env.call("reset")
+        self.truncated = [False] * self.batch_size
+        results = [None] * self.batch_size
+        resetting = []
+        for i, env in enumerate(self.envs):
+            try:
+                env.call("reset")
+                resetting.append(i)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+
+        # Join
+        for i in resetting:
+            try:
+                results[i] = self.envs[i].result(self.timeout)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+
+        for i, env in enumerate(self.envs):
+            if results[i] is not None:
+                continue
+
+            # Try again once.
+            try:
+                env.call("reset")
+                results[i] = env.result(self.timeout)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+                self.last[i] = self._truncate(i)  # The episode is over before it started.
+                results[i] = ("", {})
 
-        results = [env.result() for env in self.envs]
         obs, infos = zip(*results)
         infos = _list_of_dicts_to_dict_of_lists(infos)
         return obs, infos
@@ -159,27 +433,88 @@ class AsyncBatchEnv(Environment):
         assert isinstance(actions, (list, tuple)), "Expected a list of actions."
         assert len(actions) == len(self.envs), "Expected one action per environment."
 
+        self.truncated = [False] * self.batch_size
         results = []
+        resetting = []
         for i, (env, action) in enumerate(zip(self.envs, actions)):
             if self.last[i] is not None and self.last[i][2]:  # Game has ended on the last step.
-                obs, reward, done, infos = self.last[i]  # Copy last state over.
-
                 if self.auto_reset:
-                    reward, done = 0., False
-                    obs, infos = env.call_sync("reset")
-
-                results.append((obs, reward, done, infos))
+                    # Reset concurrently with the other environments' step.
+                    command = ("reset",)
+                else:
+                    results.append(self.last[i])  # Copy last state over.
+                    resetting.append(False)
+                    continue
 
             else:
-                env.call("step", action)
+                command = ("step", action)
+
+            resetting.append(command[0] == "reset")
+            try:
+                env.call(*command)
                 results.append(None)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+                results.append(self._truncate(i))
+
+        # Join
+        for i, env in enumerate(self.envs):
+            if results[i] is not None:
+                continue
+
+            try:
+                result = env.result(self.timeout)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+                results[i] = self._truncate(i)
+                continue
+
+            if resetting[i]:
+                obs, infos = result
+                result = (obs, 0., False, infos)
+
+            results[i] = result
 
-        results = [result or env.result() for env, result in zip(self.envs, results)]
         obs, rewards, dones, infos = zip(*results)
         self.last = results
         infos = _list_of_dicts_to_dict_of_lists(infos)
         return obs, rewards, dones, infos
 
+    def peek(self, commands: List[List[str]]
+             ) -> Tuple[List[List[str]], List[List[int]], List[List[bool]], Dict[str, List[List]]]:
+        """
+        Evaluate several commands per environment without changing their state.
+
+        Returns:
+            Same as `step` except there is a list, one item per command, for each environment.
+        """
+        assert isinstance(commands, (list, tuple)), "Expected a list of commands."
+        assert len(commands) == len(self.envs), "Expected a list of commands per environment."
+
+        results = []
+        for i, (env, commands_) in enumerate(zip(self.envs, commands)):
+            try:
+                env.call("peek", commands_)
+                results.append(None)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+                self.last[i] = self._truncate(i)
+                results.append([])
+
+        # Join
+        for i, env in enumerate(self.envs):
+            if results[i] is not None:
+                continue
+
+            try:
+                results[i] = env.result(self.timeout)
+            except _WORKER_ERRORS as e:
+                self._restart(i, e)
+                self.last[i] = self._truncate(i)
+                results[i] = []
+
+        return _batch_outcomes(results)
+
     def render(self, mode='human'):
         for env in self.envs:
             env.call("render", mode)
@@ -187,12 +522,20 @@ class AsyncBatchEnv(Environment):
         return [env.result() for env in self.envs]
 
     def close(self):
-        for env in self.envs:
-            env.call("close")
+        closing = []
+        for i, env in enumerate(self.envs):
+            try:
+                env.call("close")
+                closing.append(i)
+            except _WORKER_ERRORS:
+                env.kill()  # No need to restart a worker that is being closed.
 
         # Join
-        for env in self.envs:
-            env.result()
+        for i in closing:
+            try:
+                self.envs[i].result(self.timeout)
+            except _WORKER_ERRORS:
+                self.envs[i].kill()
 
     def __del__(self):
         self.close()
@@ -218,6 +561,10 @@ class SyncBatchEnv(Environment):
         for env, game_file in zip(self.envs, game_files):
             env.load(game_file)
 
+    def prefetch(self, game_files: List[str]) -> None:
+        """ Does nothing since games are loaded synchronously. """
+        pass
+
     def seed(self, seed=None):
         seeds = seed
         if seeds is None or isinstance(seeds, int):
@@ -276,6 +623,19 @@ class SyncBatchEnv(Environment):
         infos = _list_of_dicts_to_dict_of_lists(infos)
         return obs, rewards, dones, infos
 
+    def peek(self, commands: List[List[str]]
+             ) -> Tuple[List[List[str]], List[List[int]], List[List[bool]], Dict[str, List[List]]]:
+        """
+        Evaluate several commands per environment without changing their state.
+
+        Returns:
+            Same as `step` except there is a list, one item per command, for each environment.
+        """
+        assert isinstance(commands, (list, tuple)), "Expected a list of commands."
+        assert len(commands) == len(self.envs), "Expected a list of commands per environment."
+
+        return _batch_outcomes([env.peek(commands_) for env, commands_ in zip(self.envs, commands)])
+
     def render(self, mode='human'):
         return [env.render(mode=mode) for env in self.envs]
 
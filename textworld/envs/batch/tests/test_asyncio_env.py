@@ -0,0 +1,60 @@
+import asyncio
+from functools import partial
+
+from textworld import EnvInfos
+from textworld.utils import make_temp_directory
+from textworld.testing import make_json_games
+from textworld.gym.envs.textworld_batch import _make_env
+from textworld.envs.batch import AsyncioEnv, AsyncioBatchEnv, SyncBatchEnv
+
+
+def test_asyncio_env():
+    with make_temp_directory() as tmpdir:
+        gamefile, = make_json_games(tmpdir, [1234])
+        request_infos = EnvInfos(admissible_commands=True, extras=["walkthrough"])
+
+        async def _play():
+            env = AsyncioEnv(partial(_make_env, request_infos))
+            await env.load(gamefile)
+            obs, infos = await env.reset()
+            assert await env.get("request_infos.admissible_commands")
+            for cmd in infos["extra.walkthrough"]:
+                obs, score, done, infos = await env.step(cmd)
+
+            await env.close()
+            return score, done
+
+        assert asyncio.run(_play()) == (1, True)
+
+
+def test_asyncio_batch_env():
+    batch_size = 4
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1234, 4321]) * 2
+        request_infos = EnvInfos(admissible_commands=True, score=True)
+        env_fns = [partial(_make_env, request_infos) for _ in range(batch_size)]
+
+        # Should be equivalent to a synchronous batch env.
+        sync_env = SyncBatchEnv(env_fns)
+        sync_env.load(gamefiles)
+        expected = [sync_env.reset()]
+        for _ in range(3):
+            commands = [cmds[0] for cmds in expected[-1][-1]["admissible_commands"]]
+            expected.append(sync_env.step(commands))
+
+        expected.append(sync_env.peek(expected[-1][-1]["admissible_commands"]))
+        sync_env.close()
+
+        async def _play():
+            env = AsyncioBatchEnv(env_fns)
+            await env.load(gamefiles)
+            results = [await env.reset()]
+            for _ in range(3):
+                commands = [cmds[0] for cmds in results[-1][-1]["admissible_commands"]]
+                results.append(await env.step(commands))
+
+            results.append(await env.peek(results[-1][-1]["admissible_commands"]))
+            await env.close()
+            return results
+
+        assert asyncio.run(_play()) == expected
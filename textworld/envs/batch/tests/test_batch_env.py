@@ -1,9 +1,15 @@
+import os
+import time
+import tempfile
 from functools import partial
 
+import pytest
+
 import textworld
 import textworld.gym
 from textworld import EnvInfos
 from textworld.utils import make_temp_directory
+from textworld.testing import make_json_games
 from textworld.envs import JerichoEnv
 from textworld.envs.batch.batch_env import AsyncBatchEnv, SyncBatchEnv
 
@@ -62,3 +68,244 @@ def test_seed():
         assert seed == env_.get_sync("_seed")
 
     env.close()
+
+
+def test_auto_reset_async():
+    batch_size = 3
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1234, 4321])
+        request_infos = EnvInfos(admissible_commands=True, extras=["walkthrough"])
+        env_fns = [partial(textworld.gym.envs.textworld_batch._make_env, request_infos) for _ in range(batch_size)]
+        env = AsyncBatchEnv(env_fns, auto_reset=True)
+        env.load([gamefiles[0]] * batch_size)
+        obs, infos = env.reset()
+        walkthrough = infos["extra.walkthrough"][0]
+
+        # Only the first game gets played to the end.
+        for i, cmd in enumerate(walkthrough):
+            obs, scores, dones, infos = env.step([cmd, "wait", "wait"])
+            assert dones == (i == len(walkthrough) - 1, False, False)
+
+        assert scores[0] == 1
+
+        # Next step resets the first game while the others keep being played.
+        obs, scores, dones, infos = env.step(["wait"] * batch_size)
+        assert scores[0] == 0 and not dones[0]
+        assert infos["admissible_commands"][0] == infos["admissible_commands"][1]
+        env.close()
+
+
+def test_prefetch():
+    batch_size = 2
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1, 2, 3])
+        request_infos = EnvInfos(objective=True)
+
+        def _play(prefetch):
+            env = textworld.gym.envs.TextworldBatchGymEnv(gamefiles, request_infos, batch_size=batch_size,
+                                                          asynchronous=True, prefetch=prefetch)
+            objectives = []
+            for _ in range(4):
+                _, infos = env.reset()
+                objectives.append(infos["objective"])
+                env.skip(1)
+
+            env.close()
+            return objectives
+
+        # Prefetching must not change the order in which the games are played.
+        assert _play(prefetch=True) == _play(prefetch=False)
+
+
+def test_prefetch_zmachine():
+    with make_temp_directory() as tmpdir:
+        options = textworld.GameOptions()
+        options.path = tmpdir
+        options.file_ext = ".z8"
+        gamefiles = []
+        for seed in [1234, 4321]:
+            options.seeds = seed
+            gamefile, _ = textworld.make(options)
+            gamefiles.append(gamefile)
+
+        request_infos = EnvInfos(inventory=True, extras=["walkthrough"])
+        env = AsyncBatchEnv([partial(textworld.gym.envs.textworld_batch._make_env, request_infos)])
+        env.load(gamefiles[:1])
+        obs, infos = env.reset()
+
+        # Prefetching the next game doesn't affect the one being played.
+        env.prefetch(gamefiles[1:])
+        for cmd in infos["extra.walkthrough"][0]:
+            obs, scores, dones, infos = env.step([cmd])
+
+        assert dones == (True,)
+
+        env.load(gamefiles[1:])
+        obs, infos = env.reset()
+        expected = textworld.start(gamefiles[1], request_infos).reset()
+        assert obs[0] == expected.feedback
+        assert infos["inventory"][0] == expected.inventory
+        env.close()
+
+
+def test_start_method():
+    batch_size = 2
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1234, 4321])
+        request_infos = EnvInfos(admissible_commands=True)
+        env_fns = [partial(textworld.gym.envs.textworld_batch._make_env, request_infos) for _ in range(batch_size)]
+
+        results = []
+        for start_method in ["spawn", "forkserver"]:
+            env = AsyncBatchEnv(env_fns, start_method=start_method)
+            startup_times = env.startup_times
+            assert len(startup_times) == batch_size
+            assert all(t > 0 for t in startup_times)
+
+            env.load(gamefiles)
+            results.append(env.reset())
+            env.close()
+
+        assert results[0] == results[1]
+
+
+class _FaultyEnv(textworld.core.Wrapper):
+    """ Crashes or hangs on demand. """
+
+    #: Games whose loading hangs as long as this file exists.
+    hang_on_load = os.path.join(tempfile.gettempdir(), "tw-hang-on-load-{}".format(os.getpid()))
+    #: Games whose reset hangs as long as this file exists.
+    hang_on_reset = os.path.join(tempfile.gettempdir(), "tw-hang-on-reset-{}".format(os.getpid()))
+
+    def load(self, path):
+        if os.path.exists(self.hang_on_load):
+            time.sleep(60)
+
+        return super().load(path)
+
+    def reset(self):
+        if os.path.exists(self.hang_on_reset):
+            time.sleep(60)
+
+        return super().reset()
+
+    def step(self, command):
+        if command == "crash":
+            os._exit(1)
+        elif command == "hang":
+            time.sleep(60)
+
+        return super().step(command)
+
+
+def test_worker_health():
+    batch_size = 3
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1234])
+        request_infos = EnvInfos(admissible_commands=True, moves=True)
+        env_fns = [partial(textworld.gym.envs.textworld_batch._make_env, request_infos, wrappers=[_FaultyEnv])
+                   for _ in range(batch_size)]
+        env = AsyncBatchEnv(env_fns, auto_reset=True, timeout=5)
+        env.load(gamefiles * batch_size)
+        env.reset()
+        obs, scores, dones, infos = env.step(["look"] * batch_size)
+        assert infos["moves"] == [1, 1, 1]
+
+        with pytest.warns(RuntimeWarning):
+            obs, scores, dones, infos = env.step(["crash", "look", "hang"])
+
+        assert dones == (True, False, True)
+        assert env.truncated == [True, False, True]
+        assert infos["moves"] == [1, 2, 1]  # Last known infos.
+
+        # Workers have been restarted and their game reloaded.
+        obs, scores, dones, infos = env.step(["look"] * batch_size)
+        assert dones == (False, False, False)
+        assert env.truncated == [False, False, False]
+        assert infos["moves"] == [0, 3, 0]
+        env.close()
+
+
+def test_worker_hanging_after_restart():
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1234])
+        request_infos = EnvInfos(moves=True)
+        env_fns = [partial(textworld.gym.envs.textworld_batch._make_env, request_infos, wrappers=[_FaultyEnv])
+                   for _ in range(2)]
+        env = AsyncBatchEnv(env_fns, timeout=2)
+        env.load(gamefiles * 2)
+        env.reset()
+
+        open(_FaultyEnv.hang_on_load, "w").close()
+        try:
+            start = time.time()
+            with pytest.warns(RuntimeWarning, match="Failed to restart"):
+                obs, scores, dones, infos = env.step(["crash", "look"])
+
+            assert dones == (True, False)
+            assert env.truncated == [True, False]
+
+            # The dead worker doesn't get restarted when closing.
+            env.close()
+            assert time.time() - start < 30
+        finally:
+            os.remove(_FaultyEnv.hang_on_load)
+
+
+def test_worker_hanging_on_load_and_reset():
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1234])
+        request_infos = EnvInfos(moves=True)
+        env_fns = [partial(textworld.gym.envs.textworld_batch._make_env, request_infos, wrappers=[_FaultyEnv])]
+        env = AsyncBatchEnv(env_fns, timeout=2)
+
+        open(_FaultyEnv.hang_on_load, "w").close()
+        try:
+            with pytest.warns(RuntimeWarning, match="Failed to restart"):
+                env.load(gamefiles)
+        finally:
+            os.remove(_FaultyEnv.hang_on_load)
+
+        open(_FaultyEnv.hang_on_reset, "w").close()
+        try:
+            with pytest.warns(RuntimeWarning):
+                obs, infos = env.reset()
+
+            # The episode is over before it started.
+            assert env.truncated == [True]
+            obs, scores, dones, infos = env.step(["look"])
+            assert dones == (True,)
+        finally:
+            os.remove(_FaultyEnv.hang_on_reset)
+
+        # The worker gets restarted and reloads its game.
+        obs, infos = env.reset()
+        assert env.truncated == [False]
+        assert infos["moves"] == [0]
+        env.close()
+
+
+def test_peek():
+    batch_size = 2
+    with make_temp_directory() as tmpdir:
+        gamefiles = make_json_games(tmpdir, [1234, 4321])
+        request_infos = EnvInfos(admissible_commands=True, moves=True, extras=["walkthrough"])
+        env_fns = [partial(textworld.gym.envs.textworld_batch._make_env, request_infos) for _ in range(batch_size)]
+
+        for env in [SyncBatchEnv(env_fns), AsyncBatchEnv(env_fns)]:
+            env.load(gamefiles)
+            obs, infos = env.reset()
+            commands = [infos["admissible_commands"][0], infos["extra.walkthrough"][1][:1]]
+            commands[1].append("dummy")
+
+            peek_obs, peek_scores, peek_dones, peek_infos = env.peek(commands)
+            assert [len(obs_) for obs_ in peek_obs] == [len(commands_) for commands_ in commands]
+            assert peek_infos["moves"] == [[1] * len(commands[0]), [1, 0]]
+
+            # Peeking doesn't affect the environments.
+            obs, scores, dones, infos = env.step([commands[0][0], commands[1][0]])
+            assert infos["moves"] == [1, 1]
+            assert list(obs) == [peek_obs[0][0], peek_obs[1][0]]
+            assert infos["admissible_commands"] == [peek_infos["admissible_commands"][0][0],
+                                                    peek_infos["admissible_commands"][1][0]]
+            env.close()
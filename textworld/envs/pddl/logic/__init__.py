@@ -1,15 +1,18 @@
 
 import json
+import hashlib
 import textwrap
 
 from collections import Counter, defaultdict
+from functools import lru_cache, partial
 
+import numpy as np
 from tatsu.model import NodeWalker
 
 import fast_downward
 
 import textworld.logic.model
-from textworld.utils import check_flag
+from textworld.utils import check_flag, disk_cache, TranspositionTable
 from textworld.logic import Proposition, Variable, Placeholder
 
 from textworld.envs.pddl.textgen import ContextSensitiveGrammar
@@ -74,6 +77,41 @@ def _parse_and_convert(*args, **kwargs):
     return _ModelConverter().walk(model)
 
 
+try:
+    from importlib.metadata import version
+    _FAST_DOWNWARD_VERSION = version("fast-downward-textworld")
+except Exception:
+    _FAST_DOWNWARD_VERSION = "unknown"
+
+
+#: Version of the SAS tasks cached on disk by `pddl2sas`, bump it when changing how they are built.
+_PDDL2SAS_CACHE_SCHEMA = 1
+
+
+@lru_cache(maxsize=16)
+def _cached_pddl2sas(domain, problem, optimize):
+    contents = [_FAST_DOWNWARD_VERSION, domain, problem, str(optimize)]
+    return disk_cache("pddl2sas", contents, partial(fast_downward.pddl2sas, domain, problem, optimize=optimize),
+                      schema=_PDDL2SAS_CACHE_SCHEMA)
+
+
+def pddl2sas(domain, problem, verbose=False, optimize=False):
+    """
+    Same as `fast_downward.pddl2sas` but cached, in memory and on disk.
+
+    The translation is always redone when `verbose` is set, so its logs get displayed.
+    """
+    if verbose:
+        return fast_downward.pddl2sas(domain, problem, verbose=verbose, optimize=optimize)
+
+    return _cached_pddl2sas(domain, problem, optimize)
+
+
+# Plans (i.e. operators' name) found from a given state, see `PddlState.replan`.
+_MAX_CACHED_PLANS = 10000
+_PLANS = TranspositionTable(_MAX_CACHED_PLANS)  # (task, state hash) -> plan.
+
+
 class Action:
     def __init__(self, name, template, pddl, grammar, feedback_rule):
         self.name = name
@@ -159,6 +197,8 @@ class PddlState(textworld.logic.State):
         self._vars_by_name = {}
         self._vars_by_type = defaultdict(set)
         self._var_counts = Counter()
+        self._index = None
+        self._hash = 0
 
         self._logic = logic
         self.downward_lib = downward_lib
@@ -168,8 +208,16 @@ class PddlState(textworld.logic.State):
 
         # Load domain + problem.
         verbose = check_flag("TW_PDDL_DEBUG")
-        self.task, self.sas = fast_downward.pddl2sas(logic.domain, pddl_problem, verbose=verbose)
-        _, self.sas_replan = fast_downward.pddl2sas(logic.domain, pddl_problem, verbose=verbose, optimize=True)
+        self.task, self.sas = pddl2sas(logic.domain, pddl_problem, verbose=verbose)
+        _, self.sas_replan = pddl2sas(logic.domain, pddl_problem, verbose=verbose, optimize=True)
+        self._task_key = hashlib.sha256(self.sas_replan.encode()).hexdigest()
+        self._plan = None  # Remaining operators of the last plan, if it is still being followed.
+
+        # Python-side objects are created once per problem: operator id -> (name, nb_effect_atoms),
+        # operator id -> Action and atom's raw name -> (fact, negated fact).
+        self._operators = {}
+        self._actions_by_id = {}
+        self._atoms = {}
 
         self._actions = {a.name: a for a in self.task.actions}
 
@@ -210,51 +258,87 @@ class PddlState(textworld.logic.State):
         state_size = self.downward_lib.get_state_size()
         atoms = (Atom * state_size)()
         self.downward_lib.get_state(atoms)
-        facts = [atom.get_fact(self.name2type) for atom in atoms]
+        facts = [self._get_atom_facts(atom)[0] for atom in atoms]
         facts = [fact for fact in facts if not fact.is_negation]
         self.add_facts(facts)
 
-    def all_applicable_actions(self):
+    def _get_atom_facts(self, atom):
+        """ Fact, and its negation, for an atom. They are only created the first time the atom is seen. """
+        facts = self._atoms.get(atom._name)
+        if facts is None:
+            fact = atom.get_fact(self.name2type)
+            facts = self._atoms[atom._name] = (fact, fact.negate())
+
+        return facts
+
+    def applicable_operator_ids(self):
+        """
+        Ids of the operators applicable in the current state, as a NumPy array.
+        """
         operator_count = self.downward_lib.get_applicable_operators_count()
 
         operators = (fast_downward.Operator * operator_count)()
         self.downward_lib.get_applicable_operators(operators)
-        self._operators = {op.id: op for op in operators}
+        ids = np.ctypeslib.as_array(operators)["id"].copy() if operator_count else np.zeros(0, dtype=np.int32)
 
-        actions = []
-        seen_operators = set()
-        for operator in operators:
-            if operator.name in seen_operators:
-                continue
+        # Only decode the operators we haven't seen yet.
+        for i, id_ in enumerate(ids.tolist()):
+            if id_ not in self._operators:
+                self._operators[id_] = (operators[i].name, operators[i].nb_effect_atoms)
 
-            seen_operators.add(operator.name)
+        return ids
 
-            splits = operator.name.split()
+    def get_action(self, operator_id):
+        """
+        Action corresponding to an operator, created the first time it is requested.
+        """
+        action = self._actions_by_id.get(operator_id)
+        if action is None:
+            splits = self._operators[operator_id][0].split()
             name, arguments = splits[0], splits[1:]
 
             action = textworld.logic.Action(name=name, preconditions=[], postconditions=[])
-            action.id = operator.id
+            action.id = operator_id
             action.mapping = {Placeholder(p.name.strip("?"), p.type_name): Variable(arg, p.type_name)
                               for p, arg in zip(self._actions[name].parameters, arguments)}
             action.command_template = self._logic.actions[name].template
             action.feedback_rule = self._logic.actions[name].feedback_rule
-            actions.append(action)
+            self._actions_by_id[operator_id] = action
+
+        return action
+
+    def all_applicable_actions(self):
+        actions = []
+        seen_operators = set()
+        for id_ in self.applicable_operator_ids().tolist():
+            name = self._operators[id_][0]
+            if name in seen_operators:
+                continue
+
+            seen_operators.add(name)
+            actions.append(self.get_action(id_))
 
         return actions
 
     def apply(self, action):
         # TODO: convert textworld.logic.Action into operator id.
-        op = self._operators[action.id]  # HACK: assume action is operator id for now.
+        op_name, nb_effect_atoms = self._operators[action.id]  # HACK: assume action is operator id for now.
 
-        effects = (Atom * op.nb_effect_atoms)()
-        self.downward_lib.apply_operator(op.id, effects)
+        effects = (Atom * nb_effect_atoms)()
+        self.downward_lib.apply_operator(action.id, effects)
+
+        # Following the last plan leaves the rest of it valid.
+        if self._plan and self._plan[0] == op_name:
+            self._plan = self._plan[1:]
+        else:
+            self._plan = None
 
         # Update facts
         changes = []
         for effect in effects:
-            prop = effect.get_fact(self.name2type)
+            prop, negation = self._get_atom_facts(effect)
             changes.append(prop)
-            self.remove_fact(prop.negate())
+            self.remove_fact(negation)
             self.add_fact(prop)
 
         return changes
@@ -263,14 +347,27 @@ class PddlState(textworld.logic.State):
         return self.downward_lib.check_goal()
 
     def replan(self, infos):
+        """
+        Commands leading to the goal from the current state.
+
+        The planner is only called when the previous plan was not followed
+        and no plan was previously found from the current state.
+        """
+        if self._plan is None:
+            key = (self._task_key, self.hash)
+            self._plan = _PLANS.get(key)
+            if self._plan is None:
+                self._plan = _PLANS[key] = self._search_plan()
+
+        return self.plan_to_templated_actions(self._plan, infos)
+
+    def _search_plan(self):
         if not self.downward_lib.replan(check_flag("TW_PDDL_DEBUG")):
             return []
 
         operators = (fast_downward.Operator * self.downward_lib.get_last_plan_length())()
         self.downward_lib.get_last_plan(operators)
-        plan = [op.name for op in operators]
-        templated_actions = self.plan_to_templated_actions(plan, infos)
-        return templated_actions
+        return [op.name for op in operators]
 
     def plan_to_templated_actions(self, plan, infos):
         templated_actions = []
@@ -3,6 +3,7 @@
 
 
 # -*- coding: utf-8 -*-
+import copy
 import json
 
 from typing import Mapping, Union, Optional
@@ -11,10 +12,11 @@ import textworld
 from textworld.core import EnvInfos, GameState
 from textworld.generator.game import EntityInfo
 from textworld.logic import Proposition, Variable
+from textworld.utils import lazy_import
 
 try:
     import fast_downward
-    from textworld.envs.pddl import logic as pddl_logic
+    pddl_logic = lazy_import("textworld.envs.pddl.logic")  # Its parsers are slow to import.
     fast_downward_missing = False
 except ImportError:
     fast_downward_missing = True
@@ -80,13 +82,18 @@ class PddlEnv(textworld.Environment):
         if self.request_infos.facts:
             self.state["facts"] = list(map(self._get_human_readable_fact, self.state["_facts"]))
 
+        if self.request_infos.state_hash:
+            self.state["state_hash"] = self._pddl_state.hash
+
         self.state["last_action"] = None
         self.state["_last_action"] = self._last_action
-        self.state["_valid_actions"] = list(self._pddl_state.all_applicable_actions())
+        self.state["_valid_actions"] = []
 
         mapping = {k: info.name for k, info in self._entity_infos.items()}
         self.state["_valid_commands"] = []
-        for action in self.state["_valid_actions"]:
+        for action in self._pddl_state.all_applicable_actions():
+            # Actions are shared from one step to another, the game state gets its own copies.
+            action = copy.copy(action)
             context = {
                 "state": self._pddl_state,
                 "facts": list(self._pddl_state.facts),
@@ -94,7 +101,9 @@ class PddlEnv(textworld.Environment):
                 "mapping": action.mapping,
                 "entity_infos": self._entity_infos,
             }
-            action.command_template = self._logic.grammar.derive(action.command_template, context)
+            template = self._logic.actions[action.name].template
+            action.command_template = self._logic.grammar.derive(template, context)
+            self.state["_valid_actions"].append(action)
             self.state["_valid_commands"].append(action.format_command(mapping))
 
         # To guarantee the order from one execution to another, we sort the commands.
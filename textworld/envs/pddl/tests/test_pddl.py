@@ -3,10 +3,14 @@ import json
 import shutil
 import unittest
 import tempfile
+from unittest import mock
 from os.path import join as pjoin
 
+import numpy as np
+
 from textworld import EnvInfos
 from textworld.envs import PddlEnv
+from textworld.envs.pddl import logic as pddl_logic
 
 
 DATA_PATH = os.path.abspath(pjoin(__file__, ".."))
@@ -70,6 +74,30 @@ class TestInterface(unittest.TestCase):
         game_state, _, _ = self.env.step("dummy")
         assert game_state.feedback == "Nothing happens."
 
+    def test_past_game_states_are_unchanged(self):
+        game_state = self.env.reset()
+        first = game_state
+        templates = [action.command_template for action in first["_valid_actions"]]
+        for cmd in game_state["policy_commands"]:
+            game_state, _, _ = self.env.step(cmd)
+            # Game states don't share the actions whose command template gets derived.
+            assert not {id(action) for action in first["_valid_actions"]} & {id(a) for a in game_state["_valid_actions"]}
+
+        assert [action.command_template for action in first["_valid_actions"]] == templates
+        mapping = {k: info.name for k, info in self.env._entity_infos.items()}
+        assert [action.format_command(mapping) for action in first["_valid_actions"]] == first["_valid_commands"]
+
+    def test_state_hash(self):
+        env = PddlEnv(EnvInfos(state_hash=True))
+        env.load(self.gamefile)
+        env.reset()
+
+        # Coming back to the bed leads to the same state, whichever way.
+        bed_state, _, _ = env.step("go to bed")
+        env.step("go to desk")
+        game_state, _, _ = env.step("go to bed")
+        assert game_state.state_hash == bed_state.state_hash
+
     def test_loading_from_data(self):
         env = PddlEnv(self.request_infos)
         env.load(self.gamedata)
@@ -77,3 +105,83 @@ class TestInterface(unittest.TestCase):
 
         game_state = self.env.reset()
         assert game_state.feedback.startswith("-= Welcome to TextWorld, ALFRED! =-")
+
+    def test_memoized_derivations(self):
+        game_state = self.env.reset()
+        grammar = self.env._logic.grammar
+        for cmd in game_state["policy_commands"]:
+            for action in game_state["_valid_actions"]:
+                context = {
+                    "state": self.env._pddl_state,
+                    "facts": list(self.env._pddl_state.facts),
+                    "variables": {ph.name: self.env._entity_infos[var.name] for ph, var in action.mapping.items()},
+                    "mapping": action.mapping,
+                    "entity_infos": self.env._entity_infos,
+                }
+                text = grammar.derive(action.feedback_rule, context)
+                assert grammar.derive(action.feedback_rule, context) == text
+
+                grammar._derivations.clear()  # Derive from scratch.
+                assert grammar.derive(action.feedback_rule, context) == text
+
+                # Renamed entities are noticed.
+                infos = list(context["variables"].values())
+                if infos and infos[0].name and infos[0].name in text:
+                    name, infos[0].name = infos[0].name, "renamed thing"
+                    try:
+                        renamed = grammar.derive(action.feedback_rule, context)
+                        assert "renamed thing" in renamed
+                        grammar._derivations.clear()
+                        assert grammar.derive(action.feedback_rule, context) == renamed
+                    finally:
+                        infos[0].name = name
+
+            game_state, _, _ = self.env.step(cmd)
+
+    def test_cached_translation_and_plans(self):
+        pddl_logic._cached_pddl2sas.cache_clear()
+        pddl_logic._PLANS.clear()
+
+        with mock.patch.dict(os.environ, {"TEXTWORLD_CACHE_DIR": pjoin(self.tmpdir, "cache")}):
+            with mock.patch("fast_downward.pddl2sas", wraps=pddl_logic.fast_downward.pddl2sas) as pddl2sas:
+                env = PddlEnv(self.request_infos)
+                env.load(self.gamefile)
+                env.reset()
+                assert pddl2sas.call_count == 2  # Normal and optimized translations.
+
+                env.reset()
+                assert pddl2sas.call_count == 2  # Cached in memory.
+
+                pddl_logic._cached_pddl2sas.cache_clear()
+                env.reset()
+                assert pddl2sas.call_count == 2  # Cached on disk.
+
+            with mock.patch.object(pddl_logic.PddlState, "_search_plan",
+                                   autospec=True, side_effect=pddl_logic.PddlState._search_plan) as search_plan:
+                game_state = env.reset()
+                policy = game_state["policy_commands"]
+                assert search_plan.call_count == 0  # Same initial state as before.
+
+                game_state, _, _ = env.step(policy[0])
+                assert game_state["policy_commands"] == policy[1:]
+                assert search_plan.call_count == 0  # Following the plan.
+
+                detour = [cmd for cmd in game_state["admissible_commands"] if cmd != policy[1]][0]
+                game_state, _, _ = env.step(detour)
+                assert search_plan.call_count == 1  # Deviating from the plan.
+
+    def test_operators_are_created_once(self):
+        game_state = self.env.reset()
+        state = self.env._pddl_state
+
+        ids = state.applicable_operator_ids()
+        assert ids.dtype == np.int32
+        assert sorted(action.id for action in game_state["_valid_actions"]) == sorted(set(ids.tolist()))
+        assert all(state.get_action(action.id) is state.get_action(action.id) for action in game_state["_valid_actions"])
+        assert all(state.get_action(action.id) == action for action in game_state["_valid_actions"])
+
+        facts = set(state.facts)
+        changes = state.apply(game_state["_valid_actions"][0])
+        assert changes
+        assert all(state.is_fact(fact) for fact in changes if not fact.is_negation)
+        assert set(state.facts) != facts
@@ -1,9 +1,9 @@
 import json
-from copy import deepcopy
 from collections import defaultdict
+from functools import lru_cache
 
 from tatsu.model import NodeWalker
-from typing import List, Dict
+from typing import Any, List, Dict, FrozenSet, Optional, Tuple
 
 from textworld.utils import check_flag
 from textworld.logic import Rule
@@ -12,18 +12,18 @@ from textworld.envs.pddl.textgen.parser import CSGParser
 
 
 class Symbol:
-    def __init__(self, symbol: str, context: Dict = {}):
+    """ Immutable symbol of a context-sensitive grammar.
+
+    Symbols are shared by every derivation: the context in which they are
+    derived is kept alongside them, on the derivation stack.
+    """
+
+    def __init__(self, symbol: str):
         self.symbol = symbol
-        self.context = context
 
     def __str__(self):
         return str(self.symbol)
 
-    def copy(self, context):
-        copy = deepcopy(self)
-        copy.context = copy_context(context)
-        return copy
-
 
 class TerminalSymbol(Symbol):
 
@@ -38,11 +38,12 @@ class NonterminalSymbol(Symbol):
 
 
 def copy_context(context):
+    # Derivations never modify the variables, nor the mapping, in place.
     return {
         "state": context["state"],
         "facts": context["facts"],
-        "variables": deepcopy(context["variables"]),
-        "mapping": deepcopy(context["mapping"]),
+        "variables": dict(context["variables"]),
+        "mapping": dict(context["mapping"]),
         "entity_infos": context["entity_infos"],
     }
 
@@ -57,22 +58,34 @@ def join(sep, iterable):
         yield e
 
 
+_LIST_EMPTY = NonterminalSymbol("list_empty")
+_LIST_SEPARATOR = NonterminalSymbol("list_separator")
+_LIST_LAST_SEPARATOR = NonterminalSymbol("list_last_separator")
+
+
 def display_list(l, context):
     if len(l) == 0:
-        return [NonterminalSymbol("list_empty", context)]
+        return [(_LIST_EMPTY, context)]
 
     if len(l) == 1:
         return [l[0]]
 
-    list_separator = NonterminalSymbol("list_separator", context)
-    list_last_separator = NonterminalSymbol("list_last_separator", context)
+    list_separator = (_LIST_SEPARATOR, context)
+    list_last_separator = (_LIST_LAST_SEPARATOR, context)
     return list(join(list_separator, l[:-1])) + [list_last_separator] + [l[-1]]
 
 
+@lru_cache(maxsize=None)
+def compile_query(expression: str) -> Rule:
+    """ Parse a conjunctive query once, e.g. "in(o:object, r:receptacle)". """
+    return Rule.parse_conjunctive_query(expression)
+
+
 def query(expression, context):
-    rule = Rule.parse_conjunctive_query(expression)
+    rule = compile_query(expression) if isinstance(expression, str) else expression
 
     contexts = []
+    context["state"].build_index()  # Only look at the facts involving already mapped variables.
     for mapping in context["state"].all_assignments(rule, context["mapping"]):
         context_ = copy_context(context)
         new_variables = {ph.name: context_["entity_infos"][var.name] for ph, var in mapping.items()}
@@ -83,57 +96,70 @@ def query(expression, context):
     return contexts
 
 
+#: Names that give expressions access to more than the attributes of the variables.
+_UNTRACKED_NAMES = frozenset(["self", "context", "query", "getattr", "vars", "eval"])
+
+
+def _freeze(value: Any) -> Any:
+    """ Hashable version of an attribute's value (e.g. a list of synonyms). """
+    return tuple(value) if isinstance(value, list) else value
+
+
 class EvalSymbol(Symbol):
-    def __init__(self, expression: str, context: Dict = {}):
-        super().__init__(expression, context)
+    def __init__(self, expression: str):
+        super().__init__(expression)
         self.expression = expression
+        self._code = None  # Compiled on first use.
 
     def __repr__(self):
         return "EvalSymbol('{{{}}}')".format(str(self.expression))
 
-    def derive(self, context=None):
-        context = context or self.context
-        locals().update(context["variables"])
-        value = eval(self.expression)
-        return [TerminalSymbol(value)]
+    @property
+    def code(self):
+        if self._code is None:
+            self._code = compile(self.expression.strip(), "<{}>".format(self.expression), "eval")
+
+        return self._code
+
+    def derive(self, context):
+        namespace = {"self": self, "context": context}
+        namespace.update(context["variables"])
+        value = eval(self.code, globals(), namespace)
+        return [(TerminalSymbol(value), context)]
 
 
 class ListSymbol(Symbol):
-    def __init__(self, symbol: Symbol, context: Dict = {}):
-        super().__init__(symbol, context)
+    def __init__(self, symbol: Symbol):
+        super().__init__(symbol)
 
     def __repr__(self):
         return "ListSymbol('[{!r}]')".format(self.symbol)
 
-    def derive(self, context=None):
-        context = context or self.context
-        self.symbol.context = context
-        derivation = self.symbol.derive()
+    def derive(self, context):
+        derivation = self.symbol.derive(context)
         return display_list(derivation, context)
 
 
 class ConditionalSymbol(Symbol):
 
-    def __init__(self, expression: Symbol, given: str, context: Dict = {}):
-        super().__init__(str(expression), context)
+    def __init__(self, expression: Symbol, given: str):
+        super().__init__(str(expression))
         self.expression = expression
         self.given = given
+        self.query = compile_query(given) if given else None
 
     def __repr__(self):
         return "ConditionalSymbol('{{{}|{}}}')".format(str(self.expression), str(self.given))
 
-    def derive(self):
-        if len(self.context) == 0:
+    def derive(self, context):
+        if len(context) == 0:
             raise ValueError("Empty context")
 
-        context = copy_context(self.context)
-
         contexts = [context]
-        if self.given:
-            contexts = query(self.given, context)
+        if self.query:
+            contexts = query(self.query, context)
 
-        res = [self.expression.copy(context) for context in contexts]
-        return res
+        return [(self.expression, context_) for context_ in contexts]
 
 
 class ProductionRule:
@@ -145,11 +171,14 @@ class ProductionRule:
             rhs: symbol that will be transformed by this production rule.
             lhs: list of symbols generated by this production rule.
             weight: prevalence of this production.
+            condition: conjunctive query that must be satisfiable
+                       for this production to be applicable.
         """
         self.lhs = lhs
-        self.rhs = rhs
+        self.rhs = tuple(rhs)
         self.weight = weight
         self.condition = condition
+        self.query = compile_query(condition) if condition else None
 
     def __repr__(self):
         text = "ProductionRule(lhs={!r}, rhs={!r}, weight={!r}, condition={!r})"
@@ -196,14 +225,37 @@ class CSGUnknownSymbolError(Exception):
 
 
 class ContextSensitiveGrammar:
+    """ Context-sensitive grammar used to generate text from a game state.
+
+    Start strings are parsed once and the derivations are memoized on
+    everything they depend on: the start string, the mapping, the facts
+    whose predicate appears in one of the conditions that can be reached
+    from the start string, and the attributes (e.g. name, indefinite)
+    that the expressions read from the variables and from the entities
+    of those facts. Derivations whose expressions use the context
+    directly (e.g. `context` or `query`) are not memoized.
+    """
+
+    #: int: Number of derivations to memoize before starting afresh.
+    MAX_MEMOIZED_DERIVATIONS = 10000
 
     def __init__(self):
         self._rules = defaultdict(list)
+        self._templates = {}
+        self._dependencies = {}
+        self._derivations = {}
+
+    def _clear_caches(self):
+        # Derivations and dependencies are invalidated by new production rules.
+        self._dependencies.clear()
+        self._derivations.clear()
 
     def update(self, grammar: "ContextSensitiveGrammar"):
         for k, v in grammar._rules.items():
             self._rules[k].extend(v)
 
+        self._clear_caches()
+
     @classmethod
     def parse(cls, text: str):
         data = json.loads(text)
@@ -223,53 +275,128 @@ class ContextSensitiveGrammar:
 
     def add_rule(self, rule: ProductionRule):
         self._rules[rule.lhs].append(rule)
+        self._clear_caches()
 
-    def replace(self, start: Symbol) -> List[Symbol]:
+    def replace(self, start: Symbol, context: Dict) -> Tuple[Symbol, ...]:
         rules = self._rules.get(str(start))
         if not rules:
             raise CSGUnknownSymbolError(start)
 
         def _applicable(rule):
-            if not rule.condition:
+            if not rule.query:
                 return True
 
-            rule = Rule.parse_conjunctive_query(rule.condition)
-            mappings = list(start.context["state"].all_assignments(rule, start.context["mapping"]))
-            return len(mappings) > 0  # Found a match.
-
-        rules = list(filter(_applicable, rules))
+            context["state"].build_index()  # Only look at the facts involving already mapped variables.
+            mappings = context["state"].all_assignments(rule.query, context["mapping"])
+            return next(iter(mappings), None) is not None  # Found a match.
 
         # TODO: deal with multiple alternatives
-        # TODO: deal with context
-        symbols = deepcopy(rules[0].rhs)
-        for symbol in symbols:
-            symbol.context = copy_context(start.context)
+        for rule in rules:
+            if _applicable(rule):
+                return rule.rhs
+
+        raise ValueError("No applicable production rule for '#{}#'.".format(start))
 
-        return symbols
+    def _compile(self, start: str) -> Tuple[Symbol, ...]:
+        if start not in self._templates:
+            derivation = _parse_and_convert(start, rule_name="symbols", trace=check_flag("TW_CSG_TRACE"))
+            self._templates[start] = tuple(derivation)
+
+        return self._templates[start]
+
+    def _get_dependencies(self, start: str) -> Tuple[FrozenSet[str], Optional[Tuple[str, ...]]]:
+        """
+        Names of the predicates that can be queried when deriving `start`, and the
+        attributes that can be read from the entities (`None` if they can't be known).
+        """
+        if start not in self._dependencies:
+            names = set()
+            attributes = {"name"}  # Entities are displayed using their name.
+            seen = set()
+            stack = list(self._compile(start))
+            while stack:
+                symbol = stack.pop()
+                if isinstance(symbol, NonterminalSymbol):
+                    if symbol.symbol in seen:
+                        continue
+
+                    seen.add(symbol.symbol)
+                    for rule in self._rules.get(symbol.symbol, []):
+                        if rule.query:
+                            names |= {pred.name for pred in rule.query.preconditions}
+
+                        stack += rule.rhs
+
+                elif isinstance(symbol, ConditionalSymbol):
+                    if symbol.query:
+                        names |= {pred.name for pred in symbol.query.preconditions}
+
+                    stack.append(symbol.expression)
+
+                elif isinstance(symbol, ListSymbol):
+                    stack.append(symbol.symbol)
+
+                elif isinstance(symbol, EvalSymbol) and attributes is not None:
+                    if _UNTRACKED_NAMES & set(symbol.code.co_names):
+                        attributes = None  # It can read anything.
+                    else:
+                        attributes |= set(symbol.code.co_names)
+
+            self._dependencies[start] = (frozenset(names), None if attributes is None else tuple(sorted(attributes)))
+
+        return self._dependencies[start]
+
+    def _get_key(self, start: str, context: Dict) -> Optional[Tuple]:
+        """ Key identifying the derivation of `start` in `context`, `None` if it can't be memoized. """
+        names, attributes = self._get_dependencies(start)
+        if attributes is None:
+            return None
+
+        def _read(value):
+            if value is None or isinstance(value, (str, int, float)):
+                return value
+
+            return tuple(_freeze(getattr(value, attr, None)) for attr in attributes)
+
+        variables = context["variables"]
+        facts = frozenset(context["state"].facts_with_names(names)) if names else frozenset()
+        entities = sorted({var.name for fact in facts for var in fact.arguments})  # Can be bound by queries.
+        return (start, frozenset(context["mapping"].items()), facts,
+                tuple((k, _read(v)) for k, v in variables.items()),
+                tuple(_read(context["entity_infos"].get(name)) for name in entities))
 
     def derive(self, start: str, context={}) -> str:
-        derivation = _parse_and_convert(start, rule_name="symbols", trace=check_flag("TW_CSG_TRACE"))
-        derivation = derivation[::-1]  # Reverse to build a derivation stack.
+        key = self._get_key(start, context)
+        if key is not None and key in self._derivations:
+            return self._derivations[key]
 
-        for symbol in derivation:
-            symbol.context = copy_context(context)
+        derivation = [(symbol, context) for symbol in reversed(self._compile(start))]  # Derivation stack.
 
         derived = []
         while len(derivation) > 0:
             if check_flag("TW_CSG_DEBUG"):
-                print(derivation)
+                print([symbol for symbol, _ in derivation])
 
-            symbol = derivation.pop()
+            symbol, context_ = derivation.pop()
             if isinstance(symbol, TerminalSymbol):
                 derived.append(symbol)
 
             elif isinstance(symbol, NonterminalSymbol):
-                derivation += self.replace(symbol)[::-1]  # Reverse to add on top of the derivation stack.
+                # Reverse to add on top of the derivation stack.
+                derivation += [(rhs, context_) for rhs in reversed(self.replace(symbol, context_))]
 
             elif isinstance(symbol, (ConditionalSymbol, EvalSymbol, ListSymbol)):
-                derivation += symbol.derive()[::-1]  # Reverse to add on top of the derivation stack.
+                derivation += symbol.derive(context_)[::-1]  # Reverse to add on top of the derivation stack.
 
             else:
                 raise NotImplementedError("Unknown symbol: {}".format(type(symbol)))
 
-        return "".join(map(str, derived))
+        text = "".join(map(str, derived))
+
+        if key is not None:
+            if len(self._derivations) >= self.MAX_MEMOIZED_DERIVATIONS:
+                self._derivations.clear()
+
+            self._derivations[key] = text
+
+        return text
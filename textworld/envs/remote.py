@@ -0,0 +1,589 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+"""
+Hosting a pool of environments behind a TCP or Unix socket.
+
+Messages are JSON documents sent in size-prefixed binary frames. Large
+payloads (e.g., admissible commands) are zlib-compressed. Pickle is
+deliberately not used since unpickling data received from the network
+allows arbitrary code execution.
+"""
+
+import json
+import queue
+import socket
+import struct
+import asyncio
+import threading
+import uuid
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from textworld.core import EnvInfos, Environment, GameState
+from textworld.logic import Action, Proposition
+from textworld.envs.batch.asyncio_env import AsyncioEnv
+from textworld.envs.batch.batch_env import _list_of_dicts_to_dict_of_lists
+from textworld.envs.wrappers.generic import GenericEnvironment
+
+
+Address = Union[str, Tuple[str, int]]  # Path of a Unix socket or (host, port).
+
+_HEADER = struct.Struct("!BI")  # Flags, size (in bytes) of the payload that follows.
+_COMPRESSED = 1
+_COMPRESSION_THRESHOLD = 4096
+
+
+class EnvServerError(RuntimeError):
+    """ Error raised by an `EnvServer` while processing a request. """
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    elif hasattr(obj, "serialize"):
+        return obj.serialize()
+
+    raise TypeError("Object of type {} can't be sent to or by an EnvServer.".format(type(obj).__name__))
+
+
+def _pack(obj: Any) -> bytes:
+    payload = json.dumps(obj, default=_json_default, separators=(",", ":")).encode("utf-8")
+    flags = 0
+    if len(payload) > _COMPRESSION_THRESHOLD:
+        payload = zlib.compress(payload, 1)
+        flags |= _COMPRESSED
+
+    return _HEADER.pack(flags, len(payload)) + payload
+
+
+def _unpack(flags: int, payload: bytes) -> Any:
+    if flags & _COMPRESSED:
+        payload = zlib.decompress(payload)
+
+    return json.loads(payload.decode("utf-8"))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise EOFError("Connection closed by the server.")
+
+        buffer += chunk
+
+    return bytes(buffer)
+
+
+def _infos_to_dict(request_infos: EnvInfos) -> Dict[str, Any]:
+    return dict({slot: True for slot in request_infos.basics}, extras=list(request_infos.extras))
+
+
+class _Session:
+    """ Environments opened by a client, released once all its connections are closed. """
+
+    def __init__(self, session_id: Optional[str] = None) -> None:
+        self.session_id = session_id
+        self.env_ids = set()
+        self.nb_connections = 0
+
+
+class _ServedEnv:
+    """ Environment hosted in a worker process of an `EnvServer`. """
+
+    def __init__(self):
+        self._env = None
+        self._request_infos = None
+
+    def load(self, gamefile: str, request_infos: Dict[str, Any]) -> None:
+        request_infos = EnvInfos(**request_infos)
+        if self._env is None or request_infos != self._request_infos:
+            self.close()
+            self._env = GenericEnvironment(request_infos)
+            self._request_infos = request_infos
+
+        self._env.load(gamefile)
+
+    def _get_requested_infos(self, game_state: GameState) -> Dict[str, Any]:
+        infos = {attr: game_state.get(attr) for attr in self._request_infos.basics}
+        for attr in self._request_infos.extras:
+            key = "extra.{}".format(attr)
+            infos[key] = game_state.get(key)
+
+        infos["feedback"] = game_state.feedback
+        return infos
+
+    def reset(self) -> Dict[str, Any]:
+        return self._get_requested_infos(self._env.reset())
+
+    def step(self, command: str) -> Tuple[Dict[str, Any], float, bool]:
+        game_state, score, done = self._env.step(command)
+        return self._get_requested_infos(game_state), score, done
+
+    def seed(self, seed: Optional[int] = None) -> Any:
+        return self._env.seed(seed)
+
+    def close(self) -> None:
+        if self._env is not None:
+            self._env.close()
+
+
+class EnvServer:
+    """ Server hosting a pool of environments.
+
+    Each environment runs in its own worker process and can play any game
+    supported by :py:func:`textworld.start` (TextWorld, Jericho or PDDL).
+    Worker processes are reused once a client is done with them, either
+    closing its environments or disconnecting.
+
+    Example:
+
+        >>> server = EnvServer(("localhost", 8765), max_envs=64)
+        >>> server.serve_forever()
+
+    .. note:: Game files are loaded from the server's filesystem.
+    """
+
+    def __init__(self, address: Address, max_envs: Optional[int] = None,
+                 start_method: Optional[str] = None) -> None:
+        """
+        Arguments:
+            address: Either a (host, port) tuple for a TCP server or a path for a Unix socket.
+                     Use port 0 to pick any available port (see `EnvServer.address`).
+            max_envs: Maximum number of environments that can be opened at once.
+                      By default, there is no limit.
+            start_method: Method used to start the worker processes
+                          (see :py:func:`textworld.utils.get_context`).
+        """
+        self.address = address
+        self.max_envs = max_envs
+        self.start_method = start_method
+        self._envs = {}  # Environments currently in use, by id.
+        self._idle = []  # Environments that can be reused.
+        self._sessions = {}  # Sessions shared by several connections, by id.
+        self._next_id = 0
+        self._loop = None
+        self._stop = None
+        self._ready = threading.Event()
+
+    async def _open(self, session: _Session) -> int:
+        if self._idle:
+            env = self._idle.pop()
+        elif self.max_envs is None or len(self._envs) < self.max_envs:
+            env = AsyncioEnv(_ServedEnv, self.start_method)
+        else:
+            raise EnvServerError("Maximum number of environments reached ({}).".format(self.max_envs))
+
+        env_id = self._next_id
+        self._next_id += 1
+        self._envs[env_id] = env
+        session.env_ids.add(env_id)
+        return env_id
+
+    async def _release(self, env_id: int) -> None:
+        env = self._envs.pop(env_id)
+        try:
+            await env.call("close")
+        except Exception:
+            await asyncio.gather(env.close(), return_exceptions=True)  # Broken worker, don't reuse it.
+        else:
+            self._idle.append(env)
+
+    def _get_env(self, env_id: int, session: _Session) -> AsyncioEnv:
+        if env_id not in session.env_ids:
+            if env_id in self._envs:
+                raise EnvServerError("Environment {} belongs to another client.".format(env_id))
+
+            raise EnvServerError("Unknown environment id: {}.".format(env_id))
+
+        return self._envs[env_id]
+
+    async def _handle(self, request: Dict[str, Any], session: _Session, nested: bool = False) -> Any:
+        op = request["op"]
+        if op == "batch":
+            if nested:
+                raise EnvServerError("Batch requests can't be nested.")
+
+            return await asyncio.gather(*(self._handle_safely(r, session, nested=True) for r in request["requests"]))
+
+        if op == "load":
+            env_id = request.get("env_id")
+            if env_id is None:
+                env_id = await self._open(session)
+                try:
+                    await self._get_env(env_id, session).call("load", request["gamefile"], request["request_infos"])
+                except BaseException:
+                    session.env_ids.discard(env_id)
+                    await self._release(env_id)  # The client never got its id.
+                    raise
+
+                return env_id
+
+            await self._get_env(env_id, session).call("load", request["gamefile"], request["request_infos"])
+            return env_id
+
+        if op == "reset":
+            return await self._get_env(request["env_id"], session).call("reset")
+
+        if op == "step":
+            return await self._get_env(request["env_id"], session).call("step", request["command"])
+
+        if op == "seed":
+            return await self._get_env(request["env_id"], session).call("seed", request.get("seed"))
+
+        if op == "close":
+            if request["env_id"] in session.env_ids:
+                session.env_ids.discard(request["env_id"])
+                await self._release(request["env_id"])
+
+            return None
+
+        raise EnvServerError("Unknown operation: {}.".format(op))
+
+    async def _handle_safely(self, request: Dict[str, Any], session: _Session, nested: bool = False) -> Dict[str, Any]:
+        try:
+            return {"result": await self._handle(request, session, nested)}
+        except Exception as e:
+            return {"error": "{}: {}".format(type(e).__name__, e)}
+
+    def _join(self, session: _Session, session_id: str) -> _Session:
+        if session.env_ids:
+            raise EnvServerError("Can't join a session after opening environments.")
+
+        session = self._sessions.setdefault(session_id, _Session(session_id))
+        session.nb_connections += 1
+        return session
+
+    async def _leave(self, session: _Session) -> None:
+        session.nb_connections -= 1
+        if session.nb_connections > 0:
+            return
+
+        self._sessions.pop(session.session_id, None)
+
+        # Release the environments the client didn't close.
+        env_ids, session.env_ids = session.env_ids, set()
+        await asyncio.gather(*(self._release(env_id) for env_id in env_ids), return_exceptions=True)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Unless it joins a session shared with other connections, the environments
+        # opened by a connection can only be used by it, and live as long as it does.
+        session = _Session()
+        session.nb_connections += 1
+        try:
+            while True:
+                flags, size = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                request = _unpack(flags, await reader.readexactly(size))
+                if request.get("op") == "session":
+                    try:
+                        joined = self._join(session, request["session_id"])
+                    except EnvServerError as e:
+                        response = {"error": "{}: {}".format(type(e).__name__, e)}
+                    else:
+                        await self._leave(session)
+                        session = joined
+                        response = {"result": None}
+                else:
+                    response = await self._handle_safely(request, session)
+
+                writer.write(_pack(response))
+                await writer.drain()
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Client disconnected.
+        finally:
+            writer.close()
+            await self._leave(session)
+
+    async def serve(self) -> None:
+        """ Serves requests until `shutdown` is called. """
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        if isinstance(self.address, str):
+            server = await asyncio.start_unix_server(self._serve_client, path=self.address)
+        else:
+            server = await asyncio.start_server(self._serve_client, *self.address)
+            self.address = server.sockets[0].getsockname()[:2]
+
+        self._ready.set()
+        async with server:
+            await self._stop.wait()
+
+        envs = list(self._envs.values()) + self._idle
+        await asyncio.gather(*(env.close() for env in envs))
+        self._envs, self._idle = {}, []
+
+    def serve_forever(self) -> None:
+        """ Serves requests until `shutdown` is called (blocking). """
+        asyncio.run(self.serve())
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """ Waits until the server accepts connections. """
+        return self._ready.wait(timeout)
+
+    def shutdown(self) -> None:
+        """ Stops the server and closes all environments (thread-safe). """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+
+class EnvClient:
+    """ Client holding a pool of connections to an `EnvServer`.
+
+    It is safe to share a client between threads. All its connections share
+    the environments they open, which get released by the server once they
+    are all closed.
+    """
+
+    def __init__(self, address: Address, pool_size: int = 4, timeout: Optional[float] = None) -> None:
+        """
+        Arguments:
+            address: Address of the server (see `EnvServer`).
+            pool_size: Maximum number of simultaneous connections to the server.
+            timeout: Timeout (in seconds) for each request. By default, wait indefinitely.
+        """
+        self.address = address
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._session_id = uuid.uuid4().hex
+
+    def _connect(self) -> socket.socket:
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        sock.settimeout(self.timeout)
+        sock.connect(tuple(self.address) if not isinstance(self.address, str) else self.address)
+        try:
+            sock.sendall(_pack({"op": "session", "session_id": self._session_id}))
+            flags, size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+            self._get_result(_unpack(flags, _recv_exactly(sock, size)))
+        except BaseException:
+            sock.close()
+            raise
+
+        return sock
+
+    def _send(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with self._slots:
+            try:
+                sock = self._idle.get_nowait()
+            except queue.Empty:
+                sock = self._connect()
+
+            try:
+                sock.sendall(_pack(request))
+                flags, size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+                response = _unpack(flags, _recv_exactly(sock, size))
+            except BaseException:
+                sock.close()  # The connection can't be reused.
+                raise
+
+            self._idle.put(sock)
+            return response
+
+    @staticmethod
+    def _get_result(response: Dict[str, Any]) -> Any:
+        if "error" in response:
+            raise EnvServerError(response["error"])
+
+        return response["result"]
+
+    def request(self, op: str, **kwargs) -> Any:
+        """ Sends a single request to the server. """
+        return self._get_result(self._send(dict(kwargs, op=op)))
+
+    def batch(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        """ Sends multiple requests in a single message. They are processed concurrently by the server. """
+        responses = self._send({"op": "batch", "requests": requests})
+        return [self._get_result(response) for response in self._get_result(responses)]
+
+    def close(self) -> None:
+        """ Closes all idle connections. """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _to_game_state(infos: Dict[str, Any]) -> GameState:
+    """ Rebuilds the objects (e.g., the game and the facts) serialized by the server. """
+    state = GameState(infos)
+    if isinstance(state.get("game"), dict):
+        from textworld.generator.game import Game
+        state["game"] = Game.deserialize(state["game"])
+
+    if isinstance(state.get("facts"), list):
+        state["facts"] = [Proposition.deserialize(fact) for fact in state["facts"]]
+
+    for attr in ["win_facts", "fail_facts"]:
+        if isinstance(state.get(attr), list):
+            state[attr] = [[tuple(Proposition.deserialize(fact) for fact in event_facts) for event_facts in quest_facts]
+                           for quest_facts in state[attr]]
+
+    if isinstance(state.get("last_action"), dict):
+        state["last_action"] = Action.deserialize(state["last_action"])
+
+    return state
+
+
+class RemoteEnv(Environment):
+    """ Environment hosted by an `EnvServer`. """
+
+    def __init__(self, client: Union[EnvClient, Address], request_infos: Optional[EnvInfos] = None) -> None:
+        """
+        Arguments:
+            client: Client to use or the address of the server.
+            request_infos: Information to be included in the game state. By
+                           default, only the game's narrative is included.
+        """
+        super().__init__(request_infos)
+        self._owns_client = not isinstance(client, EnvClient)
+        self.client = EnvClient(client, pool_size=1) if self._owns_client else client
+        self._env_id = None
+
+    def load(self, path: str) -> None:
+        """ Loads a game (path on the server's filesystem). """
+        self._env_id = self.client.request("load", env_id=self._env_id, gamefile=path,
+                                           request_infos=_infos_to_dict(self.request_infos))
+
+    def reset(self) -> GameState:
+        self.state = _to_game_state(self.client.request("reset", env_id=self._env_id))
+        return self.state
+
+    def step(self, command: str) -> Tuple[GameState, float, bool]:
+        infos, score, done = self.client.request("step", env_id=self._env_id, command=command)
+        self.state = _to_game_state(infos)
+        return self.state, score, done
+
+    def seed(self, seed: Optional[int] = None) -> Any:
+        if self._env_id is None:
+            return []
+
+        return self.client.request("seed", env_id=self._env_id, seed=seed)
+
+    def close(self) -> None:
+        if getattr(self, "_env_id", None) is not None:
+            self.client.request("close", env_id=self._env_id)
+            self._env_id = None
+
+        if getattr(self, "_owns_client", False):
+            self.client.close()
+
+
+class RemoteBatchEnv:
+    """ Batch of environments hosted by an `EnvServer`.
+
+    Same interface as :py:class:`SyncBatchEnv <textworld.envs.batch.batch_env.SyncBatchEnv>`.
+    Each call sends a single message containing the requests of the whole batch.
+    """
+
+    def __init__(self, client: Union[EnvClient, Address], batch_size: int,
+                 request_infos: Optional[EnvInfos] = None, auto_reset: bool = False) -> None:
+        self._owns_client = not isinstance(client, EnvClient)
+        self.client = EnvClient(client, pool_size=1) if self._owns_client else client
+        self.batch_size = batch_size
+        self.request_infos = request_infos or EnvInfos()
+        self.auto_reset = auto_reset
+        self.env_ids = [None] * self.batch_size
+        self.last = [None] * self.batch_size
+
+    def load(self, game_files: List[str]) -> None:
+        assert len(game_files) == self.batch_size
+        request_infos = _infos_to_dict(self.request_infos)
+        self.env_ids = self.client.batch([
+            {"op": "load", "env_id": env_id, "gamefile": game_file, "request_infos": request_infos}
+            for env_id, game_file in zip(self.env_ids, game_files)
+        ])
+
+    def seed(self, seed=None):
+        seeds = seed
+        if seeds is None or isinstance(seeds, int):
+            # Use a different seed for each env to decorrelate batch examples.
+            rng = np.random.RandomState(seeds)
+            seeds = [int(s) for s in rng.randint(65635, size=self.batch_size)]
+
+        self.client.batch([{"op": "seed", "env_id": env_id, "seed": seed}
+                           for env_id, seed in zip(self.env_ids, seeds)])
+        return seeds
+
+    @staticmethod
+    def _split(infos: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        infos = _to_game_state(infos)
+        return infos.pop("feedback"), dict(infos)
+
+    def reset(self) -> Tuple[List[str], Dict[str, List[Any]]]:
+        """
+        Reset all environments of the batch.
+
+        Returns:
+            obs: Text observations, i.e. command's feedback.
+            infos: Information requested when creating the environments.
+        """
+        self.last = [None] * self.batch_size
+        results = self.client.batch([{"op": "reset", "env_id": env_id} for env_id in self.env_ids])
+        obs, infos = zip(*map(self._split, results))
+        return obs, _list_of_dicts_to_dict_of_lists(infos)
+
+    def step(self, actions: List[str]) -> Tuple[List[str], List[float], List[bool], Dict[str, List[Any]]]:
+        """
+        Perform one action per environment of the batch.
+
+        Returns:
+            obs: Text observations, i.e. command's feedback.
+            reward: Current game score.
+            done: Whether the game is over or not.
+            infos: Information requested when creating the environments.
+        """
+        assert isinstance(actions, (list, tuple)), "Expected a list of actions."
+        assert len(actions) == self.batch_size, "Expected one action per environment."
+
+        requests, indices = [], []
+        for i, (env_id, action) in enumerate(zip(self.env_ids, actions)):
+            if self.last[i] is not None and self.last[i][2]:  # Game has ended on the last step.
+                if not self.auto_reset:
+                    continue  # Copy last state over.
+
+                requests.append({"op": "reset", "env_id": env_id})
+            else:
+                requests.append({"op": "step", "env_id": env_id, "command": action})
+
+            indices.append(i)
+
+        results = list(self.last)
+        for i, request, result in zip(indices, requests, self.client.batch(requests)):
+            if request["op"] == "reset":
+                obs, infos = self._split(result)
+                results[i] = (obs, 0., False, infos)
+            else:
+                obs, infos = self._split(result[0])
+                results[i] = (obs, result[1], result[2], infos)
+
+        self.last = results
+        obs, rewards, dones, infos = zip(*results)
+        return obs, rewards, dones, _list_of_dicts_to_dict_of_lists(infos)
+
+    def close(self) -> None:
+        requests = [{"op": "close", "env_id": env_id} for env_id in self.env_ids if env_id is not None]
+        if requests:
+            self.client.batch(requests)
+
+        self.env_ids = [None] * self.batch_size
+        if self._owns_client:
+            self.client.close()
+
+
+def serve(address: Address, max_envs: Optional[int] = None, start_method: Optional[str] = None) -> None:
+    """ Starts an `EnvServer` and serves requests forever. """
+    EnvServer(address, max_envs=max_envs, start_method=start_method).serve_forever()
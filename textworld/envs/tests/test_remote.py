@@ -0,0 +1,149 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from os.path import join as pjoin
+
+import textworld
+from textworld.core import EnvInfos
+
+from textworld.envs.tw import TextWorldEnv
+from textworld.envs.remote import EnvServer, EnvClient, EnvServerError, RemoteEnv, RemoteBatchEnv
+from textworld.envs.remote import _pack
+
+
+class TestRemoteEnv(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.gamefile = pjoin(cls.tmpdir, "tw-game.json")
+        options = textworld.GameOptions()
+        options.seeds = 1234
+        cls.game = textworld.generator.make_game(options)
+        cls.game.save(cls.gamefile)
+        cls.request_infos = EnvInfos(admissible_commands=True, policy_commands=True,
+                                     facts=True, last_action=True,
+                                     score=True, won=True, extras=["walkthrough"])
+
+        cls.server = EnvServer(("127.0.0.1", 0), max_envs=3)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        assert cls.server.wait_until_ready(timeout=30)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.thread.join()
+        shutil.rmtree(cls.tmpdir)
+
+    def test_remote_env(self):
+        local_env = TextWorldEnv(self.request_infos)
+        local_env.load(self.gamefile)
+        env = RemoteEnv(self.server.address, self.request_infos)
+        env.load(self.gamefile)
+
+        game_state = env.reset()
+        expected = local_env.reset()
+        for cmd in ["look"] + expected["extra.walkthrough"]:
+            for attr in ["admissible_commands", "policy_commands", "won", "facts", "last_action"]:
+                assert game_state[attr] == expected[attr]
+
+            game_state, score, done = env.step(cmd)
+            expected, expected_score, expected_done = local_env.step(cmd)
+            assert (score, done) == (expected_score, expected_done)
+            assert game_state.feedback == expected.feedback
+
+        assert done and game_state.won
+        env.close()
+        assert env.client._idle.empty()  # The connection of the env's own client got closed.
+
+    def test_command_spaces(self):
+        request_infos = EnvInfos(possible_commands=True, possible_admissible_commands=True)
+        env = RemoteEnv(self.server.address, request_infos)
+        env.load(self.gamefile)
+        game_state = env.reset()
+        assert game_state.possible_commands == list(self.game.possible_commands)
+        assert game_state.possible_admissible_commands == list(self.game.possible_admissible_commands)
+        env.close()
+
+    def test_unserializable_infos(self):
+        with self.assertRaises(TypeError):
+            _pack({"infos": object()})
+
+    def test_remote_batch_env(self):
+        client = EnvClient(self.server.address, pool_size=2)
+        env = RemoteBatchEnv(client, batch_size=2, request_infos=self.request_infos, auto_reset=True)
+        env.load([self.gamefile] * 2)
+        obs, infos = env.reset()
+        walkthrough = infos["extra.walkthrough"][0]
+        for cmd in walkthrough:
+            obs, scores, dones, infos = env.step([cmd, "wait"])
+
+        assert dones == (True, False)
+        assert scores[0] == self.game.max_score
+
+        # First game gets reset, the other one keeps going.
+        obs, scores, dones, infos = env.step(["wait", walkthrough[0]])
+        assert scores[0] == 0 and not dones[0]
+        assert infos["policy_commands"][0] == walkthrough
+        assert infos["policy_commands"][1] == walkthrough[1:]
+        env.close()
+        client.close()
+
+    def test_max_envs(self):
+        envs = [RemoteEnv(self.server.address) for _ in range(4)]
+        for env in envs[:3]:
+            env.load(self.gamefile)
+
+        with self.assertRaises(EnvServerError):
+            envs[3].load(self.gamefile)
+
+        # Closed environments are returned to the pool.
+        envs[0].close()
+        envs[3].load(self.gamefile)
+        for env in envs:
+            env.close()
+
+    def test_disconnect(self):
+        client = EnvClient(self.server.address)
+        env_id = client.request("load", gamefile=self.gamefile, request_infos={})
+
+        # Other clients can't use it.
+        other = EnvClient(self.server.address)
+        with self.assertRaises(EnvServerError):
+            other.request("reset", env_id=env_id)
+
+        with self.assertRaises(EnvServerError):
+            other.batch([{"op": "batch", "requests": []}])
+
+        # The environment is released once its client disconnects without closing it.
+        client.close()
+        deadline = time.time() + 30
+        while env_id in self.server._envs and time.time() < deadline:
+            time.sleep(0.01)
+
+        assert env_id not in self.server._envs
+        other.close()
+
+    def test_unix_socket(self):
+        address = pjoin(self.tmpdir, "tw.sock")
+        server = EnvServer(address)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        assert server.wait_until_ready(timeout=30)
+        assert os.path.exists(address)
+
+        env = RemoteEnv(address, EnvInfos(admissible_commands=True))
+        env.load(self.gamefile)
+        assert "look" in env.reset().admissible_commands
+        env.close()
+
+        server.shutdown()
+        thread.join()
@@ -32,7 +32,8 @@ class TestTextWorldEnv(unittest.TestCase):
             facts=True,
             policy_commands=True,
             admissible_commands=True,
-            intermediate_reward=True
+            intermediate_reward=True,
+            state_hash=True
         )
 
     @classmethod
@@ -137,6 +138,19 @@ class TestTextWorldEnv(unittest.TestCase):
         assert "examine chest" in game_state.admissible_commands
         assert "examine carrot" not in game_state.admissible_commands
 
+    def test_state_hash(self):
+        initial_state = self.env.reset()
+        assert initial_state.state_hash == initial_state["_game_progression"].state.hash
+
+        game_state, _, _ = self.env.step("dummy")
+        assert game_state.state_hash == initial_state.state_hash
+
+        game_state, _, _ = self.env.step("drop carrot")
+        assert game_state.state_hash != initial_state.state_hash
+
+        game_state, _, _ = self.env.step("take carrot")
+        assert game_state.state_hash == initial_state.state_hash
+
     def test_copy(self):
         # Copy before env.reset.
         env = self.env.copy()
@@ -176,3 +190,65 @@ class TestTextWorldEnv(unittest.TestCase):
         assert tuple(env._current_winning_policy) == tuple(current_winning_policy)
         assert tuple(env._current_winning_policy) != tuple(self.env._current_winning_policy)
         assert env._game_progression.state == game_progression.state
+
+    def test_peek(self):
+        game_state = self.env.reset()
+        game_progression = self.env._game_progression
+        commands = ["go east", "drop carrot", "dummy"]
+
+        expected = [self.env.copy().step(command) for command in commands]
+        outcomes = self.env.peek(commands)
+        assert len(outcomes) == len(commands)
+        for (state, score, done), (expected_state, expected_score, expected_done) in zip(outcomes, expected):
+            assert state.last_command == expected_state.last_command
+            assert state.feedback == expected_state.feedback
+            assert state.admissible_commands == expected_state.admissible_commands
+            assert state.policy_commands == expected_state.policy_commands
+            assert state.intermediate_reward == expected_state.intermediate_reward
+            assert set(state.facts) == set(expected_state.facts)
+            assert (score, done) == (expected_score, expected_done)
+
+        # The environment is left untouched.
+        assert self.env.state is game_state
+        assert self.env._moves == 0
+        assert self.env._game_progression.state == game_progression.state
+        assert game_progression.state == self.env._game.world.state
+
+        # And it can keep going as if nothing happened.
+        for command in self.game.metadata["walkthrough"]:
+            game_state, _, done = self.env.step(command)
+
+        assert done
+        assert game_state.won
+
+    def test_snapshot(self):
+        game_state = self.env.reset()
+        snapshots = [self.env.snapshot()]
+        states = [game_state]
+        for command in self.game.metadata["walkthrough"]:
+            game_state, _, _ = self.env.step(command)
+            snapshots.append(self.env.snapshot())
+            states.append(game_state)
+
+        assert all(isinstance(snapshot, bytes) for snapshot in snapshots)
+
+        # Snapshots can be restored in another environment that has loaded the same game.
+        env = TextWorldEnv(self.request_infos)
+        env.load(self.gamefile)
+        for snapshot, game_state in zip(snapshots, states):
+            env.restore(snapshot)
+            assert env.state.feedback == game_state.feedback
+            assert env.state.admissible_commands == game_state.admissible_commands
+            assert env.state.policy_commands == game_state.policy_commands
+            assert env.state.intermediate_reward == game_state.intermediate_reward
+            assert env.state.score == game_state.score
+            assert env.state.won == game_state.won
+            assert set(env.state.facts) == set(game_state.facts)
+
+        # And the game goes on from there.
+        env.restore(snapshots[0])
+        for command in self.game.metadata["walkthrough"]:
+            game_state, _, done = env.step(command)
+
+        assert done
+        assert game_state.won
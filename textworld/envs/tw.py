@@ -6,8 +6,10 @@
 from typing import Optional
 
 import textworld
-from textworld.core import EnvInfos, GameState
+from textworld.core import EnvInfos, GameState, GameNotRunningError
 from textworld.generator.game import GameProgression
+from textworld.generator.planner import Planner
+from textworld.logic import Interner
 from textworld.generator.inform7 import Inform7Game
 
 
@@ -21,13 +23,16 @@ class TextWorldEnv(textworld.Environment):
     Environment for playing games by TextWorld.
     """
 
-    def __init__(self, request_infos: Optional[EnvInfos] = None) -> None:
+    def __init__(self, request_infos: Optional[EnvInfos] = None, planner: Optional[Planner] = None) -> None:
         """
         Arguments:
             request_infos: Information to be included in the game state. By
                            default, only the game's narrative is included.
+            planner: When provided, used to find the shortest winning policies
+                     (see :py:class:`textworld.generator.planner.Planner`).
         """
         super().__init__(request_infos)
+        self.planner = planner
         self._gamefile = None
         self._game = None
         self._inform7 = None
@@ -90,6 +95,9 @@ class TextWorldEnv(textworld.Environment):
         if self.request_infos.facts:
             self.state["facts"] = list(map(self._inform7.get_human_readable_fact, self.state["_facts"]))
 
+        if self.request_infos.state_hash:
+            self.state["state_hash"] = self._game_progression.state.hash
+
         self.state["last_action"] = None
         self.state["_last_action"] = self._last_action
         if self.request_infos.last_action and self._last_action is not None:
@@ -107,7 +115,7 @@ class TextWorldEnv(textworld.Environment):
     def reset(self):
         self._prev_state = None
         self.state = GameState()
-        self._game_progression = GameProgression(self._game, track_quests=True)
+        self._game_progression = GameProgression(self._game, track_quests=True, planner=self.planner)
         self._last_action = None
         self._previous_winning_policy = None
         self._current_winning_policy = self._game_progression.winning_policy
@@ -146,6 +154,50 @@ class TextWorldEnv(textworld.Environment):
         self.state["done"] = self.state["won"] or self.state["lost"]
         return self.state, self.state["score"], self.state["done"]
 
+    def _checkpoint(self):
+        # `step` updates the game progression in place, keep a copy of it.
+        game_progression = self._game_progression.copy() if self._game_progression is not None else None
+        return (self.state, self._prev_state, game_progression, self._last_action,
+                self._previous_winning_policy, self._current_winning_policy, self._moves)
+
+    def _restore(self, checkpoint) -> None:
+        (self.state, self._prev_state, game_progression, self._last_action,
+         self._previous_winning_policy, self._current_winning_policy, self._moves) = checkpoint
+
+        self._game_progression = game_progression.copy() if game_progression is not None else None
+
+    def _get_snapshot(self):
+        if self._game_progression is None:
+            raise GameNotRunningError("Call env.reset() before env.snapshot().")
+
+        interner = Interner()
+        policies = [None if policy is None else tuple(map(interner.encode_action, policy))
+                    for policy in (self._previous_winning_policy, self._current_winning_policy)]
+        last_action = None if self._last_action is None else interner.encode_action(self._last_action)
+        game_progression = self._game_progression.encode(interner)
+        return (interner.serialize(), game_progression, last_action, policies, self._moves,
+                self.state.last_command, self.state.feedback)
+
+    def _set_snapshot(self, data) -> None:
+        tables, game_progression, last_action, policies, moves, last_command, feedback = data
+        interner = Interner(tables)
+        self._game_progression = GameProgression.decode(game_progression, self._game, interner, self.planner)
+        self._last_action = None if last_action is None else interner.decode_action(last_action)
+        self._previous_winning_policy, self._current_winning_policy = [
+            None if policy is None else tuple(map(interner.decode_action, policy)) for policy in policies
+        ]
+        self._moves = moves
+
+        self._prev_state = None
+        self.state = GameState()
+        self.state.raw = DEFAULT_OBSERVATION
+        self.state.feedback = feedback
+        self._gather_infos()
+        if last_command is not None:  # Snapshot was taken after a `step`.
+            self.state.last_command = last_command
+            self.state["score"] = self._game_progression.score
+            self.state["done"] = self.state["won"] or self.state["lost"]
+
     def copy(self) -> "TextWorldEnv":
         """ Return a copy of this environment.
 
@@ -153,7 +205,7 @@ class TextWorldEnv(textworld.Environment):
 
         .. warning:: The `Game` and `Inform7Game` private objects are *soft* copies.
         """
-        env = TextWorldEnv()
+        env = TextWorldEnv(planner=self.planner)  # Reference
 
         # Copy core Environment's attributes.
         env.state = self.state.copy()
@@ -28,3 +28,17 @@ class Limit(Wrapper):
         self.nb_steps += 1
         done |= self.nb_steps >= self.max_episode_steps
         return game_state, score, done
+
+    def _checkpoint(self):
+        return self.nb_steps, super()._checkpoint()
+
+    def _restore(self, checkpoint) -> None:
+        self.nb_steps, checkpoint = checkpoint
+        super()._restore(checkpoint)
+
+    def _get_snapshot(self):
+        return self.nb_steps, super()._get_snapshot()
+
+    def _set_snapshot(self, data) -> None:
+        self.nb_steps, data = data
+        super()._set_snapshot(data)
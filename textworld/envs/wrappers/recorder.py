@@ -2,7 +2,7 @@
 # Licensed under the MIT license.
 
 
-from typing import Tuple
+from typing import Tuple, List
 
 from textworld.core import GameState, Wrapper
 
@@ -24,6 +24,10 @@ class Recorder(Wrapper):
         self.last_game_state = game_state
         return res
 
+    def peek(self, commands: List[str]) -> List[Tuple[GameState, float, bool]]:
+        # Lookahead commands are not part of the recording.
+        return self._wrapped_env.peek(commands)
+
     def reset(self) -> GameState:
         self.actions = []
         self.last_game_state = None
@@ -12,6 +12,8 @@ import textworld
 from textworld.utils import check_flag
 from textworld.generator.game import Game, GameProgression
 from textworld.generator.inform7 import Inform7Game
+from textworld.generator.planner import Planner
+from textworld.logic import Interner
 
 
 AVAILABLE_INFORM7_EXTRA_INFOS = ["description", "inventory", "score", "moves"]
@@ -95,11 +97,21 @@ class TWInform7(textworld.core.Wrapper):
     Wrapper to play Inform7 games generated by TextWorld.
     """
 
+    def __init__(self, env: Optional[textworld.Environment] = None, planner: Optional[Planner] = None) -> None:
+        """
+        Args:
+            env: environment to wrap.
+            planner: When provided, used to find the shortest winning policies
+                     (see :py:class:`textworld.generator.planner.Planner`).
+        """
+        self._planner = planner
+        super().__init__(env)
+
     def _wrap(self, env):
         super()._wrap(env)
         self._wrapped_env = GameData(self._wrapped_env)
         self._wrapped_env = Inform7Data(self._wrapped_env)
-        self._wrapped_env = StateTracking(self._wrapped_env)
+        self._wrapped_env = StateTracking(self._wrapped_env, planner=self._planner)
 
     @classmethod
     def compatible(cls, path: str) -> bool:
@@ -112,7 +124,7 @@ class TWInform7(textworld.core.Wrapper):
 
     def copy(self) -> "TWInform7":
         """ Returns a copy this wrapper. """
-        env = TWInform7()
+        env = TWInform7(planner=self._planner)
         env._wrapped_env = self._wrapped_env.copy()
         return env
 
@@ -180,6 +192,29 @@ class Inform7Data(textworld.core.Wrapper):
         self._gather_infos()
         return self.state
 
+    def _checkpoint(self):
+        return self.state, self._prev_state, self._wrapped_env._checkpoint()
+
+    def _restore(self, checkpoint) -> None:
+        self.state, self._prev_state, checkpoint = checkpoint
+        self._wrapped_env._restore(checkpoint)
+
+    def _get_snapshot(self):
+        infos = {attr: self.state.get(attr) for attr in self._tracked_infos}
+        return tuple(self._tracked_infos), infos, self._wrapped_env._get_snapshot()
+
+    def _set_snapshot(self, data) -> None:
+        tracked_infos, infos, data = data
+        self._wrapped_env._set_snapshot(data)
+        self._tracked_infos = list(tracked_infos)
+        self._prev_state = None
+        self.state = self._wrapped_env.state
+        _, self.state["feedback"] = _detect_extra_infos(self.state["feedback"], self._tracked_infos)
+        self.state.update(infos)
+        self._gather_infos()
+        if "done" in self.state:  # Snapshot was taken after a `step`.
+            self.state["done"] = self.state["won"] or self.state["lost"]
+
     def copy(self) -> "Inform7Data":
         """ Returns a copy this wrapper. """
         env = Inform7Data()
@@ -194,8 +229,9 @@ class StateTracking(textworld.core.Wrapper):
     Wrapper that enables state tracking for Inform7 games generated by TextWorld.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, planner: Optional[Planner] = None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.planner = planner
         self._gamefile = None
         self._game = None
         self._inform7 = None
@@ -211,6 +247,7 @@ class StateTracking(textworld.core.Wrapper):
                 or self.request_infos.policy_commands
                 or self.request_infos.admissible_commands
                 or self.request_infos.facts
+                or self.request_infos.state_hash
                 or self.request_infos.last_action)
 
     def load(self, gamefile: str) -> None:
@@ -260,6 +297,9 @@ class StateTracking(textworld.core.Wrapper):
         if self.request_infos.facts:
             self.state["facts"] = list(map(self._inform7.get_human_readable_fact, self.state["_facts"]))
 
+        if self.request_infos.state_hash:
+            self.state["state_hash"] = self._game_progression.state.hash
+
         self.state["_last_action"] = self._last_action
         if self.request_infos.last_action and self._last_action is not None:
             self.state["last_action"] = self._inform7.get_human_readable_action(self._last_action)
@@ -285,7 +325,7 @@ class StateTracking(textworld.core.Wrapper):
 
         self._send('tw-trace-actions')  # Turn on print for Inform7 action events.
         track_quests = (self.request_infos.intermediate_reward or self.request_infos.policy_commands)
-        self._game_progression = GameProgression(self._game, track_quests=track_quests)
+        self._game_progression = GameProgression(self._game, track_quests=track_quests, planner=self.planner)
         self._last_action = None
         self._previous_winning_policy = None
         self._current_winning_policy = self._game_progression.winning_policy
@@ -319,9 +359,54 @@ class StateTracking(textworld.core.Wrapper):
         self.state["done"] = self.state["won"] or self.state["lost"]
         return self.state, score, self.state["done"]
 
+    def _checkpoint(self):
+        # `step` updates the game progression in place, keep a copy of it.
+        game_progression = self._game_progression.copy() if self._game_progression is not None else None
+        return (self.state, game_progression, self._last_action, self._previous_winning_policy,
+                self._current_winning_policy, self._moves, self._wrapped_env._checkpoint())
+
+    def _restore(self, checkpoint) -> None:
+        (self.state, game_progression, self._last_action, self._previous_winning_policy,
+         self._current_winning_policy, self._moves, checkpoint) = checkpoint
+        self._wrapped_env._restore(checkpoint)
+
+        self._game_progression = game_progression.copy() if game_progression is not None else None
+
+    def _get_snapshot(self):
+        if not self.tracking:
+            return None, self._wrapped_env._get_snapshot()
+
+        interner = Interner()
+        policies = [None if policy is None else tuple(map(interner.encode_action, policy))
+                    for policy in (self._previous_winning_policy, self._current_winning_policy)]
+        last_action = None if self._last_action is None else interner.encode_action(self._last_action)
+        game_progression = self._game_progression.encode(interner)
+        tracking = (interner.serialize(), game_progression, last_action, policies, self._moves)
+        return tracking, self._wrapped_env._get_snapshot()
+
+    def _set_snapshot(self, data) -> None:
+        tracking, data = data
+        self._wrapped_env._set_snapshot(data)
+        self.state = self._wrapped_env.state
+        if tracking is None:
+            return  # State tracking not needed.
+
+        tables, game_progression, last_action, policies, self._moves = tracking
+        interner = Interner(tables)
+        self._game_progression = GameProgression.decode(game_progression, self._game, interner, self.planner)
+        self._last_action = None if last_action is None else interner.decode_action(last_action)
+        self._previous_winning_policy, self._current_winning_policy = [
+            None if policy is None else tuple(map(interner.decode_action, policy)) for policy in policies
+        ]
+
+        _, self.state["feedback"] = _detect_i7_events_debug_tags(self.state["feedback"])
+        self._gather_infos()
+        if "done" in self.state:  # Snapshot was taken after a `step`.
+            self.state["done"] = self.state["won"] or self.state["lost"]
+
     def copy(self) -> "StateTracking":
         """ Returns a copy this wrapper. """
-        env = StateTracking()
+        env = StateTracking(planner=self.planner)  # Reference
         env._wrapped_env = self._wrapped_env.copy()
 
         env._gamefile = self._gamefile
@@ -398,6 +483,18 @@ class GameData(textworld.core.Wrapper):
         self._gather_infos()
         return self.state, score, done
 
+    def _checkpoint(self):
+        return self.state, self._wrapped_env._checkpoint()
+
+    def _restore(self, checkpoint) -> None:
+        self.state, checkpoint = checkpoint
+        self._wrapped_env._restore(checkpoint)
+
+    def _set_snapshot(self, data) -> None:
+        self._wrapped_env._set_snapshot(data)
+        self.state = self._wrapped_env.state
+        self._gather_infos()
+
     def copy(self) -> "GameData":
         """ Return a soft copy. """
         env = GameData()
@@ -3,7 +3,7 @@
 
 
 import threading
-from typing import Tuple
+from typing import Tuple, List
 
 from textworld.core import Environment, GameState, Wrapper
 from textworld.render.serve import VisualizationService
@@ -75,6 +75,22 @@ class HtmlViewer(Wrapper):
         self._server.update_state(game_state, command)
         return game_state, score, done
 
+    def peek(self, commands: List[str]) -> List[Tuple[GameState, float, bool]]:
+        """
+        Evaluate commands without changing the game state (nor the visualization).
+
+        Parameters
+        ----------
+        commands :
+            Text commands to evaluate from the current game state.
+
+        Returns
+        -------
+        outcomes :
+            For each command, the tuple `step(command)` would have returned.
+        """
+        return self._wrapped_env.peek(commands)
+
     def reset(self) -> GameState:
         """
         Reset the game.
@@ -4,22 +4,90 @@
 
 import os
 import warnings
+import multiprocessing
+from collections import defaultdict
+from typing import Dict, List, Optional
 
 import jericho
+import numpy as np
 
 import textworld
 from textworld.core import GameState
 from textworld.core import GameNotRunningError
+from textworld.utils import get_context
+from textworld.utils import TranspositionTable
+
+
+_WORKER_ENV = None  # Interpreter of the processes testing candidate commands.
+
+# Internals of `FrotzEnv.get_valid_actions` needed to test the candidate commands with our own workers.
+_JERICHO_INTERNALS = ("_identify_interactive_objects", "_score_object_names",
+                      "_filter_candidate_actions", "_emulator_halted")
+# Jericho versions whose `FrotzEnv.get_valid_actions` is mirrored by `JerichoEnv._get_valid_actions`.
+_JERICHO_VERSIONS = ((3, 3), (4, 0))  # [min, max)
+
+
+def _jericho_version() -> tuple:
+    try:
+        return tuple(int(part) for part in jericho.__version__.split(".")[:2])
+    except (AttributeError, ValueError):
+        return ()  # Unknown version.
+
+
+def _has_jericho_internals(env: jericho.FrotzEnv) -> bool:
+    """ Whether `env` exposes the internals needed to test candidate commands with our own workers. """
+    min_version, max_version = _JERICHO_VERSIONS
+    return (min_version <= _jericho_version() < max_version
+            and all(hasattr(env, name) for name in _JERICHO_INTERNALS))
+
+
+def _init_worker(gamefile: str, seed: int) -> None:
+    global _WORKER_ENV
+    _WORKER_ENV = jericho.FrotzEnv(gamefile, seed)
+
+
+def _filter_candidate_actions_worker(args):
+    state, candidate_actions = args
+    if not candidate_actions:
+        return {}
+
+    _WORKER_ENV.set_state(state)
+    return dict(_WORKER_ENV._filter_candidate_actions(candidate_actions, use_ctypes=True, use_parallel=False))
 
 
 class JerichoEnv(textworld.Environment):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, nb_workers: Optional[int] = None,
+                 observation_cache: Optional[TranspositionTable] = None, **kwargs):
+        """
+        Arguments:
+            infos: Information to be included in the game state. By
+                   default, only the game's narrative is included.
+            nb_workers: Number of processes, each with a copy of the interpreter,
+                        testing candidate commands in parallel when
+                        `infos.admissible_commands` is requested. Use 1 to test
+                        them one after the other. By default, Jericho's own
+                        process pool (one process per CPU) is used.
+                        Daemonic processes (e.g. the workers of a batch env)
+                        can't have children, they always test them one after the other
+                        (with a warning, unless `nb_workers` is 1). Our own workers rely
+                        on Jericho's internals: with an untested Jericho version (see
+                        `_JERICHO_VERSIONS`), Jericho's own pool is used instead, with a warning.
+            observation_cache: Cache for the description, the inventory and the
+                               admissible commands, keyed on the world state. Obtaining
+                               them requires extra interpreter steps, so they are reused
+                               whenever the same world state is reached again. It can be
+                               shared by several environments. By default, nothing is cached.
+        """
         super().__init__(*args, **kwargs)
         self._seed = -1
         self._jericho = None
         self.gamefile = None
         self._reset = False
+        self.nb_workers = nb_workers
+        self.observation_cache = observation_cache
+        self._pool = None
+        self._story = None  # Content of the game file, see `_get_snapshot`.
 
     def load(self, z_file: str) -> None:
         self.gamefile = os.path.abspath(z_file)
@@ -38,6 +106,9 @@ class JerichoEnv(textworld.Environment):
         else:
             self._jericho.load(self.gamefile)
 
+        self._close_pool()  # They were running the previous game.
+        self._story = None
+
     def __del__(self) -> None:
         self.close()
 
@@ -72,20 +143,114 @@ class JerichoEnv(textworld.Environment):
         self.state["moves"] = self._jericho.get_moves()
         self.state["location"] = self._jericho.get_player_location()
 
+        use_cache = self.observation_cache is not None and (self.request_infos.description
+                                                            or self.request_infos.inventory
+                                                            or self.request_infos.admissible_commands)
+        world_state_hash = None
+        if use_cache or self.request_infos.state_hash:
+            world_state_hash = self._jericho.get_world_state_hash()
+
+        if self.request_infos.state_hash:
+            self.state["state_hash"] = int(world_state_hash[:16], 16)  # Jericho's hash is a MD5 hex digest.
+
+        key = (self.gamefile, world_state_hash) if use_cache else None
+
         if self.request_infos.description:
-            bkp = self._jericho.get_state()
-            self.state["description"], _, _, _ = self._jericho.step("look")
-            self._jericho.set_state(bkp)
+            self.state["description"] = self._get_cached(key, "description", lambda: self._peek("look"))
 
         if self.request_infos.inventory:
-            bkp = self._jericho.get_state()
-            self.state["inventory"], _, _, _ = self._jericho.step("inventory")
-            self._jericho.set_state(bkp)
+            self.state["inventory"] = self._get_cached(key, "inventory", lambda: self._peek("inventory"))
 
         if self.request_infos.admissible_commands:
-            self.state["_valid_commands"] = self._jericho.get_valid_actions()
+            valid_commands = self._get_cached(key, "admissible_commands", self._get_valid_actions)
+            self.state["_valid_commands"] = list(valid_commands)
             self.state["admissible_commands"] = sorted(set(self.state["_valid_commands"]))
 
+    def _get_cached(self, key, name, fct):
+        if key is None:
+            return fct()
+
+        value = self.observation_cache.get(key + (name,))
+        if value is None:
+            value = self.observation_cache[key + (name,)] = fct()
+
+        return value
+
+    def _get_valid_actions(self) -> List[str]:
+        if self.nb_workers is not None and self.nb_workers <= 1:
+            return self._jericho.get_valid_actions(use_parallel=False)
+
+        if multiprocessing.current_process().daemon:
+            msg = ("Daemonic processes can't have children, admissible commands are tested one after the other."
+                   " Use `nb_workers=1` to silence this warning.")
+            warnings.warn(msg, RuntimeWarning)
+            return self._jericho.get_valid_actions(use_parallel=False)
+
+        if self.nb_workers is None:
+            return self._jericho.get_valid_actions()
+
+        if not _has_jericho_internals(self._jericho):
+            msg = ("Jericho {} is not supported by `nb_workers` (expecting >={}.{},<{}.{}),"
+                   " falling back on Jericho's own process pool.")
+            warnings.warn(msg.format(getattr(jericho, "__version__", "?"), *_JERICHO_VERSIONS[0], *_JERICHO_VERSIONS[1]),
+                          RuntimeWarning)
+            return self._jericho.get_valid_actions()
+
+        if not self._jericho.is_fully_supported or not self._jericho.act_gen:
+            return self._jericho.get_valid_actions()  # Warns about the game not being supported.
+
+        # Same as `FrotzEnv.get_valid_actions` but using our own pool of workers.
+        interactive_objs = self._jericho._identify_interactive_objects(use_object_tree=True)
+        best_obj_names = self._jericho._score_object_names(interactive_objs)
+        candidate_actions = self._jericho.act_gen.generate_actions(best_obj_names)
+        diff2acts = self._filter_candidate_actions(candidate_actions)
+        return [max(v, key=jericho.util.verb_usage_count) for v in diff2acts.values()]
+
+    def _filter_candidate_actions(self, candidate_actions: List[str]) -> Dict[tuple, List[str]]:
+        """ Groups the valid candidate actions by the changes they make to the world.
+
+        Candidate actions are split into one contiguous shard per worker
+        process, each running its own copy of the interpreter set to the
+        current state. The results are merged back in the same order, so the
+        output is identical to testing the candidates one after the other.
+        """
+        if self._jericho.game_over() or self._jericho.victory() or self._jericho._emulator_halted():
+            return {}
+
+        candidate_actions = [act.action if isinstance(act, jericho.defines.TemplateAction) else act
+                             for act in candidate_actions]
+
+        if multiprocessing.current_process().daemon:
+            # Daemonic processes can't have children.
+            return self._jericho._filter_candidate_actions(candidate_actions, use_ctypes=True, use_parallel=False)
+
+        if self._pool is None:
+            self._pool = get_context().Pool(self.nb_workers, initializer=_init_worker,
+                                            initargs=(self.gamefile, self._seed))
+
+        state = self._jericho.get_state()
+        # Contiguous shards, the first ones get one more candidate (same as `jericho.jericho.chunk`).
+        shards = [shard.tolist() for shard in np.array_split(np.array(candidate_actions, dtype=object), self.nb_workers)]
+        diff2acts = defaultdict(list)
+        for shard in self._pool.map(_filter_candidate_actions_worker, [(state, actions) for actions in shards]):
+            for diff, actions in shard.items():
+                diff2acts[diff].extend(actions)
+
+        return diff2acts
+
+    def _close_pool(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _peek(self, command: str) -> str:
+        """ Feedback of a command, without affecting the game's state. """
+        bkp = self._jericho.get_state()
+        feedback, _, _, _ = self._jericho.step(command)
+        self._jericho.set_state(bkp)
+        return feedback
+
     def reset(self):
         if not self.game_running:
             raise GameNotRunningError("Call env.load(gamefile) before env.reset().")
@@ -117,14 +282,65 @@ class JerichoEnv(textworld.Environment):
         return self.state, self.state.score, self.state.done
 
     def close(self):
+        self._close_pool()
         if self.game_running:
             self._jericho.close()
             self._jericho = None
             self._reset = False
 
+    def _checkpoint(self):
+        if not self.game_running or not self._reset:
+            raise GameNotRunningError()
+
+        return self._jericho.get_state(), self.state
+
+    def _restore(self, checkpoint) -> None:
+        jericho_state, self.state = checkpoint
+        self._jericho.set_state(jericho_state)
+
+    def _get_story_memory(self, size: int) -> np.ndarray:
+        """ Memory of the interpreter as it is when the game starts, i.e. the beginning of the game file. """
+        if self._story is None:
+            self._story = np.fromfile(self.gamefile, dtype=np.uint8)
+
+        return np.pad(self._story, (0, max(0, size - len(self._story))))[:size]
+
+    def _get_snapshot(self):
+        if not self.game_running or not self._reset:
+            raise GameNotRunningError()
+
+        ram, *jericho_state = self._jericho.get_state()
+        # Most of the memory doesn't change during the game, XOR-ing it with its initial
+        # content leaves mostly zeros which compress well.
+        ram = ram ^ self._get_story_memory(len(ram))
+        infos = {attr: self.state[attr] for attr in ("score", "moves") if attr in self.state}
+        return (ram, *jericho_state), self.state.last_command, self.state.raw, self.state.done, infos
+
+    def _set_snapshot(self, data) -> None:
+        if not self.game_running:
+            raise GameNotRunningError("Call env.load(gamefile) before env.restore(snapshot).")
+
+        (ram, *jericho_state), last_command, raw, done, infos = data
+        ram = ram ^ self._get_story_memory(len(ram))
+        self._jericho.set_state((ram, *jericho_state))
+        self._reset = True
+
+        self.state = GameState()
+        if last_command is not None:
+            self.state.last_command = last_command
+
+        self.state.raw = raw
+        if done is not None:
+            self.state.done = done
+
+        self._gather_infos()
+        # For some games (e.g., made by TextWorld), Jericho parses them from the last
+        # observation instead of reading them from memory, so they are stale.
+        self.state.update(infos)
+
     def copy(self) -> "JerichoEnv":
         """ Return a copy of this environment at the same state. """
-        env = JerichoEnv(self.request_infos)
+        env = JerichoEnv(self.request_infos, nb_workers=self.nb_workers, observation_cache=self.observation_cache)
         env._seed = self._seed
 
         if self.gamefile:
@@ -5,6 +5,8 @@
 import shutil
 import tempfile
 import unittest
+from unittest import mock
+from functools import partial
 from os.path import join as pjoin
 
 import pytest
@@ -18,8 +20,10 @@ from textworld import testing
 from textworld.core import EnvInfos
 from textworld.core import GameNotRunningError
 from textworld.generator.maker import GameMaker
-from textworld.utils import make_temp_directory
+from textworld.utils import make_temp_directory, TranspositionTable
 
+from textworld.envs.batch import AsyncBatchEnv
+from textworld.envs.wrappers import Filter
 from textworld.envs.zmachine.jericho import JerichoEnv
 
 
@@ -29,6 +33,10 @@ def assert_jericho_state_equals(s1, s2):
         assert np.all(e1 == e2)
 
 
+def _make_filtered_env(request_infos, **kwargs):
+    return Filter(JerichoEnv(request_infos, **kwargs))
+
+
 class TestJerichoEnv(unittest.TestCase):
 
     @classmethod
@@ -64,6 +72,132 @@ class TestJerichoEnv(unittest.TestCase):
         game_state, _, _ = self.env.step("take carrot")
         assert "pick up the carrot from the ground" in game_state.feedback
 
+    def test_observation_cache(self):
+        request_infos = EnvInfos(description=True, inventory=True, admissible_commands=True)
+        assert JerichoEnv(request_infos).observation_cache is None  # Opt-in.
+        env = JerichoEnv(request_infos, observation_cache=TranspositionTable(maxsize=4096))
+        env.load(self.game_file)
+
+        env.reset()
+        assert env.observation_cache.stats["misses"] == 3
+        assert env.observation_cache.stats["hits"] == 0
+
+        game_state, _, _ = env.step("examine carrot")
+        misses = env.observation_cache.stats["misses"]
+
+        # Examining again doesn't change the world state.
+        examine_state, _, _ = env.step("examine carrot")
+        assert env.observation_cache.stats["misses"] == misses
+        assert env.observation_cache.stats["hits"] == 3
+        assert examine_state.description == game_state.description
+        assert examine_state.inventory == game_state.inventory
+        assert examine_state.admissible_commands == game_state.admissible_commands
+
+        env.observation_cache = None  # Disable the cache.
+        game_state, _, _ = env.step("examine carrot")
+        assert game_state.description == examine_state.description
+        assert game_state.admissible_commands == examine_state.admissible_commands
+        env.close()
+
+    def test_parallel_candidate_actions(self):
+        request_infos = EnvInfos(admissible_commands=True)
+        env = JerichoEnv(request_infos, nb_workers=3)
+        env.load(self.game_file)
+        expected_env = JerichoEnv(request_infos)
+        expected_env.load(self.game_file)
+
+        game_state, expected = env.reset(), expected_env.reset()
+        for command in self.game.metadata["walkthrough"]:
+            assert game_state.admissible_commands == expected.admissible_commands
+            game_state, _, _ = env.step(command)
+            expected, _, _ = expected_env.step(command)
+
+        assert game_state.admissible_commands == expected.admissible_commands
+        env.close()
+        expected_env.close()
+        assert env._pool is None
+
+    def test_parallel_candidate_actions_unsupported_jericho(self):
+        request_infos = EnvInfos(admissible_commands=True)
+        env = JerichoEnv(request_infos, nb_workers=3)
+        env.load(self.game_file)
+        expected_env = JerichoEnv(request_infos, nb_workers=1)
+        expected_env.load(self.game_file)
+
+        # Fall back on Jericho's own process pool, with a warning.
+        with mock.patch("textworld.envs.zmachine.jericho._JERICHO_VERSIONS", ((0, 0), (0, 1))):
+            with pytest.warns(RuntimeWarning, match="falling back on Jericho's own process pool"):
+                game_state = env.reset()
+
+        assert game_state.admissible_commands == expected_env.reset().admissible_commands
+        assert env._pool is None
+        env.close()
+        expected_env.close()
+
+    def test_parallel_candidate_actions_in_batch_env(self):
+        # Workers of a batch env are daemonic, they can't start a pool of processes.
+        request_infos = EnvInfos(admissible_commands=True)
+        env_fns = [partial(_make_filtered_env, request_infos, nb_workers=3) for _ in range(2)]
+        env = AsyncBatchEnv(env_fns)
+        env.load([self.game_file] * 2)
+        expected_env = JerichoEnv(request_infos)
+        expected_env.load(self.game_file)
+
+        candidates = ["go east", "go west", "drop carrot", "eat carrot", "open chest", "close chest",
+                      "insert carrot into chest", "examine carrot", "take carrot"]
+        _, infos = env.reset()
+        expected = expected_env.reset()
+        for command in self.game.metadata["walkthrough"]:
+            assert infos["admissible_commands"] == [expected.admissible_commands] * 2
+            diff2acts = env.envs[0].call_sync("unwrapped._filter_candidate_actions", candidates)
+            assert diff2acts == expected_env._jericho._filter_candidate_actions(candidates, use_ctypes=True)
+
+            _, _, _, infos = env.step([command] * 2)
+            expected, _, _ = expected_env.step(command)
+
+        env.close()
+        expected_env.close()
+
+    def test_peek(self):
+        jericho_state = self.env._jericho.get_state()
+        commands = ["go east", "drop carrot", "eat carrot"]
+
+        outcomes = self.env.peek(commands)
+        for command, (game_state, score, done) in zip(commands, outcomes):
+            expected_state, expected_score, expected_done = self.env.copy().step(command)
+            assert game_state.feedback == expected_state.feedback
+            assert (score, done) == (expected_score, expected_done)
+
+        assert outcomes[2][0].lost
+        assert_jericho_state_equals(self.env._jericho.get_state(), jericho_state)
+        assert self.env.state is self.game_state
+
+        game_state, _, _ = self.env.step("go east")
+        assert game_state.feedback == outcomes[0][0].feedback
+
+    def test_snapshot(self):
+        snapshot = self.env.snapshot()
+        walkthrough = self.game.metadata["walkthrough"]
+        for command in walkthrough[:-1]:
+            game_state, _, _ = self.env.step(command)
+
+        last_snapshot = self.env.snapshot()
+
+        env = JerichoEnv(self.request_infos)
+        env.load(self.game_file)
+        env.restore(last_snapshot)
+        assert_jericho_state_equals(env._jericho.get_state(), self.env._jericho.get_state())
+        assert env.state == game_state
+
+        game_state, score, done = env.step(walkthrough[-1])
+        assert done
+        assert game_state.won
+
+        env.restore(snapshot)
+        assert env.state == self.game_state
+        assert env.state.score == 0
+        env.close()
+
     def test_score(self):
         assert self.game_state.score == 0
         assert self.game_state.max_score == 3
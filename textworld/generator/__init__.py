@@ -14,10 +14,10 @@ from numpy.random import RandomState
 from textworld import g_rng
 from textworld.utils import maybe_mkdir, str2bool
 from textworld.logic import State
-from textworld.generator.chaining import ChainingOptions, QuestGenerationError
+from textworld.generator.chaining import ChainingOptions, ChainingStats, QuestGenerationError
 from textworld.generator.chaining import sample_quest
 from textworld.generator.world import World
-from textworld.generator.game import Game, Quest, Event, GameOptions
+from textworld.generator.game import Game, Quest, Event, GameOptions, CommandSpace
 from textworld.generator.graph_networks import create_map, create_small_map
 from textworld.generator.text_generation import generate_text_from_grammar
 
@@ -3,17 +3,63 @@
 
 
 import copy
-from collections import Counter
+import time
+import multiprocessing
+import queue as queue_module
+from collections import Counter, defaultdict, deque
 from functools import total_ordering
 from typing import Iterable, Optional, Sequence
 
+import numpy as np
+
 from textworld.generator.data import KnowledgeBase
 from textworld.logic import Action, GameLogic, Proposition, Rule, State, Variable
-from textworld.logic import Placeholder, Signature
+from textworld.logic import ConstraintChecker, Placeholder, Signature
 
 
 class QuestGenerationError(Exception):
-    pass
+    def __init__(self, msg: str, stats: Optional["ChainingStats"] = None):
+        super().__init__(msg)
+        self.stats = stats
+
+
+class ChainingStats:
+    """
+    Statistics about a chaining search.
+
+    Attributes:
+        nodes_expanded: Number of nodes popped from the search stack and expanded.
+        pruned_by_rules: Number of actions rejected by `ChainingOptions.check_action`
+                         or because a new variable couldn't be created.
+        pruned_by_constraints: Number of actions leading to a state violating the constraints.
+        pruned_by_cycles: Number of actions undoing part of the chain.
+        chains: Number of chains generated.
+        restarts: Number of times the search restarted from the root.
+        budget_exhausted: Whether the search stopped because of `max_nodes` or `max_time`.
+        elapsed: Time spent searching (in seconds).
+    """
+
+    def __init__(self):
+        self.nodes_expanded = 0
+        self.pruned_by_rules = 0
+        self.pruned_by_constraints = 0
+        self.pruned_by_cycles = 0
+        self.chains = 0
+        self.restarts = 0
+        self.budget_exhausted = False
+        self.elapsed = 0.
+
+    def copy(self) -> "ChainingStats":
+        return copy.copy(self)
+
+    def __str__(self) -> str:
+        infos = []
+        slots = ["nodes_expanded", "pruned_by_rules", "pruned_by_constraints", "pruned_by_cycles",
+                 "chains", "restarts", "budget_exhausted", "elapsed"]
+        for slot in slots:
+            infos.append("{}: {}".format(slot, getattr(self, slot)))
+
+        return "\n".join(infos)
 
 
 class ChainNode:
@@ -42,12 +88,14 @@ class Chain:
         nodes: The dependency tree of this quest.
         initial_state: The initial state from which the actions start.
         actions: The sequence of actions forming this quest.
+        stats: Statistics of the search at the time this chain was generated.
     """
 
     def __init__(self, initial_state: State, nodes: Sequence[ChainNode]):
         self.initial_state = initial_state
         self.nodes = tuple(nodes)
         self.actions = tuple(node.action for node in nodes)
+        self.stats = None
 
     def __str__(self):
         string = "Chain([\n"
@@ -99,6 +147,23 @@ class ChainingOptions:
             A set of types that may not have new variables created.
         allowed_types:
             A set of types that are allowed to have new variables created.
+        max_nodes:
+            If provided, maximum number of nodes expanded by one search
+            before giving up (or restarting, see `restarts`).
+        max_time:
+            If provided, maximum time (in seconds) spent by one search
+            before giving up (or restarting, see `restarts`).
+        restarts:
+            Number of times the search is restarted from scratch, with a
+            fresh randomization, when it exhausts its budget without finding
+            any chain. Only used when `rng` is provided since restarts would
+            be identical otherwise.
+        lazy_assignments:
+            When `rng` is provided, generate the candidate actions lazily in
+            a pseudo-random order instead of listing, sorting and shuffling
+            all of them at every step. Much faster in worlds with many
+            objects but, for a given seed, yields different quests than
+            the default.
     """
 
     def __init__(self):
@@ -117,6 +182,10 @@ class ChainingOptions:
         self.rules_per_depth = []
         self.restricted_types = frozenset()
         self.allowed_types = None
+        self.max_nodes = None
+        self.max_time = None
+        self.restarts = 0
+        self.lazy_assignments = False
 
     @property
     def logic(self) -> GameLogic:
@@ -245,9 +314,10 @@ class _Chainer:
     Helper class for the chaining implementation.
     """
 
-    def __init__(self, state, options):
+    def __init__(self, state, options, stats=None):
         self.state = state
         self.options = options
+        self.stats = ChainingStats() if stats is None else stats
         self.backward = options.backward
         self.max_depth = options.max_depth
         self.max_length = options.max_length
@@ -256,6 +326,8 @@ class _Chainer:
         self.fixed_mapping = options.fixed_mapping
         self.rng = options.rng
         self.constraints = options.logic.constraints.values()
+        self.checker = ConstraintChecker(self.constraints)
+        self._valid_root = self.checker.is_valid(state)
         self._local_mapping_cache = {}
 
     def root(self) -> _Node:
@@ -271,18 +343,17 @@ class _Chainer:
             return
 
         rules = self.options.get_rules(node.depth)
-
-        assignments = self.all_assignments(node, rules)
-        if self.rng:
-            self.rng.shuffle(assignments)
+        assignments = self.assignments(node, rules)
 
         used = set()
         for partial in assignments:
             action = self.try_instantiate(node.state, partial)
             if not action:
+                self.stats.pruned_by_rules += 1
                 continue
 
             if not self.check_action(node, node.state, action):
+                self.stats.pruned_by_rules += 1
                 continue
 
             state = self.apply(node, action)
@@ -312,19 +383,19 @@ class _Chainer:
         for sibling in parents:
             parent = sibling.dep_parent
             rules = self.options.get_rules(parent.depth)
-            assignments = self.all_assignments(node, rules)
-            if self.rng:
-                self.rng.shuffle(assignments)
+            assignments = self.assignments(node, rules)
 
             for partial in assignments:
                 action = self.try_instantiate(node.state, partial)
                 if not action:
+                    self.stats.pruned_by_rules += 1
                     continue
 
                 if action in sibling.used:
                     continue
 
                 if not self.check_action(parent, node.state, action):
+                    self.stats.pruned_by_rules += 1
                     continue
 
                 state = self.apply(node, action)
@@ -353,14 +424,7 @@ class _Chainer:
         fixed_mapping[self._local_mapping_cache[rule]] = at_p_r.arguments[-1]
         return fixed_mapping
 
-    def all_assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
-        """
-        Compute all possible assignments for instantiating the given rules.
-        """
-
-        state = node.state
-
-        at_p_r = None
+    def _get_at_p_r(self, state: State) -> Optional[Proposition]:
         r = Placeholder("r", "r")
         if r not in self.fixed_mapping:
             # To make chaining more efficient, we fix the mapping of `r` to the current room,
@@ -369,7 +433,31 @@ class _Chainer:
             facts = list(state.facts_with_signature(signature))
             if len(facts) > 0:
                 assert len(facts) == 1, "There should only be one `at(P, r)` proposition."
-                at_p_r = facts[0]
+                return facts[0]
+
+        return None
+
+    def assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
+        """
+        Possible assignments for instantiating the given rules, in the order they should be tried.
+        """
+
+        if self.rng is not None and self.options.lazy_assignments:
+            return self.sample_assignments(node, rules)
+
+        assignments = self.all_assignments(node, rules)
+        if self.rng:
+            self.rng.shuffle(assignments)
+
+        return assignments
+
+    def all_assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
+        """
+        Compute all possible assignments for instantiating the given rules.
+        """
+
+        state = node.state
+        at_p_r = self._get_at_p_r(state)
 
         def allow_partial(ph):
             count = len(state.variables_of_type(ph.type))
@@ -377,8 +465,6 @@ class _Chainer:
 
         assignments = []
         for rule in rules:
-            fixed_mapping = self.fixed_mapping.copy()
-
             if self.backward:
                 rule = rule.inverse()
 
@@ -389,6 +475,40 @@ class _Chainer:
         # Keep everything in a deterministic order
         return sorted(assignments)
 
+    def sample_assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
+        """
+        Lazily generate the possible assignments for instantiating the given rules in a random order.
+
+        Each rule gets its own stream of assignments (in a random order, see
+        `State.all_assignments`). Streams are then randomly interleaved, so
+        only the assignments that are actually tried get computed.
+        """
+
+        state = node.state
+        at_p_r = self._get_at_p_r(state)
+
+        def allow_partial(ph):
+            count = len(state.variables_of_type(ph.type))
+            return self.options.check_new_variable(state, ph.type, count)
+
+        def _stream(rule):
+            if self.backward:
+                rule = rule.inverse()
+
+            fixed_mapping = self.get_fixed_mapping(rule, at_p_r)
+            for mapping in state.all_assignments(rule, fixed_mapping, self.create_variables, allow_partial, self.rng):
+                yield _PartialAction(node, rule, mapping)
+
+        streams = [_stream(rule) for rule in sorted(rules, key=lambda rule: rule.name)]
+        while streams:
+            i = self.rng.randint(len(streams))
+            partial = next(streams[i], None)
+            if partial is None:
+                del streams[i]
+                continue
+
+            yield partial
+
     def try_instantiate(self, state: State, partial: _PartialAction) -> Optional[Action]:
         """
         Try to instantiate a partial action, by creating new variables if
@@ -463,16 +583,19 @@ class _Chainer:
         """Attempt to apply an action to the given state."""
 
         new_state = node.state.copy()
-        for prop in action.preconditions:
-            new_state.add_fact(prop)
+        added = [prop for prop in action.preconditions if not new_state.is_fact(prop)]
+        new_state.add_facts(added)
 
         # Make sure new_state still respects the constraints
-        if not self.check_state(new_state):
+        if not self.check_state(new_state, added):
+            self.stats.pruned_by_constraints += 1
             return None
 
+        added = [prop for prop in action.added if not new_state.is_fact(prop)]
         new_state.apply(action)
 
-        if not self.check_state(new_state):
+        if not self.check_state(new_state, added):
+            self.stats.pruned_by_constraints += 1
             return None
 
         # Detect cycles
@@ -481,23 +604,56 @@ class _Chainer:
         while node.action:
             state.apply(node.action.inverse())
             if new_state == state:
+                self.stats.pruned_by_cycles += 1
                 return None
             node = node.parent
 
         return new_state
 
-    def check_state(self, state: State) -> bool:
-        """Check that a state satisfies the constraints."""
+    def check_state(self, state: State, added: Optional[Iterable[Proposition]] = None) -> bool:
+        """
+        Check that a state satisfies the constraints.
+
+        When `added` is provided, the state is assumed to derive from the
+        (valid) state of a node in the chain by adding those facts, so only
+        the constraints involving them are checked.
+        """
 
-        fail = Proposition("fail", [])
+        if not self._valid_root:
+            # Actions removing the offending facts can lead to valid states, check them in full.
+            return self.checker.is_valid(state)
 
-        constraints = state.all_applicable_actions(self.constraints)
-        for constraint in constraints:
-            copy = state.apply_on_copy(constraint)
-            if copy and copy.is_fact(fail):
-                return False
+        return self.checker.is_valid(state, added)
 
-        return True
+    def search(self, nodes: Iterable[_Node], max_nodes: Optional[int] = None,
+               deadline: Optional[float] = None) -> Iterable[_Node]:
+        """
+        Depth-first search from the given nodes, yielding the ones that form valid chains.
+        """
+
+        stack = list(nodes)
+        while stack:
+            if ((max_nodes is not None and self.stats.nodes_expanded >= max_nodes)
+                    or (deadline is not None and time.time() >= deadline)):
+                self.stats.budget_exhausted = True
+                return
+
+            node = stack.pop()
+            self.stats.nodes_expanded += 1
+
+            no_children = True
+            for child in self.chain(node):
+                stack.append(child)
+                no_children = False
+
+            if no_children or self.options.subquests:
+                for child in self.backtrack(node):
+                    stack.append(child)
+
+                if ((node.length >= self.options.min_length
+                     and node.depth >= self.options.min_depth
+                     and node.breadth >= self.options.min_breadth)):
+                    yield node
 
     def make_chain(self, node):
         """Create an entire Chain object from a node."""
@@ -532,7 +688,8 @@ class _Chainer:
         return Chain(state, chain)
 
 
-def get_chains(state: State, options: ChainingOptions) -> Iterable[Chain]:
+def get_chains(state: State, options: ChainingOptions,
+               stats: Optional[ChainingStats] = None) -> Iterable[Chain]:
     """
     Generates chains of actions (quests) starting from or ending at the given
     state.
@@ -542,30 +699,216 @@ def get_chains(state: State, options: ChainingOptions) -> Iterable[Chain]:
             The initial state for chaining.
         options:
             Options to configure chaining behaviour.
+        stats:
+            If provided, gets updated with statistics about the search.
 
     Returns:
-        All possible quests according to the constraints.
+        All possible quests according to the constraints (or as many as
+        the budget allows, see `options.max_nodes` and `options.max_time`).
     """
 
-    chainer = _Chainer(state, options)
+    stats = ChainingStats() if stats is None else stats
+    restarts = options.restarts if options.rng is not None else 0
+    start = time.time()
 
-    stack = [chainer.root()]
-    while stack:
-        node = stack.pop()
+    found = False
+    for attempt in range(1 + restarts):
+        if attempt > 0:
+            stats.restarts += 1
 
-        no_children = True
-        for child in chainer.chain(node):
-            stack.append(child)
-            no_children = False
+        stats.budget_exhausted = False
+        chainer = _Chainer(state, options, stats)
+        max_nodes = None if options.max_nodes is None else stats.nodes_expanded + options.max_nodes
+        deadline = None if options.max_time is None else time.time() + options.max_time
 
-        if no_children or options.subquests:
-            for child in chainer.backtrack(node):
-                stack.append(child)
+        for node in chainer.search([chainer.root()], max_nodes, deadline):
+            chain = chainer.make_chain(node)
+            found = True
+            stats.chains += 1
+            stats.elapsed = time.time() - start
+            chain.stats = stats.copy()
+            yield chain
+
+        if not stats.budget_exhausted:
+            break  # The whole search space was explored, restarting won't help.
+
+        if found:
+            break  # Restarting would yield some of the chains again.
+
+    stats.elapsed = time.time() - start
+
+
+_WORKER_DATA = None  # (state, options, branches, queue) of the worker processes of `get_chains_parallel`.
+
+
+def _init_worker(state, options, branches, queue):
+    global _WORKER_DATA
+    _WORKER_DATA = (state, options, branches, queue)
+
+
+def _pack_chain(chain: Chain):
+    # States are sent as lists of facts to avoid pickling the game logic for every chain.
+    index = {id(node): i for i, node in enumerate(chain.nodes)}
+    nodes = [(node.action, node.depth, node.breadth, index.get(id(node.parent))) for node in chain.nodes]
+    return list(chain.initial_state.facts), nodes
+
+
+def _unpack_chain(logic: GameLogic, data) -> Chain:
+    facts, packed_nodes = data
+    nodes = [ChainNode(action, depth, breadth, None) for action, depth, breadth, _ in packed_nodes]
+    for node, (_, _, _, parent) in zip(nodes, packed_nodes):
+        node.parent = None if parent is None else nodes[parent]
+
+    return Chain(State(logic, facts), nodes)
+
+
+def _search_branch(state, options, branch, seed):
+    """
+    Generates the packed chains of a branch as they are found, followed by `(None, stats)`.
+    """
+    if seed is not None:
+        options = options.copy()
+        options.rng = np.random.RandomState(seed)
+
+    stats = ChainingStats()
+    chainer = _Chainer(state, options, stats)
+    deadline = None if options.max_time is None else time.time() + options.max_time
+    for node in chainer.search([branch], options.max_nodes, deadline):
+        yield _pack_chain(chainer.make_chain(node)), None
+
+    yield None, stats
+
+
+def _explore_branch(args):
+    index, seed = args
+    state, options, branches, queue = _WORKER_DATA
+    for data, stats in _search_branch(state, options, branches[index], seed):
+        queue.put((index, data, stats))  # Sent as soon as found.
+
+
+def _receive_branches(pool, queue, tasks):
+    """
+    Generates the `(index, data, stats)` messages sent by the workers exploring `tasks`.
+    """
+    results = pool.map_async(_explore_branch, tasks, chunksize=1)  # Branches start in order.
+    remaining = len(tasks)
+    while remaining > 0:
+        try:
+            index, data, stats = queue.get(timeout=0.1)
+        except queue_module.Empty:
+            if results.ready() and not results.successful():
+                results.get()  # Raises the worker's exception.
+
+            continue
+
+        remaining -= stats is not None
+        yield index, data, stats
 
-            if ((node.length >= options.min_length
-                 and node.depth >= options.min_depth
-                 and node.breadth >= options.min_breadth)):
-                yield chainer.make_chain(node)
+
+def get_chains_parallel(state: State, options: ChainingOptions, nb_processes: Optional[int] = None,
+                        stats: Optional[ChainingStats] = None) -> Iterable[Chain]:
+    """
+    Generates chains of actions (quests) using multiple processes.
+
+    The search is split at the root: each of its children (i.e. the
+    possible first actions) is explored by a different task of a
+    process pool. Chains are deduplicated using their sequence of actions
+    and streamed back in an order that only depends on `options.rng`,
+    not on the number of processes: the chains of the first branch still
+    being explored are yielded as soon as a worker finds them, those of
+    the following branches are held back until it is done.
+
+    Args:
+        state:
+            The initial state for chaining.
+        options:
+            Options to configure chaining behaviour. The budgets
+            (`max_nodes` and `max_time`) apply to each branch and
+            restarts are ignored.
+        nb_processes:
+            Number of worker processes. Default: number of CPUs.
+            Use 1 to explore the branches in the current process.
+        stats:
+            If provided, gets updated with statistics about the search.
+
+    Returns:
+        All possible quests according to the constraints.
+    """
+
+    stats = ChainingStats() if stats is None else stats
+    start = time.time()
+
+    chainer = _Chainer(state, options, stats)
+    root = chainer.root()
+    stats.nodes_expanded += 1
+    branches = list(chainer.chain(root))[::-1]  # Same order as the stack used by `get_chains`.
+
+    if not branches or options.subquests:
+        if ((root.length >= options.min_length
+             and root.depth >= options.min_depth
+             and root.breadth >= options.min_breadth)):
+            chain = chainer.make_chain(root)
+            stats.chains += 1
+            chain.stats = stats.copy()
+            yield chain
+
+    # Each branch gets its own random generator to keep the results reproducible.
+    seeds = [None] * len(branches)
+    if options.rng is not None:
+        seeds = options.rng.randint(np.iinfo(np.int32).max, size=len(branches)).tolist()
+
+    tasks = list(zip(range(len(branches)), seeds))
+    pool = None
+    if nb_processes == 1:
+        messages = ((index, data, branch_stats) for index, seed in tasks
+                    for data, branch_stats in _search_branch(state, options, branches[index], seed))
+    else:
+        # Fork (when available) avoids pickling the state, options and branches.
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+        queue = ctx.Queue()
+        pool = ctx.Pool(nb_processes, initializer=_init_worker, initargs=(state, options, branches, queue))
+        messages = _receive_branches(pool, queue, tasks)
+
+    def _merge(branch_stats):
+        stats.nodes_expanded += branch_stats.nodes_expanded
+        stats.pruned_by_rules += branch_stats.pruned_by_rules
+        stats.pruned_by_constraints += branch_stats.pruned_by_constraints
+        stats.pruned_by_cycles += branch_stats.pruned_by_cycles
+        stats.budget_exhausted |= branch_stats.budget_exhausted
+
+    seen = set()
+    head = 0  # First branch still being explored, its chains are yielded right away.
+    pending = defaultdict(deque)  # Messages of the following branches, held back to keep the order.
+    try:
+        for message in messages:
+            pending[message[0]].append(message)
+            while head in pending:
+                index, data, branch_stats = pending[head].popleft()
+                if not pending[head]:
+                    del pending[head]
+
+                if branch_stats is not None:
+                    _merge(branch_stats)
+                    head += 1  # Branch done.
+                    continue
+
+                chain = _unpack_chain(options.logic, data)
+                key = chain.actions
+                if key in seen:
+                    continue
+
+                seen.add(key)
+                stats.chains += 1
+                stats.elapsed = time.time() - start
+                chain.stats = stats.copy()
+                yield chain
+    finally:
+        if pool is not None:
+            pool.terminate()
+            queue.close()
+
+        stats.elapsed = time.time() - start
 
 
 def sample_quest(state: State, options: ChainingOptions) -> Optional[Chain]:
@@ -581,14 +924,19 @@ def sample_quest(state: State, options: ChainingOptions) -> Optional[Chain]:
             a random quest.
 
     Returns:
-        A single possible quest.
+        A single possible quest. Its `stats` attribute describes the search.
 
     Raises:
-        QuestGenerationError: No quest could be generated given the provided chaining options.
+        QuestGenerationError: No quest could be generated given the provided chaining options
+                              (or within the provided budget).
     """
 
-    for chain in get_chains(state, options):
+    stats = ChainingStats()
+    for chain in get_chains(state, options, stats):
         return chain
 
     msg = ("No quest can be generated with the provided options:\n\n{}\n".format(options))
-    raise QuestGenerationError(msg)
+    if stats.budget_exhausted:
+        msg = ("No quest could be generated within the provided budget:\n\n{}\n\n{}\n".format(options, stats))
+
+    raise QuestGenerationError(msg, stats)
@@ -11,7 +11,7 @@ from typing import Optional, Mapping
 
 from textworld.logic import GameLogic
 from textworld.generator.vtypes import VariableType, VariableTypeTree
-from textworld.utils import maybe_mkdir, RegexDict
+from textworld.utils import maybe_mkdir, RegexDict, TranspositionTable
 
 BUILTIN_DATA_PATH = os.path.dirname(__file__)
 LOGIC_DATA_PATH = pjoin(BUILTIN_DATA_PATH, 'logic')
@@ -106,14 +106,28 @@ class KnowledgeBase:
         self.inform7_variables_description = {i7type.name: i7type.definition for i7type in self.logic.inform7.types.values()}
         self.inform7_addons_code = self.logic.inform7.code
 
+    def __setattr__(self, name, value):
+        if self.__dict__.get("_read_only"):
+            msg = ("Shared KnowledgeBase objects are read-only,"
+                   " use `KnowledgeBase.load(..., use_cache=False)` to get one that can be modified.")
+            raise AttributeError(msg)
+
+        super().__setattr__(name, value)
+
     @classmethod
-    def default(cls):
-        return KB
+    def default(cls) -> "KnowledgeBase":
+        """ Returns the default knowledge base, loading it on first use. """
+        global _DEFAULT_KB
+        if _DEFAULT_KB is None:
+            _DEFAULT_KB = KnowledgeBase.load()
+
+        return _DEFAULT_KB
 
     @classmethod
     def load(cls,
              target_dir: Optional[str] = None,
-             logic_path: Optional[str] = None, grammar_path: Optional[str] = None) -> "KnowledgeBase":
+             logic_path: Optional[str] = None, grammar_path: Optional[str] = None,
+             use_cache: bool = True) -> "KnowledgeBase":
         """ Build a KnowledgeBase from several files (logic and text grammar).
 
         Args:
@@ -121,9 +135,16 @@ class KnowledgeBase:
                         If provided, both `logic_path` and `grammar_path` are ignored.
             logic_path: Folder containing `*.twl` files that describe the logic of a game.
             grammar_path: Folder containing `*.twg` files that describe the grammar used for text generation.
+            use_cache: If True, return the same read-only KnowledgeBase object as previous
+                       calls made with the same folders, unless their `*.twl` files have
+                       changed since (see :py:meth:`KnowledgeBase.clear_cache`).
 
         Returns:
             KnowledgeBase object.
+
+        Notes:
+            Attributes of cached KnowledgeBase objects can't be reassigned
+            and what they refer to (e.g. `logic` or `types`) must not be modified.
         """
         if target_dir:
             logic_path = pjoin(target_dir, "logic")
@@ -134,20 +155,40 @@ class KnowledgeBase:
             if not os.path.isdir(logic_path):
                 logic_path = LOGIC_DATA_PATH  # Default to built-in data.
 
-        # Load knowledge base related files.
-        paths = glob.glob(pjoin(logic_path, "*.twl"))
-        logic = GameLogic.load(paths)
-
         if grammar_path is None:
             grammar_path = pjoin(".", "textworld_data", "text_grammars")  # Check within working dir.
             if not os.path.isdir(grammar_path):
                 grammar_path = TEXT_GRAMMARS_PATH  # Default to built-in data.
 
+        paths = glob.glob(pjoin(logic_path, "*.twl"))
+
+        # Files are identified by their resolved path, size and modification time.
+        stats = [os.stat(path) for path in paths]
+        key = (os.path.realpath(logic_path), os.path.realpath(grammar_path),
+               tuple((os.path.realpath(path), stat.st_mtime_ns, stat.st_size) for path, stat in zip(paths, stats)))
+        if use_cache and key in _KB_CACHE:
+            return _KB_CACHE[key]
+
+        # Load knowledge base related files.
+        logic = GameLogic.load(paths)
+
         # Load text generation related files.
         kb = cls(logic, grammar_path)
         kb.logic_path = logic_path
+
+        if use_cache:
+            kb._read_only = True
+            _KB_CACHE[key] = kb
+
         return kb
 
+    @classmethod
+    def clear_cache(cls) -> None:
+        """ Forgets the KnowledgeBase objects cached by :py:meth:`KnowledgeBase.load`. """
+        global _DEFAULT_KB
+        _DEFAULT_KB = None
+        _KB_CACHE.clear()
+
     def get_reverse_action(self, action):
         r_name = self.logic.reverse_rules.get(action.name)
         if r_name:
@@ -177,5 +218,13 @@ class KnowledgeBase:
         return "\n".join(infos)
 
 
-# On module load.
-KB = KnowledgeBase.load()
+_DEFAULT_KB = None  # Loaded on first use, see `KnowledgeBase.default()`.
+_KB_CACHE = TranspositionTable(16)  # Most recently used, see `KnowledgeBase.load()`.
+
+
+def __getattr__(name):
+    # Keep `from textworld.generator.data import KB` working without loading it on module import.
+    if name == "KB":
+        return KnowledgeBase.default()
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -4,12 +4,14 @@
 
 import re
 import copy
+import bisect
 import json
 import textwrap
 
-from typing import List, Dict, Optional, Mapping, Any, Iterable, Union, Tuple
+from typing import List, Dict, FrozenSet, Optional, Mapping, Any, Iterable, Union, Tuple, TYPE_CHECKING
 from collections import OrderedDict, defaultdict
-from functools import cached_property, partial
+from collections.abc import Sequence
+from functools import cached_property, lru_cache, partial
 from itertools import product
 
 import numpy as np
@@ -20,7 +22,7 @@ from textworld.utils import encode_seeds
 from textworld.generator.data import KnowledgeBase
 from textworld.generator.text_grammar import Grammar, GrammarOptions
 from textworld.generator.world import World
-from textworld.logic import Action, Proposition, State
+from textworld.logic import Action, Interner, Proposition, Signature, State
 from textworld.generator.graph_networks import DIRECTIONS
 
 from textworld.generator.chaining import ChainingOptions
@@ -28,6 +30,9 @@ from textworld.generator.chaining import ChainingOptions
 from textworld.generator.dependency_tree import DependencyTree
 from textworld.generator.dependency_tree import DependencyTreeElement
 
+if TYPE_CHECKING:
+    from textworld.generator.planner import Planner  # Circular import.
+
 
 class UnderspecifiedEventError(NameError):
     def __init__(self):
@@ -383,6 +388,165 @@ class EntityInfo:
         return {slot: getattr(self, slot) for slot in self.__slots__}
 
 
+class CommandSpace(Sequence):
+    """ Compact, read-only, sequence of commands.
+
+    Commands are stored as templates (e.g. "take {} from {}") along with,
+    for each of their slots, the indices of the names that can fill it.
+    Commands are only formatted when accessed, i.e. by iterating over,
+    or indexing, the sequence. Like a sorted list, they are in alphabetical
+    order: the first access formats all of them once to find it, only
+    their positions are kept. Adding a list to it gives a list.
+
+    Example:
+
+        >>> commands = CommandSpace([("take {}", [["key", "apple"]])])
+        >>> len(commands), commands[1], "take apple" in commands
+        (2, 'take key', True)
+        >>> list(commands) + ["look"]  # Materialize all the commands.
+        ['take apple', 'take key', 'look']
+    """
+
+    def __init__(self, templates: Iterable[Tuple[str, Iterable[Iterable[str]]]]) -> None:
+        """
+        Args:
+            templates: Pairs of template, with `{}` as slots, and
+                       the names that can fill each of its slots.
+        """
+        self._templates = []
+        self._slots = []  # Indices of the names, one array per slot.
+        name2index = {}
+        for template, slots in templates:
+            self._templates.append(template)
+            self._slots.append(tuple(np.array([name2index.setdefault(name, len(name2index)) for name in names],
+                                              dtype=np.int32)
+                                     for names in slots))
+
+        self._names = sorted(name2index, key=name2index.get)
+        self._sizes = [int(np.prod([len(slot) for slot in slots])) for slots in self._slots]
+        self._offsets = np.cumsum([0] + self._sizes)
+        self._regexes = None
+        self._order = None  # Positions, by template then slots, of the commands in alphabetical order.
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def _iter_unsorted(self) -> Iterable[str]:
+        for template, slots in zip(self._templates, self._slots):
+            names = [[self._names[i] for i in slot] for slot in slots]
+            for mapping in product(*names):
+                yield template.format(*mapping)
+
+    def _get_order(self) -> np.ndarray:
+        if self._order is None:
+            commands = list(self._iter_unsorted())
+            self._order = np.array(sorted(range(len(commands)), key=commands.__getitem__), dtype=np.int64)
+
+        return self._order
+
+    def __iter__(self) -> Iterable[str]:
+        for index in self._get_order():
+            yield self._get_unsorted(int(index))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("CommandSpace index out of range")
+
+        return self._get_unsorted(int(self._get_order()[index]))
+
+    def _get_unsorted(self, index: int) -> str:
+        k = int(np.searchsorted(self._offsets, index, side="right")) - 1
+        index -= self._offsets[k]
+        mapping = []
+        for slot in reversed(self._slots[k]):  # Last slot varies the fastest.
+            index, i = divmod(index, len(slot))
+            mapping.append(self._names[slot[i]])
+
+        return self._templates[k].format(*reversed(mapping))
+
+    def _match(self, command: str) -> Iterable[Tuple[int, Tuple[str, ...]]]:
+        if self._regexes is None:
+            self._regexes = []
+            for template, slots in zip(self._templates, self._slots):
+                names = ["({})".format("|".join(re.escape(self._names[i]) for i in slot)) for slot in slots]
+                parts = [re.escape(part) for part in template.split("{}")]
+                self._regexes.append(re.compile("".join(part + name for part, name in zip(parts, names)) + parts[-1]))
+
+        for k, regex in enumerate(self._regexes):
+            if self._sizes[k] == 0:
+                continue  # A slot can't be filled, the template has no commands.
+
+            match = regex.fullmatch(command)
+            if match:
+                yield k, match.groups()
+
+    def __contains__(self, command: Any) -> bool:
+        return isinstance(command, str) and any(True for _ in self._match(command))
+
+    def index(self, command: str) -> int:
+        if command in self:
+            index = bisect.bisect_left(self, command)  # Commands are sorted.
+            if self[index] == command:
+                return index
+
+        raise ValueError("{!r} is not in CommandSpace".format(command))
+
+    def count(self, command: str) -> int:
+        # A name can appear more than once in a slot.
+        return sum(int(np.prod([sum(1 for j in slot if self._names[j] == name)
+                                for slot, name in zip(self._slots[k], names)]))
+                   for k, names in self._match(command))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, CommandSpace) and self._templates == other._templates:
+            if ([[list(map(self._names.__getitem__, slot)) for slot in slots] for slots in self._slots]
+                    == [[list(map(other._names.__getitem__, slot)) for slot in slots] for slots in other._slots]):
+                return True  # Same commands, no need to format them.
+
+        if isinstance(other, (list, tuple, CommandSpace)):
+            return len(self) == len(other) and list(self) == list(other)
+
+        return NotImplemented
+
+    __hash__ = None
+
+    def __add__(self, other: Any) -> List[str]:
+        if isinstance(other, (list, CommandSpace)):
+            return list(self) + list(other)
+
+        return NotImplemented
+
+    def __radd__(self, other: Any) -> List[str]:
+        if isinstance(other, list):
+            return other + list(self)
+
+        return NotImplemented
+
+    def serialize(self) -> List[str]:
+        return list(self)
+
+    def __getstate__(self) -> Mapping:
+        state = dict(self.__dict__)
+        state["_regexes"] = None  # Rebuilt on demand.
+        state["_order"] = None
+        return state
+
+    def __repr__(self) -> str:
+        return "CommandSpace({} commands, {} templates)".format(len(self), len(self._templates))
+
+
+@lru_cache(maxsize=128)
+def _get_command_space(templates: Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...]) -> CommandSpace:
+    # Shared by all the games with the same templates and objects' names.
+    return CommandSpace(templates)
+
+
 class Game:
     """ Game representation in TextWorld.
 
@@ -403,6 +567,9 @@ class Game:
         self.world = world
         self.quests = tuple(quests)
         self.metadata = {}
+        #: Planner: When set, used to find the shortest `walkthrough`
+        #:          (see :py:class:`textworld.generator.planner.Planner`).
+        self.planner = None
         self._objective = None
         self._infos = self._build_infos()
         self.kb = world.kb
@@ -428,6 +595,7 @@ class Game:
         game._infos = dict(self.infos)
         game._objective = self._objective
         game.metadata = dict(self.metadata)
+        game.planner = self.planner
         return game
 
     def change_grammar(self, grammar: Grammar) -> None:
@@ -580,17 +748,23 @@ class Game:
         return sorted(set(cmd.split()[0] for cmd in self.command_templates))
 
     @cached_property
-    def possible_commands(self) -> List[str]:
-        """ All possible commands when ignoring their arguments' type. """
-        action_templates = set(re.sub(r"{.*?}", "{}", a) for a in self.command_templates)
-        possible_commands = [template.format(*mapping)
-                             for template in action_templates
-                             for mapping in product(self.objects_names, repeat=template.count("{}"))]
-        return sorted(possible_commands)
+    def possible_commands(self) -> CommandSpace:
+        """ All possible commands when ignoring their arguments' type.
+
+        The commands are generated on demand, see :py:class:`CommandSpace`.
+        """
+        names = tuple(sorted(self.objects_names))
+        action_templates = sorted(set(re.sub(r"{.*?}", "{}", a) for a in self.command_templates))
+        # Skip templates that cannot be filled with the objects of this game.
+        return _get_command_space(tuple((template, (names,) * template.count("{}"))
+                                        for template in action_templates if names or "{}" not in template))
 
     @cached_property
-    def possible_admissible_commands(self) -> List[str]:
-        """ Superset of the admissible commands irrespective of the current state. """
+    def possible_admissible_commands(self) -> CommandSpace:
+        """ Superset of the admissible commands irrespective of the current state.
+
+        The commands are generated on demand, see :py:class:`CommandSpace`.
+        """
         type2names = defaultdict(list)
         for name, type in self.objects_names_and_types:
             type2names[f'{{{type}}}'].append(name)
@@ -601,11 +775,11 @@ class Game:
                                                for arg in re.findall(r"{.*?}", template)])]
 
         templates = sorted(set(templates))
-        commands = [re.sub(r"{.*?}", "{}", template).format(*mappings)
-                    for template in templates
-                    for mappings in product(*[type2names[arg] for arg in re.findall(r"{.*?}", template)])]
-
-        return sorted(commands)
+        templates = [(re.sub(r"{.*?}", "{}", template),
+                      tuple(tuple(sorted(type2names[arg])) for arg in re.findall(r"{.*?}", template)))
+                     for template in templates]
+        # Skip templates that cannot be filled with the objects of this game.
+        return _get_command_space(tuple((template, slots) for template, slots in templates if all(slots)))
 
     @property
     def objective(self) -> str:
@@ -624,15 +798,16 @@ class Game:
     @property
     def walkthrough(self) -> Optional[List[str]]:
         walkthrough = self.metadata.get("walkthrough")
-        if walkthrough:
+        if walkthrough and self.planner is None:
             return walkthrough
 
         # Check if we can derive a walkthrough from the quests.
-        policy = GameProgression(self).winning_policy
+        policy = GameProgression(self, planner=self.planner).winning_policy
         if policy:
             mapping = {k: info.name for k, info in self._infos.items()}
             walkthrough = [a.format_command(mapping) for a in policy]
-            self.metadata["walkthrough"] = walkthrough
+            if self.planner is None:
+                self.metadata["walkthrough"] = walkthrough
 
         return walkthrough
 
@@ -758,11 +933,21 @@ class ActionDependencyTree(DependencyTree):
         return tree
 
 
+@lru_cache(maxsize=1024)
+def _changed_signatures(action: Action) -> FrozenSet[Signature]:
+    """ Signatures of the facts added or removed by an action (or its reverse). """
+    return frozenset(prop.signature for prop in action.added | action.removed)
+
+
 class EventProgression:
     """ EventProgression monitors a particular event.
 
     Internally, the event is represented as a dependency tree of
     relevant actions to be performed.
+
+    The event is indexed by the signatures of the facts its condition
+    and the actions of its tree depend on, so actions not affecting
+    those facts are skipped by `update`.
     """
 
     def __init__(self, event: Event, kb: KnowledgeBase) -> None:
@@ -788,13 +973,70 @@ class EventProgression:
 
             self._policy = event.actions + (event.condition,)
 
+        self._update_signatures()
+        self._stale = True  # Whether the event needs checking even if the facts it depends on are unchanged.
+
+    def _update_signatures(self) -> None:
+        facts = set(self.event.condition.preconditions)
+        for node in self._tree:
+            facts.update(node.element.action.all_propositions)
+
+        self._signatures = frozenset(prop.signature for prop in facts)
+
     def copy(self) -> "EventProgression":
         """ Return a soft copy. """
-        ep = EventProgression(self.event, self._kb)
+        # Skip `__init__`, the dependency tree would be rebuilt only to be replaced.
+        ep = EventProgression.__new__(EventProgression)
+        ep._kb = self._kb
+        ep.event = self.event
         ep._triggered = self._triggered
         ep._untriggerable = self._untriggerable
         ep._policy = self._policy
         ep._tree = self._tree.copy()
+        ep._signatures = self._signatures
+        ep._stale = self._stale
+        return ep
+
+    def encode(self, interner: Interner) -> Tuple:
+        """ Compact representation of this event progression (see `decode`). """
+        def _encode_node(node):
+            return (interner.encode_action(node.element.action), tuple(map(_encode_node, node.children)))
+
+        return (self._triggered, self._untriggerable, tuple(map(interner.encode_action, self._policy)),
+                tuple(map(_encode_node, self._tree.roots)))
+
+    @classmethod
+    def decode(cls, data: Tuple, event: Event, kb: KnowledgeBase, interner: Interner) -> "EventProgression":
+        """ Rebuild an event progression from its compact representation.
+
+        Args:
+            data: Output of `EventProgression.encode`.
+            event: The event being monitored.
+            kb: Knowledge base of the game.
+            interner: Holding the actions referred to by `data`.
+        """
+        def _decode_node(data, parent=None):
+            action_id, children = data
+            node = DependencyTree._Node(ActionDependencyTreeElement(interner.decode_action(action_id)))
+            if parent is not None:
+                node.parent = parent
+                node.element.parent = parent.element
+
+            node.children = [_decode_node(child, node) for child in children]
+            return node
+
+        triggered, untriggerable, policy, roots = data
+        ep = cls.__new__(cls)
+        ep._kb = kb or KnowledgeBase.default()
+        ep.event = event
+        ep._triggered = triggered
+        ep._untriggerable = untriggerable
+        ep._policy = tuple(map(interner.decode_action, policy))
+        ep._tree = ActionDependencyTree(kb=ep._kb, element_type=ActionDependencyTreeElement)
+        ep._tree.roots = [_decode_node(root) for root in roots]
+        ep._tree._update()
+        ep._update_signatures()
+        ep._stale = True
         return ep
 
     @property
@@ -831,12 +1073,19 @@ class EventProgression:
         if self.done:
             return  # Nothing to do, the quest is already done.
 
+        if (action is not None and state is not None and not self._stale
+                and self._signatures.isdisjoint(_changed_signatures(action))
+                and action not in self._tree.leaves_values):
+            return  # The action didn't change any of the facts this event depends on.
+
         if state is not None:
             # Check if event is triggered.
             self._triggered = self.event.is_triggering(state)
 
             # Try compressing the winning policy given the new game state.
+            self._stale = False
             if self.compress_policy(state):
+                self._update_signatures()
                 return  # A shorter winning policy has been found.
 
         if action is not None and not self._tree.empty:
@@ -849,6 +1098,11 @@ class EventProgression:
                 # Rebuild policy.
                 self._policy = tuple(self._tree.flatten())
 
+            if changed:
+                # The new policy hasn't been compressed yet.
+                self._update_signatures()
+                self._stale = True
+
     def compress_policy(self, state: State) -> bool:
         """ Compress the policy given a game state.
 
@@ -903,12 +1157,41 @@ class QuestProgression:
 
     def copy(self) -> "QuestProgression":
         """ Return a soft copy. """
-        qp = QuestProgression(self.quest, self.kb)
+        qp = QuestProgression.__new__(QuestProgression)
+        qp.quest = self.quest
+        qp.kb = self.kb
         qp.win_events = [event_progression.copy() for event_progression in self.win_events]
         qp.fail_events = [event_progression.copy() for event_progression in self.fail_events]
         qp.nb_completions = self.nb_completions
         return qp
 
+    def encode(self, interner: Interner) -> Tuple:
+        """ Compact representation of this quest progression (see `decode`). """
+        return (self.nb_completions,
+                tuple(event_progression.encode(interner) for event_progression in self.win_events),
+                tuple(event_progression.encode(interner) for event_progression in self.fail_events))
+
+    @classmethod
+    def decode(cls, data: Tuple, quest: Quest, kb: KnowledgeBase, interner: Interner) -> "QuestProgression":
+        """ Rebuild a quest progression from its compact representation.
+
+        Args:
+            data: Output of `QuestProgression.encode`.
+            quest: The quest to keep track of its completion.
+            kb: Knowledge base of the game.
+            interner: Holding the actions referred to by `data`.
+        """
+        nb_completions, win_events, fail_events = data
+        qp = cls.__new__(cls)
+        qp.quest = quest
+        qp.kb = kb
+        qp.nb_completions = nb_completions
+        qp.win_events = [EventProgression.decode(d, event, kb, interner)
+                         for d, event in zip(win_events, quest.win_events)]
+        qp.fail_events = [EventProgression.decode(d, event, kb, interner)
+                          for d, event in zip(fail_events, quest.fail_events)]
+        return qp
+
     @property
     def _tree(self) -> Optional[List[ActionDependencyTree]]:
         events = [event for event in self.win_events if len(event.triggering_policy) > 0]
@@ -975,6 +1258,7 @@ class QuestProgression:
             if self.quest.repeatable:
                 for event in self.win_events:
                     event._triggered = False
+                    event._stale = True
 
                 assert not self.completed  # TODO make a unit test for this.
 
@@ -986,13 +1270,17 @@ class GameProgression:
     of Action that need to be applied in order to complete the game.
     """
 
-    def __init__(self, game: Game, track_quests: bool = True) -> None:
+    def __init__(self, game: Game, track_quests: bool = True, planner: Optional["Planner"] = None) -> None:
         """
         Args:
             game: The game for which to track progression.
             track_quests: whether quest progressions are being tracked.
+            planner: When provided, used to find the winning policies instead of
+                     merging the quests' dependency trees
+                     (see :py:class:`textworld.generator.planner.Planner`).
         """
         self.game = game
+        self.planner = planner
         self.state = game.world.state.copy()
         self._valid_actions = list(self.state.all_applicable_actions(self.game.kb.rules.values(),
                                                                      self.game.kb.types.constants_mapping))
@@ -1005,12 +1293,40 @@ class GameProgression:
 
     def copy(self) -> "GameProgression":
         """ Return a soft copy. """
-        gp = GameProgression(self.game, track_quests=False)
+        # Skip `__init__`, the valid actions of the initial state would be recomputed for nothing.
+        gp = GameProgression.__new__(GameProgression)
+        gp.game = self.game
         gp.state = self.state.copy()
         gp._valid_actions = self._valid_actions
-        if self.tracking_quests:
-            gp.quest_progressions = [quest_progression.copy() for quest_progression in self.quest_progressions]
+        gp.quest_progressions = [quest_progression.copy() for quest_progression in self.quest_progressions]
+        gp.planner = self.planner
+        return gp
 
+    def encode(self, interner: Interner) -> Tuple:
+        """ Compact representation of this game progression, the game itself is not included (see `decode`). """
+        return (tuple(map(interner.encode_proposition, self.state.facts)),
+                tuple(quest_progression.encode(interner) for quest_progression in self.quest_progressions))
+
+    @classmethod
+    def decode(cls, data: Tuple, game: Game, interner: Interner,
+               planner: Optional["Planner"] = None) -> "GameProgression":
+        """ Rebuild a game progression from its compact representation.
+
+        Args:
+            data: Output of `GameProgression.encode`.
+            game: The game for which progression is tracked.
+            interner: Holding the facts and actions referred to by `data`.
+            planner: Used to find the winning policies (see `GameProgression`).
+        """
+        facts, quest_progressions = data
+        gp = cls.__new__(cls)
+        gp.game = game
+        gp.planner = planner
+        gp.state = State(game.kb.logic, map(interner.decode_proposition, facts))
+        gp._valid_actions = list(gp.state.all_applicable_actions(game.kb.rules.values(),
+                                                                 game.kb.types.constants_mapping))
+        gp.quest_progressions = [QuestProgression.decode(d, quest, game.kb, interner)
+                                 for d, quest in zip(quest_progressions, game.quests)]
         return gp
 
     @property
@@ -1063,6 +1379,15 @@ class GameProgression:
         if self.done:
             return None
 
+        if self.planner is not None:
+            quests = [quest.quest for quest in self.quest_progressions
+                      if not quest.done and not quest.quest.optional]
+            policy = self.planner.plan(self.state, quests, self.game.kb)
+            if policy is not None:
+                return policy
+
+            # No plan found within the planner's budget, fall back on the quest trees.
+
         # Greedily build a new winning policy by merging all quest trees.
         trees = [quest._tree for quest in self.quest_progressions
                  if quest.completable and not quest.done and not quest.quest.optional]
@@ -4,9 +4,12 @@
 
 import itertools
 import numpy as np
-import networkx as nx
 from collections import OrderedDict
 
+from textworld.utils import lazy_import
+
+nx = lazy_import("networkx")
+
 
 DIRECTIONS = ["north", "south", "east", "west"]
 
@@ -110,7 +113,7 @@ def get_path(G, room1, room2):
     return list(zip(sp, sp[1:]))
 
 
-def plot_graph(G: nx.Graph, show: bool = True) -> None:
+def plot_graph(G: "nx.Graph", show: bool = True) -> None:
     """
     Plot TextWorld's graph representation of a world.
     """
@@ -7,40 +7,28 @@ from collections import OrderedDict
 
 from typing import List, Iterable, Union, Optional
 
-import networkx as nx
 import numpy as np
 
 import textworld
 
 from textworld.core import EnvInfos
-from textworld.utils import make_temp_directory
+from textworld.utils import make_temp_directory, lazy_import
 from textworld.generator import Grammar
 from textworld.generator.graph_networks import direction
 from textworld.generator.data import KnowledgeBase
 from textworld.generator.vtypes import get_new
-from textworld.logic import State, Variable, Proposition, Action
+from textworld.logic import State, Variable, Proposition, Action, ConstraintChecker
 from textworld.generator.game import GameOptions
 from textworld.generator.game import Game, World, Quest, Event, EntityInfo
 from textworld.generator.graph_networks import DIRECTIONS
 from textworld.envs.wrappers import Recorder
 
+nx = lazy_import("networkx")
+
 
 def get_failing_constraints(state, kb: Optional[KnowledgeBase] = None):
     kb = kb or KnowledgeBase.default()
-    fail = Proposition("fail", [])
-
-    failed_constraints = []
-    constraints = state.all_applicable_actions(kb.constraints.values())
-    for constraint in constraints:
-        if state.is_applicable(constraint):
-            # Optimistically delay copying the state
-            copy = state.copy()
-            copy.apply(constraint)
-
-            if copy.is_fact(fail):
-                failed_constraints.append(constraint)
-
-    return failed_constraints
+    return list(ConstraintChecker(kb.constraints.values()).failing_constraints(state))
 
 
 class MissingPlayerError(ValueError):
@@ -408,6 +396,23 @@ class GameMaker:
         """
         entities[0].add_fact(name, *entities)
 
+    def query(self, pattern: str, *entities: Optional[WorldEntity]) -> List[Proposition]:
+        """ Finds the facts of the current game state matching a pattern.
+
+        Args:
+            pattern: Name of a predicate (followed by `entities`) or a pattern
+                     like `"in(?x, c_0)"` (see :py:meth:`textworld.logic.State.query`).
+            *entities: The entities (or None to match anything) the facts' arguments must match.
+
+        Returns:
+            The matching facts.
+
+        Example:
+            >>> M.query("in", None, chest)  # Facts about what is in the chest.
+        """
+        arguments = [None if entity is None else entity.var for entity in entities]
+        return self.state.query(pattern, *arguments)
+
     def new_door(self, path: WorldPath, name: Optional[str] = None,
                  desc: Optional[str] = None) -> WorldEntity:
         """ Creates a new door and add it to the path.
@@ -859,7 +864,7 @@ class GameMaker:
         game = self.build(validate=False)
         return textworld.render.visualize(game, interactive=interactive)
 
-    def import_graph(self, G: nx.Graph) -> List[WorldRoom]:
+    def import_graph(self, G: "nx.Graph") -> List[WorldRoom]:
         """ Convert Graph object to a list of `Proposition`.
 
         Args:
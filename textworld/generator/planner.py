@@ -0,0 +1,303 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import heapq
+import itertools
+from collections import defaultdict
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+from textworld.utils import TranspositionTable
+from textworld.generator.data import KnowledgeBase
+from textworld.generator.game import Quest
+from textworld.logic import Action, Proposition, State
+
+
+class _Relaxation:
+    """
+    Delete relaxation of a planning problem.
+
+    The actions that are applicable once all the facts reachable from a
+    state, ignoring the facts removed by actions, have been added to it.
+    They are a superset of the actions applicable in any state reachable
+    from that state.
+    """
+
+    def __init__(self, state: State, kb: KnowledgeBase):
+        relaxed = state.copy()
+        actions = {}  # Used as an ordered set.
+        while True:
+            new_actions = [action for action in relaxed.all_applicable_actions(kb.rules.values(),
+                                                                               kb.types.constants_mapping)
+                           if action not in actions]
+            actions.update(dict.fromkeys(new_actions))
+            added = {prop for action in new_actions for prop in action.added if not relaxed.is_fact(prop)}
+            if not added:
+                break
+
+            relaxed.add_facts(added)
+
+        self.facts = frozenset(relaxed.facts)
+        self.actions = list(actions)
+        self._added = [tuple(action.added) for action in self.actions]
+        self._nb_preconditions = []
+        self._consumers = defaultdict(list)  # Fact -> indices of the actions requiring it.
+        for i, action in enumerate(self.actions):
+            preconditions = set(action.preconditions)
+            self._nb_preconditions.append(len(preconditions))
+            for prop in preconditions:
+                self._consumers[prop].append(i)
+
+    def covers(self, state: State) -> bool:
+        """ Whether this relaxation also holds for `state`, i.e. it is made of reachable facts. """
+        return self.facts.issuperset(state.facts)
+
+    def applicable_actions(self, state: State) -> List[Action]:
+        return [action for action in self.actions if state.is_applicable(action)]
+
+    def depth(self, facts: Iterable[Proposition], goals: List[List[FrozenSet[Proposition]]]) -> Optional[int]:
+        """
+        Number of layers of the relaxed planning graph needed to reach the goals, `None` if they can't be.
+
+        Each goal is reached once one of its sets of facts is.
+        """
+        reached = set()
+        counts = list(self._nb_preconditions)
+        ready = [i for i, count in enumerate(counts) if count == 0]
+        consumers = self._consumers
+
+        def _reach(props):
+            for prop in props:
+                reached.add(prop)
+                for i in consumers.get(prop, ()):
+                    counts[i] -= 1
+                    if counts[i] == 0:
+                        ready.append(i)
+
+        _reach(facts)
+        depth = 0
+        while not all(any(conditions <= reached for conditions in goal) for goal in goals):
+            new = {prop for i in ready for prop in self._added[i] if prop not in reached}
+            if not new:
+                return None
+
+            ready = []
+            _reach(new)
+            depth += 1
+
+        return depth
+
+
+class _Problem:
+    """
+    Quests to complete from a state.
+
+    Quests are referred to by their index. Those not completed yet (i.e.
+    whose failing events still matter) are part of the search nodes.
+    """
+
+    def __init__(self, state: State, quests: Iterable[Quest], kb: KnowledgeBase):
+        self.state = state
+        self.quests = tuple(quests)
+        self.kb = kb
+        self._ids = [hash(quest) for quest in self.quests]
+
+    def key(self, state: State, remaining: Tuple[int, ...]) -> Tuple:
+        """ Key identifying a search node across problems, e.g. once some of the quests have been completed. """
+        return (self.kb, state.hash, frozenset(self._ids[i] for i in remaining))
+
+    def remaining(self, state: State, indices: Optional[Iterable[int]] = None) -> Tuple[int, ...]:
+        """ Indices of the quests, among `indices`, that are not completed in `state`. """
+        indices = range(len(self.quests)) if indices is None else indices
+        return tuple(i for i in indices if not any(event.is_triggering(state) for event in self.quests[i].win_events))
+
+    def completed(self, remaining: Tuple[int, ...]) -> bool:
+        """ Whether only quests that can't be completed, but must not fail, remain. """
+        return all(not self.quests[i].win_events for i in remaining)
+
+    def fails(self, state: State, remaining: Tuple[int, ...]) -> bool:
+        return any(event.is_triggering(state) for i in remaining for event in self.quests[i].fail_events)
+
+    def goals(self, remaining: Tuple[int, ...]) -> List[List[FrozenSet[Proposition]]]:
+        """ For each remaining quest, the conditions of its winning events (see `_Relaxation.depth`). """
+        return [[frozenset(event.condition.preconditions) for event in self.quests[i].win_events]
+                for i in remaining if self.quests[i].win_events]
+
+
+class PlannerStats:
+    """
+    Statistics about the searches done by a planner.
+
+    Attributes:
+        searches: Number of searches started (i.e. plans not found in the cache).
+        nodes_expanded: Number of states popped from the open list and expanded.
+        nodes_generated: Number of successor states generated.
+        budget_exhausted: Number of searches stopped because of `max_nodes`.
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.nodes_expanded = 0
+        self.nodes_generated = 0
+        self.budget_exhausted = 0
+
+    def __str__(self) -> str:
+        slots = ["searches", "nodes_expanded", "nodes_generated", "budget_exhausted"]
+        return "\n".join("{}: {}".format(slot, getattr(self, slot)) for slot in slots)
+
+
+class Planner:
+    """
+    Optimal planner for completing quests.
+
+    It searches, with A*, the shortest sequence of actions (instantiated
+    from the knowledge base's rules) going from a state to one where one
+    of the winning events of each quest has been triggered, without
+    triggering any of their failing events along the way. Quests without
+    winning events only have to not fail.
+
+    States are estimated with the depth of the relaxed planning graph
+    (i.e. ignoring the facts removed by actions) needed to reach the
+    winning conditions. It never overestimates the number of actions
+    left, so plans found are optimal.
+
+    Plans, including those from the states along them, and heuristic
+    values are cached using the states' hash and the quests left to
+    complete in them.
+
+    Example:
+
+        >>> env = TextWorldEnv(infos, planner=Planner(max_nodes=1000))  # Affects `policy_commands`, `intermediate_reward`, ...
+    """
+
+    def __init__(self, max_nodes: Optional[int] = 10000, heuristic: bool = True,
+                 cache_size: Optional[int] = 100000):
+        """
+        Arguments:
+            max_nodes: Maximum number of states expanded by a search, before giving up.
+            heuristic: Whether to guide the search with the relaxed planning graph,
+                       otherwise it is a breadth-first search.
+            cache_size: Maximum number of plans and heuristic values to keep.
+        """
+        self.max_nodes = max_nodes
+        self.heuristic = heuristic
+        self.stats = PlannerStats()
+        self._plans = TranspositionTable(cache_size)
+        self._estimates = TranspositionTable(cache_size)
+        self._relaxations = TranspositionTable(8)  # Knowledge base -> last relaxation.
+
+    def plan(self, state: State, quests: Iterable[Quest],
+             kb: Optional[KnowledgeBase] = None) -> Optional[Tuple[Action, ...]]:
+        """
+        Find the shortest sequence of actions completing all the quests.
+
+        Arguments:
+            state: State from which to start.
+            quests: The quests to complete, in any order.
+            kb: Knowledge base providing the rules. Defaults to `KnowledgeBase.default()`.
+
+        Returns:
+            The actions to perform or `None` if no plan could be found
+            within `max_nodes` expansions.
+        """
+        problem = _Problem(state, quests, kb or KnowledgeBase.default())
+        key = problem.key(state, problem.remaining(state))
+        if key in self._plans:
+            return self._plans[key]
+
+        self.stats.searches += 1
+        budget_exhausted = self.stats.budget_exhausted
+        path = self._search(problem)
+        if path is None:
+            if self.stats.budget_exhausted == budget_exhausted:
+                # No plan exists, don't search again. Running out of budget isn't
+                # cached though, a larger `max_nodes` might succeed.
+                self._plans[key] = None
+
+            return None
+
+        # Every suffix of an optimal plan is optimal for the state it starts from.
+        for i, (node_state, node_remaining, _) in enumerate(path):
+            self._plans[problem.key(node_state, node_remaining)] = tuple(action for _, _, action in path[i + 1:])
+
+        return self._plans[key]
+
+    def _estimate(self, problem: "_Problem", state: State, remaining: Tuple[int, ...],
+                  relaxation: _Relaxation) -> Optional[int]:
+        """
+        Number of layers of the relaxed planning graph needed to complete the remaining quests.
+
+        Returns `None` when they can't be completed, even ignoring removed facts.
+        """
+        if problem.completed(remaining) or not self.heuristic:
+            return 0
+
+        key = problem.key(state, remaining)
+        estimate = self._estimates.get(key, -1)
+        if estimate == -1:
+            estimate = self._estimates[key] = relaxation.depth(state.facts, problem.goals(remaining))
+
+        return estimate
+
+    def _search(self, problem: "_Problem") -> Optional[List[Tuple]]:
+        """ A* search returning the path, as (state, remaining quests, action) triplets, to the goal. """
+        state, kb = problem.state, problem.kb
+        remaining = problem.remaining(state)
+
+        # States reached by playing the game are covered by the relaxation from its initial state.
+        relaxation = self._relaxations.get(kb)
+        if relaxation is None or not relaxation.covers(state):
+            relaxation = self._relaxations[kb] = _Relaxation(state, kb)
+
+        estimate = self._estimate(problem, state, remaining, relaxation)
+        if estimate is None or problem.fails(state, remaining):
+            return None
+
+        parents = {(state.hash, remaining): None}
+        best = {(state.hash, remaining): 0}
+        counter = itertools.count()  # Ties are broken in insertion order.
+        queue = [(estimate, next(counter), 0, (state, remaining, None))]
+        nb_expanded = 0
+        while queue:
+            _, _, cost, node = heapq.heappop(queue)
+            node_state, node_remaining, _ = node
+            node_key = (node_state.hash, node_remaining)
+            if cost > best[node_key]:
+                continue  # A shorter path to that state has been found since.
+
+            if problem.completed(node_remaining):
+                path = [node]
+                while parents[node_key] is not None:
+                    path.append(parents[node_key])
+                    node_key = (path[-1][0].hash, path[-1][1])
+
+                return path[::-1]
+
+            if self.max_nodes is not None and nb_expanded >= self.max_nodes:
+                self.stats.budget_exhausted += 1
+                return None
+
+            nb_expanded += 1
+            self.stats.nodes_expanded += 1
+            for action in relaxation.applicable_actions(node_state):
+                child_state = node_state.copy()
+                child_state.apply(action)
+                self.stats.nodes_generated += 1
+
+                if problem.fails(child_state, node_remaining):
+                    continue
+
+                child_remaining = problem.remaining(child_state, node_remaining)
+                child_key = (child_state.hash, child_remaining)
+                if child_key in best and best[child_key] <= cost + 1:
+                    continue  # Already reached with as few actions.
+
+                estimate = self._estimate(problem, child_state, child_remaining, relaxation)
+                if estimate is None:
+                    continue
+
+                best[child_key] = cost + 1
+                parents[child_key] = node
+                heapq.heappush(queue, (cost + 1 + estimate, next(counter), cost + 1, (child_state, child_remaining, action)))
+
+        return None
@@ -1,13 +1,18 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT license.
 
+import time
+import multiprocessing
 
+from textworld.generator import chaining
 from textworld.generator.data import KnowledgeBase
-from textworld.generator.chaining import ChainingOptions, QuestGenerationError
-from textworld.generator.chaining import get_chains, sample_quest
-from textworld.logic import GameLogic, Proposition, State, Variable
+from textworld.generator.chaining import ChainingOptions, ChainingStats, QuestGenerationError
+from textworld.generator.chaining import get_chains, get_chains_parallel, sample_quest, _Chainer
+from textworld.logic import ConstraintChecker, GameLogic, Proposition, State, Variable
 
+import numpy as np
 import numpy.testing as npt
+import pytest
 
 
 def build_state(locked_door=False):
@@ -88,6 +93,205 @@ def test_chaining():
     assert len(chains) == 9
 
 
+def test_chaining_from_invalid_state(monkeypatch):
+    allowed_rules = KnowledgeBase.default().rules.get_matching("take/.*", "go.*", "open.*", "close.*", "unlock.*")
+
+    class Options(ChainingOptions):
+        def get_rules(self, depth):
+            return allowed_rules
+
+    options = Options()
+    options.max_depth = 3
+    options.max_length = 3
+
+    # The wooden door is both closed and open.
+    state = build_state()
+    state.add_fact(Proposition("open", [Variable("wooden door", "d")]))
+    checker = ConstraintChecker(KnowledgeBase.default().logic.constraints.values())
+    assert not checker.is_valid(state)
+
+    # States derived from it are checked in full, as if there was no incremental checking.
+    chains = [chain.actions for chain in get_chains(state, options)]
+    monkeypatch.setattr(_Chainer, "check_state", lambda self, state, added=None: self.checker.is_valid(state))
+    assert chains == [chain.actions for chain in get_chains(state, options)]
+
+
+def test_chaining_budget():
+    allowed_rules = KnowledgeBase.default().rules.get_matching("take/.*", "go.*", "open.*", "unlock.*")
+
+    class Options(ChainingOptions):
+        def get_rules(self, depth):
+            return allowed_rules
+
+    options = Options()
+    options.max_depth = 20
+    options.max_length = 20
+    options.min_length = 20  # Impossible to satisfy.
+
+    stats = ChainingStats()
+    chains = list(get_chains(build_state(), options, stats))
+    assert len(chains) == 0
+    assert not stats.budget_exhausted
+    assert stats.nodes_expanded > 5
+
+    options.max_nodes = 5
+    stats = ChainingStats()
+    chains = list(get_chains(build_state(), options, stats))
+    assert stats.budget_exhausted
+    assert stats.nodes_expanded == 5
+
+    with npt.assert_raises(QuestGenerationError) as ctx:
+        sample_quest(build_state(), options)
+
+    assert ctx.exception.stats.budget_exhausted
+
+    # Restarts are only used when sampling with a random generator.
+    options.restarts = 2
+    list(get_chains(build_state(), options, stats))
+    assert stats.restarts == 0
+
+    options.rng = np.random.RandomState(1234)
+    stats = ChainingStats()
+    list(get_chains(build_state(), options, stats))
+    assert stats.restarts == 2
+    assert stats.nodes_expanded == 15
+
+    options.max_nodes = None
+    options.max_time = 0
+    stats = ChainingStats()
+    list(get_chains(build_state(), options, stats))
+    assert stats.budget_exhausted
+    assert stats.nodes_expanded == 0
+
+    # Chains come with the search statistics.
+    options = Options()
+    options.max_depth = 2
+    options.max_length = 2
+    chain = sample_quest(build_state(), options)
+    assert chain.stats.chains == 1
+    assert chain.stats.nodes_expanded >= 1
+
+    # The search doesn't restart once it found chains, they would be yielded again.
+    options.max_depth = 20
+    options.max_length = 20
+    options.max_nodes = 10
+    options.restarts = 2
+    options.rng = np.random.RandomState(1234)
+    stats = ChainingStats()
+    chains = [tuple(chain.actions) for chain in get_chains(build_state(), options, stats)]
+    assert stats.budget_exhausted
+    assert stats.restarts == 0
+    assert len(chains) == stats.chains == len(set(chains)) > 0
+
+
+def test_get_chains_parallel():
+    allowed_rules = KnowledgeBase.default().rules.get_matching("take/.*", "go.*", "open.*", "unlock.*", "close.*")
+
+    class Options(ChainingOptions):
+        def get_rules(self, depth):
+            return allowed_rules
+
+    options = Options()
+    options.max_depth = 5
+    options.max_length = 5
+    options.max_breadth = 2
+    options.subquests = True
+
+    state = build_state()
+    chains = list(get_chains(state, options))
+    keys = set(chain.actions for chain in chains)
+    assert len(chains) > 10
+
+    for nb_processes in [1, 2]:
+        parallel_chains = list(get_chains_parallel(state, options, nb_processes=nb_processes))
+        assert len(parallel_chains) == len(keys)
+        assert set(chain.actions for chain in parallel_chains) == keys
+
+        for chain in parallel_chains:
+            assert chain.initial_state == state
+            node = chain.nodes[-1]
+            while node.parent is not None:
+                assert node.parent in chain.nodes
+                node = node.parent
+
+    # Ordering only depends on the seed.
+    options.rng = np.random.RandomState(1234)
+    chains1 = [chain.actions for chain in get_chains_parallel(state, options, nb_processes=1)]
+    options.rng = np.random.RandomState(1234)
+    chains2 = [chain.actions for chain in get_chains_parallel(state, options, nb_processes=3)]
+    assert chains1 == chains2
+
+
+def test_get_chains_parallel_streaming(monkeypatch):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("Workers need to inherit the patched module.")
+
+    allowed_rules = KnowledgeBase.default().rules.get_matching("take/.*", "go.*", "open.*", "unlock.*", "close.*")
+
+    class Options(ChainingOptions):
+        def get_rules(self, depth):
+            return allowed_rules
+
+    options = Options()
+    options.max_depth = 3
+    options.max_length = 3
+
+    # Workers hold the rest of their branch until the first chain was received.
+    resume = multiprocessing.get_context("fork").Event()
+    search_branch = chaining._search_branch
+
+    def _search_branch(*args):
+        for i, message in enumerate(search_branch(*args)):
+            yield message
+            if i == 0:
+                resume.wait(30)
+
+    monkeypatch.setattr(chaining, "_search_branch", _search_branch)
+
+    state = build_state()
+    start = time.time()
+    chains = get_chains_parallel(state, options, nb_processes=2)
+    first = next(chains)
+    assert time.time() - start < 20  # Not waiting for the whole branch.
+    resume.set()
+    chains = [first] + list(chains)
+    assert [chain.actions for chain in chains] == [chain.actions for chain in get_chains_parallel(state, options, 1)]
+    assert chaining._WORKER_DATA is None
+
+
+def test_lazy_assignments():
+    options = ChainingOptions()
+    options.create_variables = True
+    options.lazy_assignments = True
+    state = build_state()
+    rules = options.get_rules(0)
+
+    def _key(partial):
+        return partial.rule.name, sorted((ph.name, var.name if var else "") for ph, var in partial.mapping.items())
+
+    chainer = _Chainer(state, options)
+    expected = sorted(_key(partial) for partial in chainer.assignments(chainer.root(), rules))
+
+    options.rng = np.random.RandomState(1234)
+    chainer = _Chainer(state, options)
+    sampled = [_key(partial) for partial in chainer.assignments(chainer.root(), rules)]
+    assert sorted(sampled) == expected
+    assert sampled != expected
+
+    # Same seed, same order.
+    options.rng = np.random.RandomState(1234)
+    chainer = _Chainer(state, options)
+    assert [_key(partial) for partial in chainer.assignments(chainer.root(), rules)] == sampled
+
+    options.max_depth = 3
+    options.max_length = 3
+    options.rng = np.random.RandomState(1234)
+    chain1 = sample_quest(state, options)
+    options.rng = np.random.RandomState(1234)
+    chain2 = sample_quest(state, options)
+    assert chain1.actions == chain2.actions
+
+
 def test_applying_actions():
     state = build_state(locked_door=False)
     options = ChainingOptions()
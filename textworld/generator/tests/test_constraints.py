@@ -3,12 +3,13 @@
 
 
 from textworld.generator.data import KnowledgeBase
-from textworld.logic import Proposition, State, Variable
+from textworld.logic import ConstraintChecker, Proposition, State, Variable
 
 
 def check_state(state):
     fail = Proposition("fail", [])
 
+    valid = True
     constraints = state.all_applicable_actions(KnowledgeBase.default().constraints.values())
     for constraint in constraints:
         if state.is_applicable(constraint):
@@ -17,9 +18,50 @@ def check_state(state):
             copy.apply(constraint)
 
             if copy.is_fact(fail):
-                return False
+                valid = False
+                break
+
+    # The ConstraintChecker should agree.
+    checker = ConstraintChecker(KnowledgeBase.default().constraints.values())
+    assert checker.is_valid(state) == valid
+    return valid
+
 
-    return True
+def test_incremental_constraint_checker():
+    kb = KnowledgeBase.default()
+    checker = ConstraintChecker(kb.constraints.values())
+
+    P = Variable("P", "P")
+    bedroom = Variable("bedroom", "r")
+    kitchen = Variable("kitchen", "r")
+    chest = Variable("chest", "c")
+    apple = Variable("apple", "f")
+    state = State(kb.logic, [
+        Proposition("at", [P, bedroom]),
+        Proposition("at", [chest, bedroom]),
+        Proposition("open", [chest]),
+        Proposition("in", [apple, chest]),
+    ])
+    assert checker.is_valid(state)
+
+    new_facts = [Proposition("at", [P, kitchen])]
+    state.add_facts(new_facts)
+    assert not checker.is_valid(state, new_facts)
+    failing = list(checker.failing_constraints(state, new_facts))
+    assert failing and all(action.name == "r1" for action in failing)
+    state.remove_facts(new_facts)
+
+    # Facts are matched against constraints on their supertypes (`o` for `f`).
+    new_facts = [Proposition("at", [apple, kitchen])]
+    state.add_facts(new_facts)
+    assert not checker.is_valid(state, new_facts)
+    assert set(action.name for action in checker.failing_constraints(state)) == {"obj5"}
+    state.remove_facts(new_facts)
+
+    # Only constraints involving the new facts are checked.
+    state.add_fact(Proposition("closed", [chest]))
+    assert checker.is_valid(state, [Proposition("at", [P, bedroom])])
+    assert not checker.is_valid(state, [Proposition("closed", [chest])])
 
 
 def test_constraints():
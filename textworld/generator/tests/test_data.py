@@ -0,0 +1,52 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+import os
+import shutil
+
+import pytest
+from os.path import join as pjoin
+
+from textworld.generator import data
+from textworld.generator.data import KnowledgeBase, LOGIC_DATA_PATH, TEXT_GRAMMARS_PATH
+
+
+def test_knowledge_base_load_cache(tmpdir):
+    logic_path = str(tmpdir.join("logic"))
+    shutil.copytree(LOGIC_DATA_PATH, logic_path)
+
+    kb = KnowledgeBase.load(logic_path=logic_path, grammar_path=TEXT_GRAMMARS_PATH)
+    assert KnowledgeBase.load(logic_path=logic_path, grammar_path=TEXT_GRAMMARS_PATH) is kb
+    assert KnowledgeBase.load(logic_path=logic_path, grammar_path=TEXT_GRAMMARS_PATH, use_cache=False) is not kb
+
+    # Modifying a file invalidates the cached KnowledgeBase.
+    path = pjoin(logic_path, sorted(os.listdir(logic_path))[0])
+    with open(path, "a") as f:
+        f.write("\n# Modified.\n")
+
+    kb2 = KnowledgeBase.load(logic_path=logic_path, grammar_path=TEXT_GRAMMARS_PATH)
+    assert kb2 is not kb
+    assert kb2.logic.rules == kb.logic.rules
+
+    KnowledgeBase.clear_cache()
+    assert KnowledgeBase.load(logic_path=logic_path, grammar_path=TEXT_GRAMMARS_PATH) is not kb2
+
+
+def test_knowledge_base_cache_is_read_only_and_bounded(tmpdir, monkeypatch):
+    KnowledgeBase.clear_cache()
+    kb = KnowledgeBase.load(logic_path=LOGIC_DATA_PATH, grammar_path=TEXT_GRAMMARS_PATH)
+    with pytest.raises(AttributeError):
+        kb.text_grammars_path = str(tmpdir)
+
+    # Unless it isn't shared.
+    kb2 = KnowledgeBase.load(logic_path=LOGIC_DATA_PATH, grammar_path=TEXT_GRAMMARS_PATH, use_cache=False)
+    kb2.text_grammars_path = str(tmpdir)
+    assert kb.text_grammars_path == TEXT_GRAMMARS_PATH
+
+    # Least recently used KnowledgeBase objects get evicted.
+    monkeypatch.setattr(data._KB_CACHE, "maxsize", 1)
+    logic_path = str(tmpdir.join("logic"))
+    shutil.copytree(LOGIC_DATA_PATH, logic_path)
+    KnowledgeBase.load(logic_path=logic_path, grammar_path=TEXT_GRAMMARS_PATH)
+    assert len(data._KB_CACHE) == 1
+    assert KnowledgeBase.load(logic_path=LOGIC_DATA_PATH, grammar_path=TEXT_GRAMMARS_PATH) is not kb
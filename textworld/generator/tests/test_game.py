@@ -2,8 +2,12 @@
 # Licensed under the MIT license.
 
 
+import re
+import pickle
 import unittest
+import itertools
 import textwrap
+from collections import defaultdict
 from typing import Iterable
 
 import numpy as np
@@ -18,10 +22,10 @@ from textworld.generator import World
 from textworld.generator import make_small_map
 
 from textworld.generator.chaining import ChainingOptions, sample_quest
-from textworld.logic import Action
+from textworld.logic import Action, Interner
 
 from textworld.generator.game import GameOptions
-from textworld.generator.game import Quest, Game, Event
+from textworld.generator.game import Quest, Game, Event, CommandSpace
 from textworld.generator.game import QuestProgression, GameProgression, EventProgression
 from textworld.generator.game import UnderspecifiedEventError, UnderspecifiedQuestError
 from textworld.generator.game import ActionDependencyTree, ActionDependencyTreeElement
@@ -120,6 +124,71 @@ def test_variable_infos(verbose=False):
             assert var_infos.desc is not None
 
 
+def test_command_space():
+    commands = CommandSpace([("look", []),
+                             ("take {}", [["key", "red apple"]]),
+                             ("put {} on {}", [["key", "red apple"], ["table"]])])
+    expected = ["look", "put key on table", "put red apple on table", "take key", "take red apple"]
+    assert len(commands) == len(expected)
+    assert list(commands) == expected
+    assert commands == expected
+    assert [commands[i] for i in range(len(commands))] == expected
+    assert commands[-1] == expected[-1]
+    assert commands[1:3] == expected[1:3]
+    assert all(commands.index(command) == i for i, command in enumerate(expected))
+    assert "put red apple on table" in commands
+    assert "put table on key" not in commands
+    assert "take red" not in commands
+    assert pickle.loads(pickle.dumps(commands)) == commands
+    npt.assert_raises(IndexError, commands.__getitem__, len(expected))
+    npt.assert_raises(ValueError, commands.index, "take table")
+    assert commands.serialize() == expected
+    assert commands + ["inventory"] == expected + ["inventory"]
+    assert ["inventory"] + commands == ["inventory"] + expected
+    assert commands + commands == expected + expected
+    assert commands == CommandSpace([("take {}", [["red apple", "key"]]),
+                                     ("put {} on {}", [["red apple", "key"], ["table"]]),
+                                     ("look", [])])
+
+    # Names can be repeated, and slots can be empty.
+    commands = CommandSpace([("take {}", [["key", "key"]]), ("drop {}", [[]])])
+    assert list(commands) == ["take key", "take key"]
+    assert commands.count("take key") == 2
+    assert "drop " not in commands
+    assert commands.count("drop ") == 0
+    npt.assert_raises(ValueError, commands.index, "drop ")
+
+
+def test_possible_commands():
+    options = textworld.GameOptions()
+    options.nb_rooms = 3
+    options.nb_objects = 10
+    options.quest_length = 2
+    options.seeds = 1234
+    game = textworld.generator.make_game(options)
+
+    # Same commands as materializing the cartesian product of templates and names.
+    templates = set(re.sub(r"{.*?}", "{}", t) for t in game.command_templates)
+    expected = sorted(t.format(*names) for t in templates
+                      for names in itertools.product(game.objects_names, repeat=t.count("{}")))
+    assert game.possible_commands == expected
+
+    type2names = defaultdict(list)
+    for name, type in game.objects_names_and_types:
+        type2names["{{{}}}".format(type)].append(name)
+
+    templates = set(re.sub(r"{.*?}", "{{{}}}", t).format(*types)
+                    for t in game.command_templates
+                    for types in itertools.product(*[[arg.strip("{}")] + game.kb.types.descendants(arg.strip("{}"))
+                                                     for arg in re.findall(r"{.*?}", t)]))
+    expected = sorted(re.sub(r"{.*?}", "{}", t).format(*names) for t in templates
+                      for names in itertools.product(*[type2names[arg] for arg in re.findall(r"{.*?}", t)]))
+    assert game.possible_admissible_commands == expected
+
+    # Games sharing the same vocabulary share the same commands.
+    assert textworld.generator.make_game(options).possible_commands is game.possible_commands
+
+
 class TestEvent(unittest.TestCase):
 
     @classmethod
@@ -501,6 +570,39 @@ class TestEventProgression(unittest.TestCase):
         assert not event.triggered
         assert event.untriggerable
 
+    def test_irrelevant_actions(self):
+        M = GameMaker()
+        room = M.new_room("room")
+        M.set_player(room)
+        carrot = M.new(type='f', name='carrot')
+        apple = M.new(type='f', name='apple')
+        chest = M.new(type='c', name='chest')
+        chest.add_property("open")
+        room.add(carrot, apple, chest)
+        game = M.build()
+
+        event = EventProgression(Event(conditions={M.new_fact("in", carrot, chest)}), game.kb)
+        state = game.world.state.copy()
+
+        def _apply(command):
+            mapping = {k: info.name for k, info in game.infos.items()}
+            actions = state.all_applicable_actions(game.kb.rules.values(), game.kb.types.constants_mapping)
+            action, = [action for action in actions if action.format_command(mapping) == command]
+            state.apply(action)
+            event.update(action=action, state=state)
+
+        _apply("take carrot")
+        assert not event._stale
+
+        # Taking the apple doesn't change any fact the event depends on.
+        _apply("take apple")
+        assert not event._stale
+        assert not event.triggered
+
+        _apply("insert carrot into chest")
+        assert event.triggered
+        assert event.done
+
 
 class TestQuestProgression(unittest.TestCase):
 
@@ -688,6 +790,29 @@ class TestGameProgression(unittest.TestCase):
         assert not game.failed
         assert game.winning_policy is None
 
+    def test_encode(self):
+        game = GameProgression(self.game)
+        for action in self.eventA.actions + self.eventB.actions[:2]:
+            game.update(action)
+
+        interner = Interner()
+        data = game.encode(interner)
+        data, tables = pickle.loads(pickle.dumps((data, interner.serialize())))
+        game2 = GameProgression.decode(data, self.game, Interner(tables))
+        assert game2.state == game.state
+        assert set(game2.valid_actions) == set(game.valid_actions)
+        assert game2.winning_policy == game.winning_policy
+        assert game2.score == game.score
+        assert [qp.completed for qp in game2.quest_progressions] == [qp.completed for qp in game.quest_progressions]
+
+        # Both progressions keep evolving the same way.
+        for action in self.eventB.actions[2:] + self.eventC.actions:
+            game.update(action)
+            game2.update(action)
+            assert game2.winning_policy == game.winning_policy
+
+        assert game2.completed and game.completed
+
     def test_failed(self):
         game = GameProgression(self.game)
         action = self.eating_tomato.actions[0]
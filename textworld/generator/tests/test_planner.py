@@ -0,0 +1,122 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import unittest
+
+from textworld import GameMaker
+from textworld.generator.game import Event, Game, GameProgression, Quest
+from textworld.logic import Interner
+from textworld.generator.planner import Planner
+
+
+class TestPlanner(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        M = GameMaker()
+        bedroom = M.new_room("bedroom")
+        kitchen = M.new_room("kitchen")
+        M.set_player(bedroom)
+
+        path = M.connect(bedroom.east, kitchen.west)
+        path.door = M.new(type='d', name='wooden door')
+        path.door.add_property("open")
+
+        carrot = M.new(type='f', name='carrot')
+        M.inventory.add(carrot)
+
+        chest = M.new(type='c', name='chest')
+        chest.add_property("open")
+        kitchen.add(chest)
+
+        eating_carrot = Event(conditions={M.new_fact("eaten", carrot)})
+        carrot_in_chest = Event(conditions={M.new_fact("in", carrot, chest)})
+        chest_closed_with_carrot = Event(conditions={M.new_fact("in", carrot, chest), M.new_fact("closed", chest)})
+        M.quests = [Quest(win_events=[carrot_in_chest], fail_events=[eating_carrot]),
+                    Quest(win_events=[chest_closed_with_carrot], fail_events=[eating_carrot])]
+        cls.game = M.build()
+        cls.quests = [quest for quest in cls.game.quests if not quest.optional]
+        cls.mapping = {k: info.name for k, info in cls.game.infos.items()}
+
+    def _commands(self, actions):
+        return [action.format_command(self.mapping) for action in actions]
+
+    def _actions(self, commands):
+        state = self.game.world.state.copy()
+        actions = []
+        for command in commands:
+            action, = [action for action in state.all_applicable_actions(self.game.kb.rules.values(),
+                                                                         self.game.kb.types.constants_mapping)
+                       if action.format_command(self.mapping) == command]
+            state.apply(action)
+            actions.append(action)
+
+        return actions
+
+    def test_plan(self):
+        state = self.game.world.state
+        for heuristic in [True, False]:
+            planner = Planner(heuristic=heuristic)
+            plan = planner.plan(state, self.quests, self.game.kb)
+            assert self._commands(plan) == ["go east", "insert carrot into chest", "close chest"]
+
+    def test_cache(self):
+        planner = Planner()
+        state = self.game.world.state.copy()
+        plan = planner.plan(state, self.quests, self.game.kb)
+        assert planner.stats.searches == 1
+
+        # Following the plan doesn't need more searches, even once a quest is completed.
+        for i, action in enumerate(plan):
+            state.apply(action)
+            quests = [quest for quest in self.quests if not quest.is_winning(state)]
+            assert planner.plan(state, quests, self.game.kb) == plan[i + 1:]
+
+        assert planner.stats.searches == 1
+
+    def test_budget(self):
+        planner = Planner(max_nodes=0)
+        assert planner.plan(self.game.world.state, self.quests, self.game.kb) is None
+        assert planner.stats.budget_exhausted == 1
+
+        # Running out of budget isn't cached, a larger budget is used on the next call.
+        planner.max_nodes = None
+        plan = planner.plan(self.game.world.state, self.quests, self.game.kb)
+        assert self._commands(plan) == ["go east", "insert carrot into chest", "close chest"]
+        assert planner.stats.searches == 2
+
+    def test_game_progression(self):
+        game_progression = GameProgression(self.game, planner=Planner())
+        assert GameProgression(self.game).planner is None
+
+        # Moving away from the quests.
+        drop_carrot, = [action for action in game_progression.valid_actions if action.name == "drop"]
+        game_progression.update(drop_carrot)
+
+        policy = self._commands(game_progression.winning_policy)
+        assert policy == ["take carrot", "go east", "insert carrot into chest", "close chest"]
+
+        copy = game_progression.copy()
+        assert copy.planner is game_progression.planner
+        assert copy.winning_policy == game_progression.winning_policy
+
+        interner = Interner()
+        data = game_progression.encode(interner)
+        decoded = GameProgression.decode(data, self.game, Interner(interner.serialize()), game_progression.planner)
+        assert decoded.planner is game_progression.planner
+        assert decoded.winning_policy == game_progression.winning_policy
+
+    def test_walkthrough(self):
+        # Be in the bedroom then in the kitchen, with the door closed each time.
+        quests = [Quest(win_events=[Event(self._actions(["close wooden door"]))]),
+                  Quest(win_events=[Event(self._actions(["go east", "close wooden door"]))])]
+        game = Game(self.game.world, quests=quests)
+        game.infos.update(self.game.infos)
+
+        # Merging the quests' trees goes to the kitchen first, then comes back.
+        assert game.walkthrough == ["go east", "close wooden door", "open wooden door", "go west", "close wooden door"]
+
+        game.planner = Planner()
+        assert game.walkthrough == ["close wooden door", "open wooden door", "go east", "close wooden door"]
+        assert game.copy().planner is game.planner
@@ -145,3 +145,44 @@ def test_populate_with():
 
     assert obj in world.objects
     assert (Proposition('at', [obj, room]) in world.facts or Proposition('in', [obj, I]) in world.facts)
+
+
+def test_adding_and_removing_facts():
+    P = Variable("P")
+    room = Variable("room", "r")
+    chest = Variable("chest", "c")
+    obj = Variable("obj", "o")
+    world = World.from_facts([Proposition("at", [P, room]), Proposition("at", [chest, room])])
+    assert world.player_room.name == room.name
+    assert world.find_object_by_id("obj") is None
+
+    facts = [Proposition("in", [obj, chest]), Proposition("open", [chest])]
+    world.add_facts(facts)
+    assert [o.name for o in world.get_all_objects_in(world.find_object_by_id("chest"))] == ["obj"]
+
+    world.remove_facts(facts)
+    assert world.find_object_by_id("obj") is None
+    assert "open" not in world.find_object_by_id("chest").properties
+
+    # Entities are the same as if the world was built from scratch.
+    world.populate_room(10, room)
+    expected = World.from_facts(world.facts)
+    assert [e.name for e in world.entities] == [e.name for e in expected.entities]
+    assert [e.related_facts for e in world.entities] == [e.related_facts for e in expected.entities]
+
+
+def test_modifying_state_directly():
+    P = Variable("P")
+    kitchen = Variable("kitchen", "r")
+    bedroom = Variable("bedroom", "r")
+    world = World.from_facts([Proposition("north_of", [kitchen, bedroom]),
+                              Proposition("south_of", [bedroom, kitchen])])
+    player_fact = world.set_player_room(bedroom)
+    assert world.player_room.name == "bedroom"
+
+    # The world notices facts that were changed without using it.
+    world.state.remove_fact(player_fact)
+    assert world.player_room is None
+    world.state.add_fact(Proposition("at", [P, kitchen]))
+    assert world.player_room.name == "kitchen"
+    assert Proposition("at", [P, kitchen]) in world.facts
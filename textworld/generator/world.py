@@ -5,12 +5,11 @@
 from collections import OrderedDict, defaultdict
 from typing import Union, List, ValuesView, Optional, Dict, Any
 
-import networkx
 import numpy as np
 from numpy.random import RandomState
 
 from textworld import g_rng
-from textworld.utils import uniquify
+from textworld.utils import uniquify, lazy_import
 from textworld.generator.data import KnowledgeBase
 from textworld.generator.vtypes import get_new
 
@@ -18,6 +17,8 @@ from textworld.generator.graph_networks import direction
 from textworld.generator.graph_networks import DIRECTIONS, reverse_direction
 from textworld.logic import Proposition, State, Variable
 
+networkx = lazy_import("networkx")
+
 
 class NoFreeExitError(Exception):
     pass
@@ -49,7 +50,7 @@ def connect(room1: Variable, direction: str, room2: Variable,
     return facts
 
 
-def graph2state(G: networkx.Graph, rooms: Dict[str, Variable]) -> List[Proposition]:
+def graph2state(G: "networkx.Graph", rooms: Dict[str, Variable]) -> List[Proposition]:
     """ Convert Graph object to a list of `Proposition`.
 
     Args:
@@ -144,6 +145,10 @@ class World:
     def __init__(self, kb: Optional[KnowledgeBase] = None) -> None:
         self.kb = kb or KnowledgeBase.default()
         self._state = State(self.kb.logic)
+        self._facts_by_var = defaultdict(set)  # Facts involving a given variable (indexed by name).
+        self._sorted_facts = None
+        self._needs_update = False
+        self._indexed_hash = self._state.hash  # State hash the index above corresponds to.
         self._entities = OrderedDict()
         self._rooms = []
         self._objects = []
@@ -165,7 +170,7 @@ class World:
         return [f.serialize() for f in self.facts]
 
     @classmethod
-    def from_map(cls, map: networkx.Graph, kb: Optional[KnowledgeBase] = None) -> "World":
+    def from_map(cls, map: "networkx.Graph", kb: Optional[KnowledgeBase] = None) -> "World":
         """
         Args:
             map: Graph defining the structure of the world.
@@ -176,42 +181,118 @@ class World:
         world.add_facts(graph2state(map, rooms))
         return world
 
+    @property
+    def player(self) -> WorldObject:
+        self._maybe_update()
+        return self._player
+
+    @property
+    def inventory(self) -> WorldObject:
+        self._maybe_update()
+        return self._inventory
+
     @property
     def player_room(self) -> WorldRoom:
+        self._maybe_update()
         return self._player_room
 
     @property
     def rooms(self) -> List[WorldRoom]:
+        self._maybe_update()
         return self._rooms
 
     @property
     def objects(self) -> List[WorldObject]:
+        self._maybe_update()
         return self._objects
 
     @property
     def entities(self) -> ValuesView[WorldEntity]:
+        self._maybe_update()
         return self._entities.values()
 
     @property
     def state(self) -> State:
+        """ Facts of the world.
+
+        Prefer `add_facts` and `remove_facts` to modifying it directly, which
+        makes the world rebuild its whole index of the facts on next use.
+        """
         return self._state
 
     @state.setter
     def state(self, state: State) -> None:
         self._state = State(self.kb.logic)
+        self._facts_by_var = defaultdict(set)
+        self._indexed_hash = self._state.hash
         self.add_facts(state.facts)
 
     @property
     def facts(self) -> List[Proposition]:
+        self._check_state()
         # Sort the facts for deterministic world generation
-        return sorted(self._state.facts)
+        if self._sorted_facts is None:
+            self._sorted_facts = sorted(self._state.facts)
+
+        return list(self._sorted_facts)
 
     def add_fact(self, fact: Proposition) -> None:
         self.add_facts([fact])
 
     def add_facts(self, facts: List[Proposition]) -> None:
+        self._check_state()
+        facts = [fact for fact in facts if not self._state.is_fact(fact)]
         self._state.add_facts(facts)
-        self._update()  # Update the internal representation of the world.
+        self._index_facts(facts, add=True)
+
+        if any(self.kb.types.is_descendant_of(fact.arguments[0].type, "r") or fact.name == "link"
+               for fact in facts if fact.arguments):
+            self._update()  # Connecting rooms may fail (see `NoFreeExitError`).
+
+    def remove_fact(self, fact: Proposition) -> None:
+        self.remove_facts([fact])
+
+    def remove_facts(self, facts: List[Proposition]) -> None:
+        self._check_state()
+        facts = [fact for fact in facts if self._state.is_fact(fact)]
+        self._state.remove_facts(facts)
+        self._index_facts(facts, add=False)
+
+    def _index_facts(self, facts: List[Proposition], add: bool) -> None:
+        for fact in facts:
+            for var in fact.arguments:
+                if add:
+                    self._facts_by_var[var.name].add(fact)
+                else:
+                    self._facts_by_var[var.name].discard(fact)
+
+        if facts:
+            # The internal representation of the world gets rebuilt on demand.
+            self._sorted_facts = None
+            self._needs_update = True
+
+        self._indexed_hash = self._state.hash
+
+    def _check_state(self) -> None:
+        """ Rebuilds the index of the facts if the state has been modified directly. """
+        if self._state.hash == self._indexed_hash:
+            return
+
+        self._facts_by_var = defaultdict(set)
+        self._index_facts(list(self._state.facts), add=True)
+        self._sorted_facts = None
+        self._needs_update = True
+
+    def _maybe_update(self) -> None:
+        self._check_state()
+        if self._needs_update:
+            self._update()
+
+    def _get_facts_at(self, room: Variable) -> List[Proposition]:
+        """ Facts `at(x, room)` in deterministic order. """
+        self._check_state()
+        return sorted(fact for fact in self._facts_by_var[room.name]
+                      if fact.name == "at" and fact.arguments[1].name == room.name)
 
     def _get_entity(self, var: Variable) -> WorldEntity:
         if var.name not in self._entities:
@@ -235,9 +316,10 @@ class World:
         This method will create new entities based on facts. It should be called whenever
         backing facts are changed.
         """
+        self._needs_update = False
         self._entities = OrderedDict()  # Clear entities.
-        self.player = self._get_entity(Variable("P"))
-        self.inventory = self._get_entity(Variable("I"))
+        self._player = self._get_entity(Variable("P"))
+        self._inventory = self._get_entity(Variable("I"))
         self._player_room = None
         self._process_rooms()
         self._process_objects()
@@ -249,7 +331,8 @@ class World:
             self._entities_per_type[entity.type].append(entity)
 
     def _process_rooms(self) -> None:
-        for fact in self.facts:
+        facts = self.facts
+        for fact in facts:
             if not self.kb.types.is_descendant_of(fact.arguments[0].type, 'r'):
                 continue  # Skip non room facts.
 
@@ -265,7 +348,7 @@ class World:
                 room.exits[exit] = dest
 
         # Handle door link facts.
-        for fact in self.facts:
+        for fact in facts:
             if fact.name != "link":
                 continue
 
@@ -361,15 +444,19 @@ class World:
 
     def get_entities_per_type(self, type: str) -> List[WorldEntity]:
         """ Get all entities of a certain type. """
+        self._maybe_update()
         return self._entities_per_type.get(type, [])
 
     def find_object_by_id(self, id: str) -> Optional[WorldObject]:
+        self._maybe_update()
         return self._entities.get(id)
 
     def find_room_by_id(self, id: str) -> Optional[WorldRoom]:
+        self._maybe_update()
         return self._entities.get(id)
 
     def set_player_room(self, start_room: Union[None, WorldRoom, str] = None) -> Proposition:
+        self._maybe_update()
         if start_room is None:
             if len(self.rooms) == 0:
                 start_room = WorldRoom("r_0", "r")
@@ -399,14 +486,14 @@ class World:
 
         locked_or_closed_objects = []
         lockable_objects = []
-        for s in self.facts:
+        for s in self._get_facts_at(room):
             # Look for containers and supporters to put stuff in/on them.
-            if s.name == "at" and s.arguments[0].type in ["c", "s"] and s.arguments[1].name == room.name:
+            if s.arguments[0].type in ["c", "s"]:
                 objects_holder.append(s.arguments[0])
 
             # Look for containers and doors without a matching key.
-            if s.name == "at" and s.arguments[0].type in ["c", "d"] and s.arguments[1].name == room.name:
-                obj_propositions = [p.name for p in self.facts if s.arguments[0].name in p.names]
+            if s.arguments[0].type in ["c", "d"]:
+                obj_propositions = [p.name for p in self._facts_by_var[s.arguments[0].name]]
                 if "match" not in obj_propositions and s.arguments[0] not in lockable_objects:
                     lockable_objects.append(s.arguments[0])
 
@@ -517,14 +604,14 @@ class World:
 
         locked_or_closed_objects = []
         lockable_objects = []
-        for s in self.facts:
+        for s in self._get_facts_at(room):
             # Look for containers and supporters to put stuff in/on them.
-            if s.name == "at" and s.arguments[0].type in ["c", "s"] and s.arguments[1].name == room.name:
+            if s.arguments[0].type in ["c", "s"]:
                 objects_holder.append(s.arguments[0])
 
             # Look for containers and doors without a matching key.
-            if s.name == "at" and s.arguments[0].type in ["c", "d"] and s.arguments[1].name == room.name:
-                obj_propositions = [p.name for p in self.facts if s.arguments[0].name in p.names]
+            if s.arguments[0].type in ["c", "d"]:
+                obj_propositions = [p.name for p in self._facts_by_var[s.arguments[0].name]]
                 if "match" not in obj_propositions and s.arguments[0] not in lockable_objects:
                     lockable_objects.append(s.arguments[0])
 
@@ -596,4 +683,4 @@ class World:
         return (isinstance(other, World) and self.state == other.state)
 
     def __hash__(self) -> int:
-        return hash(frozenset(self.facts))
+        return self.state.hash
@@ -64,3 +64,15 @@ class TextworldGymEnv(TextworldBatchGymEnv):
         """
         obs, scores, dones, infos = super().step([command])
         return obs[0], scores[0], dones[0], {k: v[0] for k, v in infos.items()}
+
+    def peek(self, commands) -> Tuple[List[str], List[float], List[bool], Dict[str, List[Any]]]:
+        """ Evaluates commands in the text-based environment without changing its state.
+
+        Arguments:
+            commands: Text commands to evaluate from the current state.
+
+        Returns:
+            Same as `step` except there is a list, with one item per command, for each element.
+        """
+        obs, scores, dones, infos = super().peek([commands])
+        return obs[0], scores[0], dones[0], {k: v[0] for k, v in infos.items()}
@@ -5,6 +5,7 @@
 import sys
 import textwrap
 from io import StringIO
+from collections import deque
 from typing import List, Optional, Dict, Any, Tuple, Union
 
 import numpy as np
@@ -40,7 +41,10 @@ class TextworldBatchGymEnv:
                  asynchronous: bool = True,
                  auto_reset: bool = False,
                  max_episode_steps: Optional[int] = None,
-                 wrappers: List[textworld.core.Wrapper] = []) -> None:
+                 wrappers: List[textworld.core.Wrapper] = [],
+                 prefetch: bool = False,
+                 start_method: Optional[str] = None,
+                 timeout: Optional[float] = None) -> None:
         """ Environment for playing text-based games in batch.
 
         Arguments:
@@ -69,15 +73,35 @@ class TextworldBatchGymEnv:
                 Otherwise, once a game is done, subsequent calls to `env.step` won't have any effects.
             max_episode_steps:
                 Number of steps allocated to play each game. Once exhausted, the game is done.
+            wrappers:
+                List of wrappers to apply to each environment of the batch.
+            prefetch:
+                If `True`, the next games of the pool are loaded in the background while the
+                current ones are being played (only when `asynchronous=True`). This requires
+                a spare environment per game in the batch. Z-Machine games are never loaded in
+                the background, Jericho's interpreters can't run concurrently. Default: `False`.
+            start_method:
+                Method used to start the worker processes when `asynchronous=True`, i.e.
+                "fork", "spawn" or "forkserver" (see
+                :py:func:`textworld.utils.get_context`). Default: multiprocessing's default.
+            timeout:
+                Maximum time (in seconds) allowed for each game to perform a step when
+                `asynchronous=True`. Games that exceed it, or whose worker process dies,
+                are reported as done and their worker is restarted (see
+                :py:attr:`AsyncBatchEnv.truncated <textworld.envs.batch.batch_env.AsyncBatchEnv.truncated>`).
+                By default, wait indefinitely.
         """
         self.gamefiles = gamefiles
+        self.prefetch = prefetch
         self.batch_size = batch_size
         self.request_infos = request_infos or EnvInfos()
         self.seed(1234)
 
         env_fns = [partial(_make_env, self.request_infos, max_episode_steps, wrappers) for _ in range(self.batch_size)]
-        BatchEnvType = AsyncBatchEnv if self.batch_size > 1 and asynchronous else SyncBatchEnv
-        self.batch_env = BatchEnvType(env_fns, auto_reset)
+        if self.batch_size > 1 and asynchronous:
+            self.batch_env = AsyncBatchEnv(env_fns, auto_reset, start_method=start_method, timeout=timeout)
+        else:
+            self.batch_env = SyncBatchEnv(env_fns, auto_reset)
 
     def seed(self, seed: Optional[int] = None) -> List[int]:
         """ Set the seed for this environment's random generator(s).
@@ -98,8 +122,15 @@ class TextworldBatchGymEnv:
 
         # Prepare iterator used for looping through the games.
         self._gamefiles_iterator = shuffled_cycle(gamefiles, rng=rng)
+        self._upcoming_gamefiles = deque()  # Games drawn from the iterator ahead of time.
         return [seed]
 
+    def _next_gamefile(self) -> str:
+        if self._upcoming_gamefiles:
+            return self._upcoming_gamefiles.popleft()
+
+        return next(self._gamefiles_iterator)
+
     def reset(self) -> Tuple[List[str], Dict[str, List[Any]]]:
         """ Resets the text-based environment.
 
@@ -114,11 +145,19 @@ class TextworldBatchGymEnv:
         if self.batch_env is not None:
             self.batch_env.close()
 
-        gamefiles = [next(self._gamefiles_iterator) for _ in range(self.batch_size)]
+        gamefiles = [self._next_gamefile() for _ in range(self.batch_size)]
         self.batch_env.load(gamefiles)
 
         self.last_commands = [None] * self.batch_size
         self.obs, infos = self.batch_env.reset()
+
+        if self.prefetch:
+            # Start loading the games of the next reset while these ones are being played.
+            while len(self._upcoming_gamefiles) < self.batch_size:
+                self._upcoming_gamefiles.append(next(self._gamefiles_iterator))
+
+            self.batch_env.prefetch(list(self._upcoming_gamefiles)[:self.batch_size])
+
         return self.obs, infos
 
     def skip(self, nb_games: int = 1) -> None:
@@ -128,7 +167,7 @@ class TextworldBatchGymEnv:
             nb_games: Number of games to skip.
         """
         for _ in range(nb_games):
-            next(self._gamefiles_iterator)
+            self._next_gamefile()
 
     def step(self, commands) -> Tuple[List[str], List[float], List[bool], Dict[str, List[Any]]]:
         """ Runs a command in each text-based environment of the batch.
@@ -150,6 +189,21 @@ class TextworldBatchGymEnv:
         self.obs, scores, dones, infos = self.batch_env.step(self.last_commands)
         return self.obs, scores, dones, infos
 
+    def peek(self, commands) -> Tuple[List[List[str]], List[List[float]], List[List[bool]], Dict[str, List[List[Any]]]]:
+        """ Evaluates several commands in each text-based environment of the batch.
+
+        Commands are evaluated independently from the current state of each game,
+        which is left unchanged (e.g., to look ahead when searching for a command).
+
+        Arguments:
+            commands: Text commands to evaluate, one list per game in the batch.
+
+        Returns:
+            Same as `step` except there is a list, with one item per command, for each game in the batch.
+        """
+        assert isinstance(commands, (list, tuple)), "Expected a list of commands per game."
+        return self.batch_env.peek(commands)
+
     def close(self) -> None:
         """ Close this environment. """
 
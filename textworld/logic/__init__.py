@@ -5,8 +5,10 @@
 from collections import Counter, defaultdict, deque
 from functools import total_ordering, lru_cache
 from tatsu.model import NodeWalker
+import hashlib
+import re
 import textwrap
-from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Sequence
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Sequence, Tuple, Union
 
 try:
     from typing import Collection
@@ -14,9 +16,11 @@ except ImportError:
     # Collection is new in Python 3.6 -- fall back on Iterable for 3.5
     from typing import Iterable as Collection
 
+from numpy.random import RandomState
+
 from textworld.logic.model import GameLogicModelBuilderSemantics
 from textworld.logic.parser import GameLogicParser
-from textworld.utils import uniquify, unique_product
+from textworld.utils import uniquify, unique_product, disk_cache
 
 from mementos import memento_factory, with_metaclass
 
@@ -212,6 +216,13 @@ class _ModelConverter(NodeWalker):
 _PARSER = GameLogicParser(semantics=GameLogicModelBuilderSemantics(), parseinfo=True)
 
 
+def _shuffled(items: Sequence, rng: Optional[RandomState]) -> Sequence:
+    if rng is None:
+        return items
+
+    return [items[i] for i in rng.permutation(len(items))]
+
+
 def _parse_and_convert(*args, **kwargs):
     model = _PARSER.parse(*args, **kwargs)
     return _ModelConverter().walk(model)
@@ -510,6 +521,10 @@ class Variable:
     def __hash__(self):
         return self._hash
 
+    def __reduce__(self):
+        # Hash codes of strings differ across processes, don't pickle the cached one.
+        return (Variable, (self.name, self.type))
+
     def __lt__(self, other):
         if isinstance(other, Variable):
             return (self.name, self.type) < (other.name, other.type)
@@ -588,6 +603,10 @@ class Signature(with_metaclass(SignatureTracker, object)):
     def __hash__(self):
         return self._hash
 
+    def __reduce__(self):
+        # Hash codes of strings differ across processes, don't pickle the cached one.
+        return (Signature, (self.name, self.types))
+
     def __lt__(self, other):
         if isinstance(other, Signature):
             return (self.name, self.types) < (other.name, other.types)
@@ -623,7 +642,7 @@ class Proposition(with_metaclass(PropositionTracker, object)):
     An instantiated Predicate, with concrete variables for each placeholder.
     """
 
-    __slots__ = ("name", "arguments", "signature", "_hash")
+    __slots__ = ("name", "arguments", "signature", "_hash", "_digest")
 
     def __init__(self, name: str, arguments: Iterable[Variable] = []):
         """
@@ -641,6 +660,18 @@ class Proposition(with_metaclass(PropositionTracker, object)):
         self.arguments = tuple(arguments)
         self.signature = Signature(name, [var.type for var in self.arguments])
         self._hash = hash((self.name, self.arguments))
+        self._digest = None
+
+    @property
+    def digest(self) -> int:
+        """
+        64-bit hash of this proposition that, unlike `hash()`, is the same across processes.
+        """
+        if self._digest is None:
+            key = "{}({})".format(self.name, ", ".join("{}: {}".format(var.name, var.type) for var in self.arguments))
+            self._digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+        return self._digest
 
     @property
     def names(self) -> Collection[str]:
@@ -671,6 +702,10 @@ class Proposition(with_metaclass(PropositionTracker, object)):
     def __hash__(self):
         return self._hash
 
+    def __reduce__(self):
+        # Hash codes of strings differ across processes, don't pickle the cached one.
+        return (Proposition, (self.name, self.arguments))
+
     def __lt__(self, other):
         if isinstance(other, Proposition):
             return (self.name, self.arguments) < (other.name, other.arguments)
@@ -758,6 +793,10 @@ class Placeholder:
     def __hash__(self):
         return self._hash
 
+    def __reduce__(self):
+        # Hash codes of strings differ across processes, don't pickle the cached one.
+        return (Placeholder, (self.name, self.type))
+
     def __lt__(self, other):
         if isinstance(other, Placeholder):
             return (self.name, self.type) < (other.name, other.type)
@@ -1428,6 +1467,9 @@ class GameLogic:
     The logic for a game (types, rules, etc.).
     """
 
+    #: int: Version of the objects cached on disk by `load`, bump it when changing how they are built.
+    CACHE_SCHEMA = 1
+
     def __init__(self):
         self._document = ""
         self.types = TypeHierarchy()
@@ -1530,19 +1572,31 @@ class GameLogic:
     @classmethod
     @lru_cache(maxsize=128, typed=False)
     def parse(cls, document: str) -> "GameLogic":
-        result = cls()
-        result._parse(document)
-        result._initialize()
-        return result
+        return cls._load([(None, document)])
 
     @classmethod
     def load(cls, paths: Iterable[str]):
-        result = cls()
+        documents = []
         for path in paths:
             with open(path, "r") as f:
-                result._parse(f.read(), path=path)
-        result._initialize()
-        return result
+                documents.append((path, f.read()))
+
+        return cls._load(documents)
+
+    @classmethod
+    def _load(cls, documents: Sequence[Tuple[Optional[str], str]]) -> "GameLogic":
+        def _build():
+            result = cls()
+            for path, document in documents:
+                result._parse(document, path=path)
+
+            result._initialize()
+            return result
+
+        # Parsing is slow, converted models are cached on disk. Paths are part
+        # of the key since they are stored in the parsed objects.
+        contents = [content for path, document in documents for content in (path, document)]
+        return disk_cache("logic", contents, _build, schema=cls.CACHE_SCHEMA)
 
     @classmethod
     def deserialize(cls, data: str) -> "GameLogic":
@@ -1577,10 +1631,26 @@ class State:
         self._vars_by_name = {}
         self._vars_by_type = defaultdict(set)
         self._var_counts = Counter()
+        self._index = None  # See `build_index()`.
+        self._hash = 0  # See `hash`.
 
         if facts:
             self.add_facts(facts)
 
+    @property
+    def hash(self) -> int:
+        """
+        64-bit hash of the facts in this state.
+
+        It is kept up to date as facts are added or removed (XOR of the
+        facts' `Proposition.digest`) and, unlike `hash()`, it is the same
+        across processes. Equal states have the same hash. Negated facts
+        (e.g. `not_open(c)`) are left out, they only restate that a fact
+        doesn't hold, so the same state is reached whichever actions led
+        to it.
+        """
+        return self._hash
+
     @property
     def facts(self) -> Iterable[Proposition]:
         """
@@ -1595,12 +1665,31 @@ class State:
         """
         return self._facts.get(sig, frozenset())
 
+    def facts_with_names(self, names: Collection[str]) -> Iterable[Proposition]:
+        """
+        Returns all the known facts whose predicate has one of the given names.
+
+        Only the facts with a matching signature are visited, not all of them.
+        """
+        for sig, fact_set in self._facts.items():
+            if sig.name in names:
+                yield from fact_set
+
     def add_fact(self, prop: Proposition):
         """
         Add a fact to the state.
         """
 
-        self._facts[prop.signature].add(prop)
+        facts = self._facts[prop.signature]
+        if prop not in facts:
+            if not prop.is_negation:
+                self._hash ^= prop.digest
+
+            facts.add(prop)
+
+        if self._index is not None:
+            for i, var in enumerate(prop.arguments):
+                self._index[prop.name, i, var].add(prop)
 
         for var in prop.arguments:
             self._add_variable(var)
@@ -1618,7 +1707,16 @@ class State:
         Remove a fact from the state.
         """
 
-        self._facts[prop.signature].discard(prop)
+        facts = self._facts[prop.signature]
+        if prop in facts:
+            if not prop.is_negation:
+                self._hash ^= prop.digest
+
+            facts.remove(prop)
+
+        if self._index is not None:
+            for i, var in enumerate(prop.arguments):
+                self._index[prop.name, i, var].discard(prop)
 
         for var in prop.arguments:
             self._remove_variable(var)
@@ -1648,6 +1746,92 @@ class State:
 
         return True
 
+    def build_index(self) -> None:
+        """
+        Index the facts by (predicate name, argument position, variable).
+
+        Once built, the index is kept up to date as facts are added or
+        removed and it speeds up `query` and `all_assignments` when some
+        arguments are known. It gets built automatically by `query`.
+        """
+
+        if self._index is None:
+            self._index = defaultdict(set)
+            for prop in self.facts:
+                for i, var in enumerate(prop.arguments):
+                    self._index[prop.name, i, var].add(prop)
+
+    def query(self, pattern: str, *arguments: Union[None, str, Variable]) -> List[Proposition]:
+        """
+        Find the facts matching a pattern.
+
+        Examples
+        --------
+        >>> state.query("in", None, chest)  # What is in the chest?
+        >>> state.query("in(?x, c_0)")  # What is in c_0?
+        >>> state.query("link(?r, ?d, ?r)")  # Repeated names must match the same variable.
+
+        Parameters
+        ----------
+        pattern :
+            Either the name of the predicate, followed by its `arguments`,
+            or a pattern like `"in(?x, c_0)"` where names starting with `?`
+            match any variable and other names are names of variables.
+        arguments :
+            Variables (or their name) the facts' arguments must match,
+            None matches anything.
+
+        Returns
+        -------
+        The matching facts, sorted.
+        """
+
+        names = [None] * len(arguments)
+        any_arity = not arguments  # A bare predicate name matches all its facts.
+        if "(" in pattern:
+            any_arity = False
+            match = re.fullmatch(r"\s*([^(\s]+)\s*\((.*)\)\s*", pattern)
+            if match is None:
+                raise ValueError("Invalid query: {!r}".format(pattern))
+
+            pattern, arguments = match.group(1), [arg.strip() for arg in match.group(2).split(",")]
+            arguments = [arg for arg in arguments if arg]
+            names = [arg if arg.startswith("?") else None for arg in arguments]
+            arguments = [None if arg.startswith("?") else arg for arg in arguments]
+
+        bound = []
+        for i, var in enumerate(arguments):
+            if isinstance(var, str):
+                if var not in self._vars_by_name:
+                    return []
+
+                var = self._vars_by_name[var]
+
+            if var is not None:
+                bound.append((i, var))
+
+        if bound:
+            self.build_index()
+            candidates = min((self._index.get((pattern, i, var), ()) for i, var in bound), key=len)
+        else:
+            candidates = [prop for sig, props in self._facts.items() if sig.name == pattern for prop in props]
+
+        results = []
+        for prop in candidates:
+            if not any_arity and len(prop.arguments) != len(arguments):
+                continue
+
+            if any(prop.arguments[i] != var for i, var in bound):
+                continue
+
+            seen = {}
+            if any(seen.setdefault(name, var) != var for name, var in zip(names, prop.arguments) if name):
+                continue
+
+            results.append(prop)
+
+        return sorted(results)
+
     @property
     def variables(self) -> Iterable[Variable]:
         """
@@ -1803,6 +1987,7 @@ class State:
                         mapping: Mapping[Placeholder, Optional[Variable]] = None,
                         partial: bool = False,
                         allow_partial: Callable[[Placeholder], bool] = None,
+                        rng: Optional[RandomState] = None,
                         ) -> Iterable[Mapping[Placeholder, Optional[Variable]]]:
         """
         Find all possible placeholder assignments that would allow a rule to be instantiated in this state.
@@ -1817,6 +2002,9 @@ class State:
             Whether incomplete mappings, that would require new variables or propositions, are allowed.
         allow_partial : optional
             A callback function that returns whether a partial match may involve the given placeholder.
+        rng : optional
+            If provided, the mappings are generated lazily in a pseudo-random order, obtained by shuffling
+            the candidate facts and variables at every step of the search.
 
         Returns
         -------
@@ -1834,7 +2022,7 @@ class State:
 
         if partial:
             new_phs = [ph for ph in rule.placeholders if ph not in mapping]
-            return self._all_assignments(new_phs, mapping, used_vars, True, allow_partial)
+            return self._all_assignments(new_phs, mapping, used_vars, True, allow_partial, rng)
         else:
             # Precompute the new placeholders at every depth to avoid wasted work
             seen_phs = set(mapping.keys())
@@ -1851,7 +2039,7 @@ class State:
             free_vars = [ph for ph in rule.placeholders if ph not in seen_phs]
             new_phs_by_depth.append(free_vars)
 
-            return self._all_applicable_assignments(rule, mapping, used_vars, new_phs_by_depth, 0)
+            return self._all_applicable_assignments(rule, mapping, used_vars, new_phs_by_depth, 0, rng)
 
     def _all_applicable_assignments(self,
                                     rule: Rule,
@@ -1859,6 +2047,7 @@ class State:
                                     used_vars: Set[Variable],
                                     new_phs_by_depth: List[List[Placeholder]],
                                     depth: int,
+                                    rng: Optional[RandomState] = None,
                                     ) -> Iterable[Mapping[Placeholder, Optional[Variable]]]:
         """
         Find all assignments that would be applicable in this state.  We recurse through the rule's preconditions, at
@@ -1869,15 +2058,28 @@ class State:
 
         if depth >= len(rule.preconditions):
             # There are no applicability constraints on the free variables, so solve them unconstrained
-            yield from self._all_assignments(new_phs, mapping, used_vars, False)
+            yield from self._all_assignments(new_phs, mapping, used_vars, False, rng=rng)
             return
 
         pred = rule.preconditions[depth]
 
+        # When the index is available, only look at the facts involving an already assigned variable.
+        candidates = None
+        if self._index is not None:
+            for i, ph in enumerate(pred.parameters):
+                if mapping.get(ph) is not None:
+                    props = self._index.get((pred.name, i, mapping[ph]), ())
+                    if candidates is None or len(props) < len(candidates):
+                        candidates = props
+
         types = [self._logic.types.get(t) for t in pred.signature.types]
-        for subtypes in self._logic.types.multi_subtypes(types):
+        for subtypes in _shuffled(self._logic.types.multi_subtypes(types), rng):
             signature = Signature(pred.signature.name, [t.name for t in subtypes])
-            for prop in sorted(self.facts_with_signature(signature)):
+            props = self.facts_with_signature(signature)
+            if candidates is not None:
+                props = [prop for prop in candidates if prop.signature == signature]
+
+            for prop in _shuffled(sorted(props), rng):
                 for ph, var in zip(pred.parameters, prop.arguments):
                     existing = mapping.get(ph)
                     if existing is None:
@@ -1888,7 +2090,7 @@ class State:
                     elif existing != var:
                         break
                 else:
-                    yield from self._all_applicable_assignments(rule, mapping, used_vars, new_phs_by_depth, depth + 1)
+                    yield from self._all_applicable_assignments(rule, mapping, used_vars, new_phs_by_depth, depth + 1, rng)
 
                 # Reset the mapping to what it was before the recursive call
                 for ph in new_phs:
@@ -1901,6 +2103,7 @@ class State:
                          used_vars: Set[Variable],
                          partial: bool,
                          allow_partial: Callable[[Placeholder], bool] = None,
+                         rng: Optional[RandomState] = None,
                          ) -> Iterable[Mapping[Placeholder, Optional[Variable]]]:
         """
         Find all possible assignments of the given placeholders, without regard to whether any predicates match.
@@ -1918,7 +2121,13 @@ class State:
             if partial and allow_partial(ph):
                 # Allow new variables to be created
                 matched_vars.add(ph)
-            candidates.append(list(matched_vars))
+
+            if rng is None:
+                candidates.append(list(matched_vars))
+            else:
+                # Sort first, set ordering isn't reproducible across processes.
+                matched_vars = sorted(matched_vars, key=lambda var: (var is ph, var.name, var.type))
+                candidates.append(_shuffled(matched_vars, rng))
 
         for assignment in unique_product(*candidates):
             for ph, var in zip(placeholders, assignment):
@@ -1953,6 +2162,10 @@ class State:
         for k, v in self._vars_by_type.items():
             copy._vars_by_type[k] = v.copy()
         copy._var_counts = self._var_counts.copy()
+        copy._hash = self._hash
+
+        if self._index is not None:
+            copy._index = defaultdict(set, ((k, v.copy()) for k, v in self._index.items() if v))
 
         return copy
 
@@ -1971,10 +2184,17 @@ class State:
 
     def __eq__(self, other):
         if isinstance(other, State):
+            if self._hash != other._hash:
+                return False  # Cheap check, most states being compared differ.
+
             return set(self.facts) == set(other.facts)
         else:
             return NotImplemented
 
+    def __hash__(self):
+        # States are mutable, don't modify one while it is used as a key.
+        return self._hash
+
     def __str__(self):
         lines = ["State({"]
 
@@ -1991,3 +2211,177 @@ class State:
         lines.append("})")
 
         return "\n".join(lines)
+
+
+class Interner:
+    """
+    Compact encoding of variables, propositions and actions.
+
+    Each object is stored once, as plain tuples, in tables and is referred
+    to by its index in them. The tables (see `serialize`) can be pickled and
+    sent to another process where the objects are decoded back.
+    """
+
+    def __init__(self, tables: Optional[Sequence] = None):
+        """
+        Parameters
+        ----------
+        tables : optional
+            Tables returned by `serialize()`, to decode objects from.
+        """
+        self._variables, self._propositions, self._actions = tables or ([], [], [])
+        self._ids = {}
+        self._decoded = {}
+
+    def _intern(self, table: List, key, encode: Callable) -> int:
+        id_ = self._ids.get(key)
+        if id_ is None:
+            entry = encode()  # Encode parts first, their ids come before this one.
+            id_ = self._ids[key] = len(table)
+            table.append(entry)
+
+        return id_
+
+    def encode_variable(self, var: Variable) -> int:
+        return self._intern(self._variables, var, lambda: (var.name, var.type))
+
+    def encode_proposition(self, prop: Proposition) -> int:
+        return self._intern(self._propositions, prop,
+                            lambda: (prop.name, tuple(map(self.encode_variable, prop.arguments))))
+
+    def encode_action(self, action: Action) -> int:
+        def _encode():
+            return (action.name,
+                    tuple(map(self.encode_proposition, action.preconditions)),
+                    tuple(map(self.encode_proposition, action.postconditions)),
+                    action.command_template, action.reverse_name, action.reverse_command_template)
+
+        key = (action, action.command_template, action.reverse_name, action.reverse_command_template)
+        return self._intern(self._actions, key, _encode)
+
+    def decode_variable(self, id_: int) -> Variable:
+        key = ("variable", id_)
+        if key not in self._decoded:
+            self._decoded[key] = Variable(*self._variables[id_])
+
+        return self._decoded[key]
+
+    def decode_proposition(self, id_: int) -> Proposition:
+        key = ("proposition", id_)
+        if key not in self._decoded:
+            name, arguments = self._propositions[id_]
+            self._decoded[key] = Proposition(name, map(self.decode_variable, arguments))
+
+        return self._decoded[key]
+
+    def decode_action(self, id_: int) -> Action:
+        key = ("action", id_)
+        if key not in self._decoded:
+            name, pre, post, command_template, reverse_name, reverse_command_template = self._actions[id_]
+            action = Action(name, map(self.decode_proposition, pre), map(self.decode_proposition, post))
+            action.command_template = command_template
+            action.reverse_name = reverse_name
+            action.reverse_command_template = reverse_command_template
+            self._decoded[key] = action
+
+        return self._decoded[key]
+
+    def serialize(self) -> Tuple[List, List, List]:
+        """
+        Tables of the encoded variables, propositions and actions.
+        """
+        return self._variables, self._propositions, self._actions
+
+
+class ConstraintChecker:
+    """
+    Finds the constraints violated by a state.
+
+    A constraint is a rule whose postconditions contain `fail()`: it is
+    violated when all its preconditions are facts of the state. Constraints
+    are indexed by the predicates of their preconditions, so that after
+    adding facts to a state known to be valid, only the constraints
+    involving those facts are checked. States are never copied.
+    """
+
+    def __init__(self, constraints: Iterable[Rule]):
+        """
+        Create a ConstraintChecker.
+
+        Parameters
+        ----------
+        constraints :
+            The constraints to check. Rules not producing `fail()` are ignored.
+        """
+
+        self.constraints = [rule for rule in constraints
+                            if any(pred.name == "fail" for pred in rule.postconditions)]
+
+        self._index = defaultdict(list)
+        for rule in self.constraints:
+            for pred in rule.preconditions:
+                self._index[pred.name, len(pred.parameters)].append((rule, pred))
+
+    def _bind(self, state: State, pred: Predicate, fact: Proposition) -> Optional[Dict[Placeholder, Variable]]:
+        mapping = {}
+        for ph, var in zip(pred.parameters, fact.arguments):
+            if not var.is_a(state._logic.types.get(ph.type)):
+                return None
+
+            existing = mapping.get(ph)
+            if existing is None:
+                if var in mapping.values():
+                    return None  # Distinct placeholders can't be assigned the same variable.
+
+                mapping[ph] = var
+            elif existing != var:
+                return None
+
+        return mapping
+
+    def failing_constraints(self, state: State, facts: Optional[Iterable[Proposition]] = None) -> Iterable[Action]:
+        """
+        Find the instantiated constraints that are violated by a state.
+
+        Parameters
+        ----------
+        state :
+            The state to check.
+        facts : optional
+            If provided, only the constraints involving at least one of these
+            facts are checked. It assumes the state was valid before these
+            facts were added to it.
+
+        Returns
+        -------
+        The violated constraints.
+        """
+
+        if facts is None:
+            for rule in self.constraints:
+                for mapping in state.all_assignments(rule):
+                    yield rule.instantiate(mapping)
+
+            return
+
+        for fact in facts:
+            if not state.is_fact(fact):
+                continue
+
+            for rule, pred in self._index.get((fact.name, len(fact.arguments)), ()):
+                mapping = self._bind(state, pred, fact)
+                if mapping is None:
+                    continue
+
+                for mapping in state.all_assignments(rule, mapping):
+                    yield rule.instantiate(mapping)
+
+    def is_valid(self, state: State, facts: Optional[Iterable[Proposition]] = None) -> bool:
+        """
+        Check whether a state satisfies the constraints (see `failing_constraints`).
+        """
+
+        for _ in self.failing_constraints(state, facts):
+            return False
+
+        return True
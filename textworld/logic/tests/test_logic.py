@@ -1,14 +1,21 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT license.
 
+import os
+import glob
+import pickle
+import shutil
+
 import pytest
 from tatsu.exceptions import ParseError
 
 from textworld.logic import Action, Rule
 from textworld.logic import Variable, Placeholder
 from textworld.logic import Proposition, Predicate, Signature
-from textworld.logic import State, GameLogic
+from textworld.logic import State, GameLogic, Interner
 from textworld.generator import KnowledgeBase
+from textworld.generator.data import LOGIC_DATA_PATH
+from textworld.utils import TranspositionTable
 
 
 def test_logic_parsing():
@@ -98,6 +105,9 @@ def test_state():
     assert state.variables_of_type("P") == {P}
     assert state.variables_of_type("r") == {kitchen}
     assert state.variables_of_type("o") == {stove}
+    assert set(state.facts_with_names({"at"})) == {at_kitchen}
+    assert set(state.facts_with_names({"at", "in"})) == {at_kitchen, in_kitchen}
+    assert set(state.facts_with_names({"on"})) == set()
 
     state.remove_fact(at_kitchen)
     assert not state.is_fact(at_kitchen)
@@ -127,6 +137,94 @@ def test_state():
     assert len(state.variables_of_type("o")) == 0
 
 
+def test_state_query():
+    state = State(KnowledgeBase.default().logic)
+    P = Variable("P")
+    kitchen = Variable("kitchen", "r")
+    chest = Variable("chest", "c")
+    apple = Variable("apple", "o")
+    key = Variable("key", "k")
+    state.add_facts([
+        Proposition("at", [P, kitchen]),
+        Proposition("at", [chest, kitchen]),
+        Proposition("in", [apple, chest]),
+        Proposition("in", [key, chest]),
+    ])
+
+    in_chest = sorted([Proposition("in", [apple, chest]), Proposition("in", [key, chest])])
+    assert state.query("in", None, chest) == in_chest
+    assert state.query("in", None, "chest") == in_chest
+    assert state.query("in(?x, chest)") == in_chest
+    assert state.query("in(apple, ?c)") == [Proposition("in", [apple, chest])]
+    assert state.query("at") == sorted([Proposition("at", [P, kitchen]), Proposition("at", [chest, kitchen])])
+    assert state.query("in", None, kitchen) == []
+    assert state.query("in(?x, unknown)") == []
+    assert state.query("at(?x, ?x)") == []
+
+    # The index follows the changes made to the state and its copies.
+    copy = state.copy()
+    state.remove_fact(Proposition("in", [key, chest]))
+    state.add_fact(Proposition("in", [key, kitchen]))
+    assert state.query("in", None, chest) == [Proposition("in", [apple, chest])]
+    assert state.query("in", key, None) == [Proposition("in", [key, kitchen])]
+    assert copy.query("in", None, chest) == in_chest
+
+    with pytest.raises(ValueError):
+        state.query("in(?x, chest")
+
+
+def test_state_hash():
+    state = State(KnowledgeBase.default().logic)
+    at_kitchen = Proposition.parse("at(P, kitchen: r)")
+    at_study = Proposition.parse("at(P, study: r)")
+    in_kitchen = Proposition.parse("in(stove: o, kitchen: r)")
+    assert state.hash == 0
+
+    state.add_facts([at_kitchen, in_kitchen])
+    initial_hash = state.hash
+    assert initial_hash == State(state._logic, [in_kitchen, at_kitchen]).hash
+    assert initial_hash == at_kitchen.digest ^ in_kitchen.digest
+
+    # Adding a known fact or removing a missing one doesn't change the state.
+    state.add_fact(at_kitchen)
+    state.remove_fact(at_study)
+    assert state.hash == initial_hash
+
+    copy = state.copy()
+    state.remove_fact(at_kitchen)
+    state.add_fact(at_study)
+    assert state.hash != initial_hash
+    assert copy.hash == initial_hash
+    assert state != copy
+
+    state.remove_fact(at_study)
+    state.add_fact(at_kitchen)
+    assert state.hash == initial_hash
+    assert state == copy
+    assert hash(state) == hash(copy)
+
+    # Negated facts don't change the hash.
+    state.add_fact(at_study.negate())
+    assert state.hash == initial_hash
+    assert state != copy
+
+    # Unlike `hash()`, digests don't depend on the process (i.e. PYTHONHASHSEED).
+    assert at_kitchen.digest == 4978685952698063476
+
+    seen = TranspositionTable(maxsize=2)
+    assert seen.add(state.hash)
+    assert not seen.add(copy.hash)
+    assert seen.add(State(state._logic, [at_study]).hash)
+    assert seen.add(0)
+    assert len(seen) == 2
+    assert initial_hash not in seen  # Least recently used entry.
+    assert seen.stats["hits"] == 1
+
+    seen.clear()
+    assert len(seen) == 0
+    assert seen.stats["hits"] == seen.stats["misses"] == 0
+
+
 def test_all_instantiations():
     state = State(KnowledgeBase.default().logic, [
         Proposition.parse("at(P, kitchen: r)"),
@@ -330,3 +428,88 @@ def test_reverse_rule_and_action():
     open_action2.format_command(mapping) == "open chest"
 
     assert open_action2.inverse() == r_open_action
+
+
+def test_interner():
+    kb = KnowledgeBase.default()
+    P = Variable("P")
+    kitchen = Variable("kitchen", "r")
+    carrot = Variable("carrot", "f")
+    take = kb.rules["take"].instantiate({
+        Placeholder("P"): P,
+        Placeholder("I"): Variable("I"),
+        Placeholder("r"): kitchen,
+        Placeholder("o"): carrot,
+    })
+    drop = take.inverse()
+
+    interner = Interner()
+    ids = [interner.encode_action(take), interner.encode_action(drop), interner.encode_action(take)]
+    assert ids == [0, 1, 0]
+    fact_id = interner.encode_proposition(Proposition("at", [carrot, kitchen]))
+    assert interner.encode_proposition(Proposition("at", [carrot, kitchen])) == fact_id
+
+    # Each variable and proposition is only stored once.
+    variables, propositions, actions = interner.serialize()
+    assert len(variables) == 4
+    assert len(propositions) == len(set(take.all_propositions) | set(drop.all_propositions))
+
+    interner = Interner(pickle.loads(pickle.dumps(interner.serialize())))
+    take2, drop2 = interner.decode_action(0), interner.decode_action(1)
+    assert (take2, drop2) == (take, drop)
+    assert take2.format_command({"carrot": "the carrot"}) == "take the carrot"
+    assert take2.inverse() == drop2
+    assert interner.decode_action(0) is take2
+    assert interner.decode_proposition(fact_id) == Proposition("at", [carrot, kitchen])
+
+
+def test_game_logic_disk_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("TEXTWORLD_CACHE_DIR", str(tmpdir))
+    paths = []
+    for path in sorted(glob.glob(os.path.join(LOGIC_DATA_PATH, "*.twl"))):
+        paths.append(str(tmpdir.join(os.path.basename(path))))
+        shutil.copy(path, paths[-1])
+
+    logic = GameLogic.load(paths)
+    assert len(tmpdir.join("logic").listdir()) == 1
+
+    cached_logic = GameLogic.load(paths)
+    assert cached_logic is not logic
+    assert cached_logic.rules == logic.rules
+    assert cached_logic.constraints == logic.constraints
+    assert cached_logic.serialize() == logic.serialize()
+
+    # Modifying the documents invalidates the cache.
+    with open(paths[0], "a") as f:
+        f.write("\n# Modified.\n")
+
+    GameLogic.load(paths)
+    assert len(tmpdir.join("logic").listdir()) == 2
+
+    # Corrupted entries are rebuilt.
+    for entry in tmpdir.join("logic").listdir():
+        entry.write("corrupted")
+
+    assert GameLogic.load(paths).rules == logic.rules
+
+
+def test_game_logic_disk_cache_key(tmpdir, monkeypatch):
+    monkeypatch.setenv("TEXTWORLD_CACHE_DIR", str(tmpdir.join("cache")))
+    paths = {}
+    for folder in ["a", "b"]:
+        tmpdir.mkdir(folder)
+        for path in sorted(glob.glob(os.path.join(LOGIC_DATA_PATH, "*.twl"))):
+            paths.setdefault(folder, []).append(str(tmpdir.join(folder, os.path.basename(path))))
+            shutil.copy(path, paths[folder][-1])
+
+    GameLogic.load(paths["a"])
+    assert len(tmpdir.join("cache", "logic").listdir()) == 1
+
+    # Identical documents found elsewhere aren't shared, their path is stored in the parsed objects.
+    GameLogic.load(paths["b"])
+    assert len(tmpdir.join("cache", "logic").listdir()) == 2
+
+    # Changing the format of the cached objects invalidates the cache.
+    monkeypatch.setattr(GameLogic, "CACHE_SCHEMA", GameLogic.CACHE_SCHEMA + 1)
+    GameLogic.load(paths["a"])
+    assert len(tmpdir.join("cache", "logic").listdir()) == 3
@@ -3,10 +3,11 @@
 
 
 import io
+import os
 import sys
 import contextlib
 
-from typing import Tuple
+from typing import List, Tuple
 
 import numpy as np
 
@@ -107,3 +108,17 @@ def build_and_compile_game(options: GameOptions) -> Tuple[Game, str]:
     game = build_game(options)
     game_file = _compile_test_game(game, options)
     return game, game_file
+
+
+def make_json_games(path: str, seeds: List[int]) -> List[str]:
+    """ Generates one game per seed and saves them in `path` as JSON files. """
+    gamefiles = []
+    for seed in seeds:
+        options = GameOptions()
+        options.seeds = seed
+        game = textworld.generator.make_game(options)
+        gamefile = os.path.join(path, "game_{}.json".format(seed))
+        game.save(gamefile)
+        gamefiles.append(gamefile)
+
+    return gamefiles
@@ -0,0 +1,28 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+import sys
+import subprocess
+
+
+def _run(code):
+    return subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE,
+                          check=True, universal_newlines=True).stdout.strip()
+
+
+def test_lazy_imports():
+    code = ("import sys, textworld, textworld.generator.data as data;"
+            "print(data._DEFAULT_KB is None);"
+            "print(type(sys.modules.get('networkx')).__name__);"
+            "print('prompt_toolkit' in sys.modules)")
+    kb_not_loaded, networkx_type, prompt_toolkit_loaded = _run(code).split("\n")
+    assert kb_not_loaded == "True"
+    assert networkx_type in ("NoneType", "_LazyModule")
+    assert prompt_toolkit_loaded == "False"
+
+
+def test_default_kb_loaded_on_first_use():
+    code = ("import textworld.generator.data as data;"
+            "kb = data.KB;"
+            "print(data._DEFAULT_KB is kb and data.KnowledgeBase.default() is kb)")
+    assert _run(code) == "True"
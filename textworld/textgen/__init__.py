@@ -3,6 +3,7 @@ from typing import Iterable, Optional, Tuple
 
 from textworld.textgen.model import TextGrammarModelBuilderSemantics
 from textworld.textgen.parser import TextGrammarParser
+from textworld.utils import disk_cache
 
 
 class Alternative:
@@ -99,6 +100,9 @@ class _Converter(NodeWalker):
 
 
 class TextGrammar:
+    #: int: Version of the objects cached on disk by `parse`, bump it when changing how they are built.
+    CACHE_SCHEMA = 1
+
     _PARSER = TextGrammarParser(semantics=TextGrammarModelBuilderSemantics(), parseinfo=True)
     _CONVERTER = _Converter()
 
@@ -107,5 +111,10 @@ class TextGrammar:
 
     @classmethod
     def parse(cls, grammar: str, filename: Optional[str] = None):
-        model = cls._PARSER.parse(grammar, filename=filename)
-        return cls._CONVERTER.walk(model)
+        def _build():
+            model = cls._PARSER.parse(grammar, filename=filename)
+            return cls._CONVERTER.walk(model)
+
+        # Parsing is slow, converted models are cached on disk. The filename
+        # is part of the key since it is stored in the parsed objects.
+        return disk_cache("text_grammar", [filename, grammar], _build, schema=cls.CACHE_SCHEMA)
@@ -4,12 +4,18 @@
 
 import os
 import re
+import sys
 import shutil
+import pickle
+import hashlib
+import importlib.util
 import tempfile
 import itertools
 import contextlib
 from collections import OrderedDict
-from typing import List, Any, Iterable, Callable
+from types import ModuleType
+from typing import List, Any, Hashable, Iterable, Callable, Mapping, Optional
+import multiprocessing as mp
 
 import numpy as np
 
@@ -76,6 +82,133 @@ class RegexDict(OrderedDict):
         return matches
 
 
+class TranspositionTable:
+    """ Mapping from states to values, bounded to the most recently used entries.
+
+    States are identified by their hash (see :py:attr:`textworld.logic.State.hash`
+    or the `state_hash` information of :py:class:`textworld.EnvInfos`) so
+    revisiting a state, e.g. when exploring a game, deduplicating a dataset
+    or detecting cycles, doesn't require comparing sets of facts.
+
+    Example:
+
+        >>> seen = TranspositionTable()
+        >>> if seen.add(game_state["state_hash"]):
+        ...     pass  # First time this state is visited.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None):
+        """
+        Arguments:
+            maxsize: Maximum number of entries to keep, unbounded if `None`.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Returns the value stored for `key`, or `default` if there is none. """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def add(self, key: Hashable, value: Any = None) -> bool:
+        """ Stores `value` for `key`, unless already there, and returns whether `key` was new. """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return False
+
+        self.misses += 1
+        self[key] = value
+        return True
+
+    def clear(self) -> None:
+        """ Removes all entries and resets the counters. """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> Mapping[str, float]:
+        """ Number of hits, misses, entries and the hit rate. """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.}
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._entries[key]
+        self._entries.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if self.maxsize is not None and len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """ Returns a module that only gets imported when one of its attributes is accessed.
+
+    Useful to keep `import textworld` fast when heavy dependencies are only
+    needed by some features (e.g., `networkx` for generating maps).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    parent, _, child = name.rpartition(".")
+    if parent:
+        # Mimic the import system: submodules are attributes of their package.
+        setattr(sys.modules[parent], child, module)
+
+    return module
+
+
+#: Modules imported once by the forkserver process so that workers start from a warm image.
+FORKSERVER_PRELOAD = ["textworld.envs.batch._warmup"]
+
+
+def get_context(start_method: Optional[str] = None) -> mp.context.BaseContext:
+    """ Returns the multiprocessing context used to start worker processes.
+
+    Parameters
+    ----------
+    start_method : {None, "fork", "spawn", "forkserver"}
+        Method used to start the worker processes. With "forkserver",
+        TextWorld, its knowledge bases and Jericho are imported once in
+        the forkserver process (see `FORKSERVER_PRELOAD`) and every worker
+        is forked from that warm image. By default, use multiprocessing's
+        default start method.
+    """
+    ctx = mp.get_context(start_method)
+    if ctx.get_start_method() == "forkserver":
+        # Has no effect if the forkserver is already running.
+        ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+
+    return ctx
+
+
 def str2bool(v):
     """ Convert string to a boolean value.
     References
@@ -99,6 +232,75 @@ def maybe_mkdir(dirpath):
     return dirpath
 
 
+def get_cache_dir() -> str:
+    """ Folder where TextWorld caches data on disk.
+
+    Defaults to `$XDG_CACHE_HOME/textworld` (i.e. `~/.cache/textworld`) and
+    can be changed with the `TEXTWORLD_CACHE_DIR` environment variable.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.environ.get("TEXTWORLD_CACHE_DIR", os.path.join(cache_home, "textworld"))
+
+
+def disk_cache(namespace: str, contents: Iterable[Optional[str]], fct: Callable[[], Any],
+               schema: int = 0) -> Any:
+    """ Returns `fct()`, pickled on disk and keyed on `contents`.
+
+    The key is a hash of `contents`, `schema` and of TextWorld's version, so
+    modifying a source document, changing how it is converted or upgrading
+    TextWorld automatically invalidates the cache. Caching can be disabled
+    with `TEXTWORLD_DISABLE_CACHE=1`.
+
+    Arguments:
+        namespace: Subfolder of the cache directory (e.g., "logic").
+        contents: Everything the cached object is built from, i.e. the documents
+                  and anything else stored in it (e.g. their path).
+        fct: Function that builds the object when it is not in the cache.
+        schema: Version of the cached objects' format. Bump it whenever the
+                classes being pickled, or the way they are built, change.
+    """
+    if check_flag("TEXTWORLD_DISABLE_CACHE"):
+        return fct()
+
+    from textworld.version import __version__
+    key = hashlib.sha256("{}:{}:{}".format(__version__, schema, pickle.HIGHEST_PROTOCOL).encode())
+    for content in contents:
+        if content is None:
+            key.update(b"-")  # Distinct from an empty string.
+            continue
+
+        content = content.encode()
+        key.update(str(len(content)).encode() + b":" + content)
+
+    path = os.path.join(get_cache_dir(), namespace, key.hexdigest() + ".pkl")
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        pass  # Missing or unreadable entry, rebuild it.
+
+    obj = fct()
+    try:
+        maybe_mkdir(os.path.dirname(path))
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(f.name, path)  # Atomic, concurrent processes never see partial entries.
+    except OSError:
+        pass  # E.g., read-only filesystem. Caching is only an optimization.
+
+    return obj
+
+
+def clear_disk_cache(namespace: Optional[str] = None) -> None:
+    """ Removes entries cached with `disk_cache` (all of them if `namespace` is None). """
+    path = get_cache_dir()
+    if namespace is not None:
+        path = os.path.join(path, namespace)
+
+    shutil.rmtree(path, ignore_errors=True)
+
+
 @contextlib.contextmanager
 def make_temp_directory(suffix='', prefix='tw_', dir=None):
     """ Create temporary folder to used in a with statement. """